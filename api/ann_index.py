@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import base64
+import threading
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+from file_lock import file_lock
+
+# Load environment variables
+load_dotenv()
+
+ANN_INDEX_ENABLED = os.getenv("ANN_INDEX_ENABLED", "false").lower() == "true"
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", os.path.join(".cache", "ann"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # 0 picks ~4 * sqrt(corpus size)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_KMEANS_ITERS = int(os.getenv("ANN_KMEANS_ITERS", "10"))
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "50000"))
+# Delta log size at which a writer folds it into a new base
+ANN_DELTA_COMPACT_BYTES = int(os.getenv("ANN_DELTA_COMPACT_BYTES", str(128 * 1024 * 1024)))
+
+# Global variables for lazy loading
+_ann_index = None
+_ann_index_lock = threading.Lock()
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int, sample: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of normalized vectors; returns (nlist, dim) unit centroids"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    nlist = max(1, min(nlist, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Re-seed empty lists from random points so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        centroids = (sums / norms[:, None]).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Corpus-wide inverted-file ANN index over the chunk embeddings of every namespace.
+
+    Vectors are grouped into nlist lists around k-means centroids; a query scores
+    the centroids, then scans only the nprobe closest lists. Larger nprobe trades
+    latency for recall (nprobe == nlist is an exact scan).
+
+    On disk, base/ holds the index written by build(); inserts and removals after
+    that are appended to delta.jsonl and replayed on load, so keeping the index
+    current while scrapers add documents costs O(new chunks), not a full rewrite.
+    Processes that did not write a delta pick it up on their next search.
+
+    Writers append under an exclusive file lock and readers replay under a shared
+    one. Once the delta passes ANN_DELTA_COMPACT_BYTES the writer saves a new base
+    and bumps the generation file; other processes then reload the base.
+    """
+
+    def __init__(self, directory: str, centroids: np.ndarray):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._reset(centroids)
+
+    def _reset(self, centroids: np.ndarray):
+        self.centroids = centroids
+        self.dim = centroids.shape[1]
+        self.vectors = np.empty((1024, self.dim), dtype=np.float32)
+        self.size = 0
+        self.live = np.zeros(1024, dtype=bool)
+        self.keys = []  # (namespace, vector_id) per row
+        self.metadata = []
+        self.key_rows = {}  # (namespace, vector_id) -> row
+        self.lists = [np.empty(0, dtype=np.int64) for _ in range(len(centroids))]
+        self._delta_offset = 0
+        self._generation = 0
+
+    @property
+    def delta_path(self) -> str:
+        return os.path.join(self.directory, "delta.jsonl")
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.directory, "lock")
+
+    @property
+    def generation_path(self) -> str:
+        return os.path.join(self.directory, "generation")
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.generation_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    # -----------------------------
+    # Build and persistence
+    # -----------------------------
+    @classmethod
+    def build(cls, directory: str, items, nlist: int = None, iters: int = None, sample: int = None):
+        """
+        Build an index from (namespace, vector dict) pairs and write it to directory,
+        replacing any previous base and delta.
+        """
+        keys, metadata, rows = [], [], []
+        for namespace, vector in items:
+            keys.append((namespace, vector["id"]))
+            metadata.append(vector.get("metadata") or {})
+            rows.append(np.asarray(vector["values"], dtype=np.float32))
+        if not rows:
+            raise ValueError("No vectors to index")
+        vectors = np.vstack(rows)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        nlist = nlist or ANN_NLIST or int(4 * np.sqrt(len(vectors)))
+        centroids = train_centroids(vectors, nlist, iters or ANN_KMEANS_ITERS, sample or ANN_TRAIN_SAMPLE)
+        index = cls(directory, centroids)
+        index._append(keys, metadata, vectors)
+        os.makedirs(directory, exist_ok=True)
+        with index._lock, file_lock(index.lock_path):
+            index._save_base()
+        return index
+
+    def save(self):
+        """Write the full index as the new base and clear the delta log"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, file_lock(self.lock_path):
+            self._replay()
+            self._save_base()
+
+    def _save_base(self):
+        """Caller holds self._lock and the exclusive file lock"""
+        base_dir = os.path.join(self.directory, "base")
+        os.makedirs(base_dir, exist_ok=True)
+        live_rows = np.flatnonzero(self.live[:self.size])
+        np.save(os.path.join(base_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(base_dir, "vectors.npy"), self.vectors[live_rows])
+        with open(os.path.join(base_dir, "records.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "keys": [list(self.keys[row]) for row in live_rows],
+                "metadata": [self.metadata[row] for row in live_rows]
+            }, f)
+        open(self.delta_path, "w").close()
+        self._delta_offset = 0
+        self._generation = self._read_generation() + 1
+        with open(self.generation_path, "w", encoding="utf-8") as f:
+            f.write(str(self._generation))
+
+    @classmethod
+    def load(cls, directory: str):
+        index = cls(directory, np.zeros((1, 1), dtype=np.float32))
+        with index._lock, file_lock(index.lock_path, shared=True):
+            index._load_base()
+            index._replay()
+        return index
+
+    def _load_base(self):
+        """Replace the in-memory index with the base on disk. Caller holds both locks"""
+        base_dir = os.path.join(self.directory, "base")
+        self._reset(np.load(os.path.join(base_dir, "centroids.npy")))
+        with open(os.path.join(base_dir, "records.json"), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self._append([tuple(key) for key in records["keys"]], records["metadata"],
+                     np.load(os.path.join(base_dir, "vectors.npy")))
+        self._generation = self._read_generation()
+
+    def refresh(self):
+        """Replay delta records appended (by any process) since the last read"""
+        if not os.path.exists(self.delta_path):
+            return
+        with self._lock:
+            if (self._generation == self._read_generation()
+                    and os.path.getsize(self.delta_path) <= self._delta_offset):
+                return
+            with file_lock(self.lock_path, shared=True):
+                self._replay()
+
+    def _replay(self):
+        """Catch up with the base generation and delta log on disk. Caller holds both locks"""
+        if self._generation != self._read_generation():
+            self._load_base()  # another process compacted the delta into a new base
+        if not os.path.exists(self.delta_path):
+            return
+        with open(self.delta_path, "rb") as f:
+            f.seek(self._delta_offset)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # end of log (or a crashed writer's torn record)
+                self._apply(json.loads(line))
+                self._delta_offset = f.tell()
+
+    def _log(self, records: list):
+        """Append delta records; caller holds self._lock and the exclusive file lock after _replay()"""
+        payload = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(self.delta_path, "ab") as f:
+            f.seek(self._delta_offset)
+            f.truncate()  # drop a torn record left by a crashed writer
+            f.write(payload)
+            self._delta_offset = f.tell()
+        if self._delta_offset > ANN_DELTA_COMPACT_BYTES:
+            print("🔄 Compacting corpus ANN index delta...")
+            self._save_base()
+
+    def _apply(self, record: dict):
+        if record["op"] == "add":
+            values = np.frombuffer(base64.b64decode(record["values"]), dtype=np.float32)
+            self._upsert_rows([(record["namespace"], record["id"])], [record["metadata"]], values[None, :])
+        elif record["op"] == "metadata":
+            row = self.key_rows.get((record["namespace"], record["id"]))
+            if row is not None:
+                self.metadata[row] = record["metadata"]
+        elif record["op"] == "remove":
+            self._remove_keys([(record["namespace"], vector_id) for vector_id in record["ids"]])
+        elif record["op"] == "remove_namespace":
+            self._remove_keys([key for key in self.key_rows if key[0] == record["namespace"]])
+
+    # -----------------------------
+    # Mutation
+    # -----------------------------
+    def _append(self, keys: list, metadata: list, vectors: np.ndarray):
+        needed = self.size + len(vectors)
+        if needed > len(self.vectors):
+            capacity = max(needed, 2 * len(self.vectors))
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+            live = np.zeros(capacity, dtype=bool)
+            live[:self.size] = self.live[:self.size]
+            self.live = live
+
+        rows = np.arange(self.size, needed)
+        self.vectors[rows] = vectors
+        self.live[rows] = True
+        for key, row in zip(keys, rows):
+            self.key_rows[key] = int(row)
+        self.keys.extend(keys)
+        self.metadata.extend(metadata)
+        self.size = needed
+
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for list_id in np.unique(assignments):
+            self.lists[list_id] = np.concatenate([self.lists[list_id], rows[assignments == list_id]])
+
+    def _remove_keys(self, keys):
+        for key in keys:
+            row = self.key_rows.pop(key, None)
+            if row is not None:
+                self.live[row] = False
+
+    def _upsert_rows(self, keys: list, metadata: list, vectors: np.ndarray):
+        # Replaced vectors are tombstoned and appended again; save() drops dead rows
+        self._remove_keys(keys)
+        self._append(keys, metadata, vectors)
+
+    def add(self, namespace: str, vectors: list):
+        """
+        Insert (or replace) vectors of a namespace and log them to the delta. A vector
+        that is already indexed with the same values (a shared chunk gaining another
+        document) only logs its new metadata.
+        """
+        if not vectors:
+            return
+        matrix = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._lock, self._writing():
+            changed, records = [], []
+            for vector, row in zip(vectors, matrix):
+                key = (namespace, vector["id"])
+                metadata = vector.get("metadata") or {}
+                existing = self.key_rows.get(key)
+                if existing is not None and np.array_equal(self.vectors[existing], row):
+                    self.metadata[existing] = metadata
+                    records.append({"op": "metadata", "namespace": namespace, "id": vector["id"],
+                                    "metadata": metadata})
+                else:
+                    changed.append((key, metadata, row))
+                    records.append({"op": "add", "namespace": namespace, "id": vector["id"], "metadata": metadata,
+                                    "values": base64.b64encode(row.tobytes()).decode("ascii")})
+            if changed:
+                self._upsert_rows([key for key, _, _ in changed], [metadata for _, metadata, _ in changed],
+                                  np.stack([row for _, _, row in changed]))
+            self._log(records)
+
+    def remove(self, namespace: str, ids: list):
+        if not ids:
+            return
+        with self._lock, self._writing():
+            self._remove_keys([(namespace, vector_id) for vector_id in ids])
+            self._log([{"op": "remove", "namespace": namespace, "ids": list(ids)}])
+
+    def remove_namespace(self, namespace: str):
+        with self._lock, self._writing():
+            self._apply({"op": "remove_namespace", "namespace": namespace})
+            self._log([{"op": "remove_namespace", "namespace": namespace}])
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive file lock, caught up with every delta written before it was taken"""
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.lock_path):
+            self._replay()
+            yield
+
+    # -----------------------------
+    # Search
+    # -----------------------------
+    def search(self, query, top_k: int = 5, nprobe: int = None) -> list:
+        """Approximate top-k over the whole corpus; matches carry their namespace"""
+        self.refresh()
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        nprobe = max(1, min(nprobe or ANN_NPROBE, len(self.centroids)))
+
+        with self._lock:
+            centroid_scores = self.centroids @ query
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            rows = np.concatenate([self.lists[list_id] for list_id in probe])
+            rows = rows[self.live[rows]]
+            if len(rows) == 0:
+                return []
+            scores = self.vectors[rows] @ query
+            k = min(int(top_k), len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self.keys[rows[i]][1],
+                    "namespace": self.keys[rows[i]][0],
+                    "score": float(scores[i]),
+                    "metadata": self.metadata[rows[i]]
+                }
+                for i in top
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vectors": int(self.live[:self.size].sum()),
+                "tombstones": int(self.size - self.live[:self.size].sum()),
+                "nlist": len(self.centroids),
+                "nprobe": ANN_NPROBE
+            }
+
+
+def get_ann_index():
+    """Lazy load the corpus ANN index (None when disabled or not built yet)"""
+    global _ann_index
+    if _ann_index is None and ANN_INDEX_ENABLED:
+        with _ann_index_lock:
+            if _ann_index is None and os.path.exists(os.path.join(ANN_INDEX_DIR, "base", "centroids.npy")):
+                print("🔄 Loading corpus ANN index...")
+                _ann_index = IVFIndex.load(ANN_INDEX_DIR)
+                print(f"✅ Corpus ANN index loaded ({_ann_index.stats()['vectors']} vectors)")
+    return _ann_index
+
+def build_ann_index(nlist: int = None) -> IVFIndex:
+    """Build the corpus index offline from every namespace in the configured vector store"""
+    from vector_store import get_vector_store
+    store = get_vector_store()
+
+    def items():
+        for namespace in store.list_namespaces():
+            for batch in store.iter_vectors(namespace):
+                for vector in batch:
+                    yield namespace, vector
+
+    global _ann_index
+    print("🔄 Building corpus ANN index...")
+    _ann_index = IVFIndex.build(ANN_INDEX_DIR, items(), nlist=nlist)
+    print(f"✅ Corpus ANN index built: {_ann_index.stats()}")
+    return _ann_index
+
+
+if __name__ == "__main__":
+    # python ann_index.py build [nlist]
+    # python ann_index.py search "question" [top_k]
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    if command == "build":
+        build_ann_index(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    elif command == "search":
+        from embeddings import embed_query
+        index = IVFIndex.load(ANN_INDEX_DIR)
+        for match in index.search(embed_query(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 5):
+            print(f"{match['score']:.3f}  {match['namespace']}  {match['metadata'].get('text', '')[:80]!r}")
+    else:
+        print(f"Unknown command: {command}")
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity a new question needs to a cached question of the same document
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # seconds; 0 disables expiry
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+
+class AnswerCache:
+    """
+    In-memory semantic cache of document answers.
+
+    Entries are keyed by doc_id and the question's (unit-normalized) embedding: a
+    question whose cosine similarity to a cached question of the same document is at
+    least threshold gets the cached answer. Every entry remembers the document version
+    (content hash and model version from the registry) it was answered from, and a hit
+    is only served while the document is still at that version, so re-vectorizing a
+    document (in this or another worker) retires its answers. Entries expire after
+    ttl seconds and the least recently used are evicted beyond max_entries.
+    """
+
+    def __init__(self, threshold: float, ttl: int, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # entry_id -> entry, oldest first
+        self._by_doc = {}  # doc_id -> {entry_id: entry}
+        self._next_id = 0
+
+    def _remove(self, entry_id: int):
+        entry = self._lru.pop(entry_id)
+        doc_entries = self._by_doc.get(entry["doc_id"])
+        if doc_entries is not None:
+            doc_entries.pop(entry_id, None)
+            if not doc_entries:
+                del self._by_doc[entry["doc_id"]]
+
+    def get(self, doc_id: str, query_vector, current_version=None):
+        """
+        Cached answer for the most similar question of doc_id, or None.
+        current_version() returns the document's version now; it is only called when a
+        candidate answer exists, and answers of any other version are dropped.
+        """
+        vector = _normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for entry_id, entry in list(self._by_doc.get(doc_id, {}).items()):
+                if self.ttl and now - entry["created_at"] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                candidates.append((entry_id, entry))
+
+            best = None
+            if candidates:
+                scores = np.stack([entry["vector"] for _, entry in candidates]) @ vector
+                index = int(np.argmax(scores))
+                if scores[index] >= self.threshold:
+                    best = candidates[index]
+            if best is None:
+                self.misses += 1
+                return None
+
+        # Outside the lock: the version lookup may go to Postgres
+        version = current_version() if current_version else None
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._by_doc.get(doc_id, {}).items()
+                     if entry["version"] != version]
+            for entry_id in stale:
+                self._remove(entry_id)
+            entry_id, entry = best
+            if entry_id not in self._lru:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(entry_id)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, doc_id: str, query_vector, answer: str, version=None):
+        """Cache answer for a question of doc_id, evicting least-recently-used entries when full"""
+        entry = {
+            "doc_id": doc_id,
+            "vector": _normalize(query_vector),
+            "answer": answer,
+            "version": version,
+            "created_at": time.time()
+        }
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._lru[entry_id] = entry
+            self._by_doc.setdefault(doc_id, {})[entry_id] = entry
+            while len(self._lru) > self.max_entries:
+                self._remove(next(iter(self._lru)))
+                self.evictions += 1
+
+    def invalidate(self, doc_id: str):
+        """Drop every cached answer of doc_id"""
+        with self._lock:
+            for entry_id in list(self._by_doc.get(doc_id, {})):
+                self._remove(entry_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "documents": len(self._by_doc),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0
+            }
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Global cache instance (None when disabled)
+answer_cache = AnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES) \
+    if ANSWER_CACHE_ENABLED else None
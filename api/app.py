@@ -6,18 +6,25 @@ from concurrent.futures import ThreadPoolExecutor
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 import os
+import json
+import functools
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from vectorizer import process_and_store_pdf
 from dotenv import load_dotenv
-from neon_database import db
+from neon_database import db, DB_POOL_MAX_CONNECTIONS
 import traceback
-from llm import ask_doc_question
+from llm import aask_doc_question, stream_doc_question
 from circulars_scrapper import scrape_and_save_circulars
 from press_scrapper import scrape_and_save_press_releases
-from workflow_agent import ask_workflow_question
+from workflow_agent import aask_workflow_question, stream_workflow_question
+from jobs import job_queue, QueueFullError, AUTO_INGEST
+from vectorizer import close_embedding_cache
+from ann_index import get_ann_index
+from embeddings import embed_query
+from retrieval import run_retrieval
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +33,7 @@ load_dotenv()
 class VectorizeRequest(BaseModel):
     doc_id: str
     pdf_link: str
+    refresh: Optional[bool] = False
 
 class MessageRequest(BaseModel):
     message: str
@@ -36,6 +44,11 @@ class ProcessMessageRequest(BaseModel):
     message: str
     doc_id: Optional[str] = None
 
+class SearchRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = 10
+    nprobe: Optional[int] = None
+
 class StandardResponse(BaseModel):
     status: str
     message: Optional[str] = None
@@ -80,12 +93,44 @@ class DeleteWorkflowRequest(BaseModel):
 
 try:
     print("Initializing database connection...")
-    if db.connect():
+    if db.open_pool():
         print("Database connection established")
+        db.ensure_vectorization_jobs_table()
+        db.ensure_vectorized_documents_table()
 except Exception as e:
     print(f"❌ Error initializing database: {str(e)}")
 
 
+# Blocking Postgres calls from request handlers run here, one thread per pooled connection,
+# so a slow query never stalls the event loop
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_CONNECTIONS, thread_name_prefix="db")
+
+async def run_db(fn, *args, **kwargs):
+    """Await a blocking database call on the DB executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+def sse_response(events) -> StreamingResponse:
+    """
+    Stream (event, data) pairs from an async generator as server-sent events;
+    a failure mid-stream is sent as an "error" event.
+    """
+    async def body():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            print(f"❌ Error while streaming response: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -100,6 +145,14 @@ app.add_middleware(
 async def startup_event():
     """Run one-time scraping on application startup"""
     print("🚀 Application starting up...")
+
+    try:
+        # Jobs a crashed or restarted worker left queued/running would otherwise never finish
+        recovered = await run_db(job_queue.recover_interrupted_jobs)
+        if recovered:
+            print(f"📥 Re-queued {recovered} interrupted vectorization jobs")
+    except Exception as e:
+        print(f"⚠️ Could not recover interrupted vectorization jobs: {e}")
     
     try:
         # Run one-time scraping in thread pool
@@ -117,6 +170,11 @@ async def startup_event():
         press_releases_result = await loop.run_in_executor(executor, scrape_and_save_press_releases)
         print(f"✅ Found {len(press_releases_result)} new press releases")
         
+        # Vectorize new documents in the background so they are ready before first use
+        if AUTO_INGEST:
+            queued = await run_db(job_queue.enqueue_new_documents, circulars_result + press_releases_result)
+            print(f"📥 Queued {queued} new documents for background vectorization")
+        
         print("✅ Startup scraping completed successfully")
         print("📊 Application ready to serve requests")
         
@@ -133,7 +191,7 @@ async def get_updates():
     Returns a list of updates with their details
     """
     try:
-        updates = db.get_latest_press_releases()
+        updates = await run_db(db.get_latest_press_releases)
         return StandardResponse(
             status="success",
             updates=updates
@@ -145,32 +203,123 @@ async def get_updates():
         )
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background vectorization workers and persist the embedding cache index"""
+    job_queue.shutdown()
+    close_embedding_cache()
+
 @app.post("/vectorize", response_model=StandardResponse)
 async def vectorize_document(data: VectorizeRequest):
     """
-    Process and store a document in ChromaDB when user clicks Pull & Chat
+    Process and store a document in Pinecone when user clicks Pull & Chat.
+    Runs on the vectorization workers and waits for completion without blocking the event loop.
     """
     try:
-        process_and_store_pdf(data.pdf_link, data.doc_id)
+        _, future = await run_db(job_queue.submit, data.doc_id, data.pdf_link, refresh=data.refresh)
+        await asyncio.wrap_future(future)
         
         return StandardResponse(
             status="success",
             message="Document processed and stored successfully"
         )
         
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process document: {str(e)}"
         )
 
+@app.post("/vectorize/jobs", response_model=StandardResponse)
+async def submit_vectorization_job(data: VectorizeRequest):
+    """
+    Queue a document for background vectorization and return the job id immediately
+    """
+    try:
+        job, _ = await run_db(job_queue.submit, data.doc_id, data.pdf_link, refresh=data.refresh)
+        
+        return StandardResponse(
+            status="success",
+            message="Vectorization job queued",
+            data={"job": job}
+        )
+        
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to queue vectorization job: {str(e)}"
+        )
+
+@app.get("/vectorize/jobs/{job_id}", response_model=StandardResponse)
+async def get_vectorization_job(job_id: str):
+    """
+    Get status and progress (pages parsed, chunks embedded) of a vectorization job
+    """
+    try:
+        job = await run_db(job_queue.get_job, job_id)
+        
+        if not job:
+            raise HTTPException(
+                status_code=404,
+                detail="Vectorization job not found"
+            )
+        
+        return StandardResponse(
+            status="success",
+            message=f"Job is {job['status']}",
+            data={"job": job}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve vectorization job: {str(e)}"
+        )
+
+@app.post("/search", response_model=StandardResponse)
+async def search_corpus(data: SearchRequest):
+    """
+    Approximate nearest-neighbour search over chunks of every vectorized document
+    """
+    try:
+        ann_index = get_ann_index()
+        
+        if ann_index is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Corpus index is not enabled or has not been built"
+            )
+        
+        query_embedding = await run_retrieval(embed_query, data.query)
+        matches = await run_retrieval(ann_index.search, query_embedding, top_k=data.top_k, nprobe=data.nprobe)
+        
+        return StandardResponse(
+            status="success",
+            message=f"Found {len(matches)} matching chunks",
+            data={"matches": matches}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to search corpus: {str(e)}"
+        )
+
 @app.post("/save_message", response_model=StandardResponse)
 async def save_message(data: MessageRequest):
     """
     Save a chat message to the database
     """
     try:
-        db.save_message(data.user_id, data.role, data.message)
+        await run_db(db.save_message, data.user_id, data.role, data.message)
         
         return StandardResponse(
             status="success",
@@ -198,7 +347,7 @@ async def process_message(data: ProcessMessageRequest):
 
         # Generate AI response
         try:
-            response_content = ask_doc_question(data.message, data.doc_id)
+            response_content = await aask_doc_question(data.message, data.doc_id)
             return StandardResponse(
                 status="success",
                 response={
@@ -220,6 +369,20 @@ async def process_message(data: ProcessMessageRequest):
             detail=f"Failed to process message: {str(e)}"
         )
 
+@app.post("/process_message/stream")
+async def process_message_stream(data: ProcessMessageRequest):
+    """
+    Streaming /process_message over server-sent events: a "retrieval" event with the
+    sources once the document context is retrieved, "token" events as the answer is
+    generated, and a final "done" event with the complete answer.
+    """
+    if not data.doc_id:
+        raise HTTPException(
+            status_code=400,
+            detail="No doc_id provided"
+        )
+    return sse_response(stream_doc_question(data.message, data.doc_id))
+
 
 @app.get("/get_circulars", response_model=StandardResponse)
 async def get_circulars(limit: int = 50):
@@ -228,7 +391,7 @@ async def get_circulars(limit: int = 50):
     Returns latest circulars with category information
     """
     try:
-        circulars = db.get_latest_circulars()
+        circulars = await run_db(db.get_latest_circulars)
         return StandardResponse(
             status="success",
             message=f"Retrieved {len(circulars)} circulars",
@@ -250,7 +413,7 @@ async def get_chat_history(user_id: str = "default_user"):
     Returns all previous chats between the user and AI
     """
     try:
-        chat_history = db.get_user_chat_history(user_id, limit=100)  
+        chat_history = await run_db(db.get_user_chat_history, user_id, limit=100)  
         
         formatted_messages = []
         for chat in chat_history:
@@ -283,7 +446,7 @@ async def create_workflow(data: CreateWorkflowRequest):
     Create a new empty workflow
     """
     try:
-        workflow = db.create_workflow(data.user_id, data.name, data.description)
+        workflow = await run_db(db.create_workflow, data.user_id, data.name, data.description)
         
         return StandardResponse(
             status="success",
@@ -306,10 +469,10 @@ async def add_document_to_workflow(workflow_id: str, data: AddDocumentToWorkflow
         
         # Convert doc_id hash to database primary key ID
         if data.doc_type == 'press_release':
-            db_id = db.get_press_release_id_by_doc_id(data.doc_id)
+            db_id = await run_db(db.get_press_release_id_by_doc_id, data.doc_id)
             
         elif data.doc_type == 'circular':
-            db_id = db.get_circular_id_by_doc_id(data.doc_id)
+            db_id = await run_db(db.get_circular_id_by_doc_id, data.doc_id)
 
         else:
             raise HTTPException(
@@ -325,7 +488,7 @@ async def add_document_to_workflow(workflow_id: str, data: AddDocumentToWorkflow
             )
         
         # Get document details to extract PDF link for vectorization
-        document_details = db.get_document_by_type_and_id(data.doc_type, db_id)
+        document_details = await run_db(db.get_document_by_type_and_id, data.doc_type, db_id)
         if not document_details:
             raise HTTPException(
                 status_code=404,
@@ -339,9 +502,12 @@ async def add_document_to_workflow(workflow_id: str, data: AddDocumentToWorkflow
                 detail=f"Document does not have a PDF link for vectorization"
             )
         
-        # Vectorize the document first
+        # Vectorize the document first (on the vectorization workers)
         try:
-            process_and_store_pdf(pdf_link, data.doc_id)
+            _, future = await run_db(job_queue.submit, data.doc_id, pdf_link)
+            await asyncio.wrap_future(future)
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -349,7 +515,7 @@ async def add_document_to_workflow(workflow_id: str, data: AddDocumentToWorkflow
             )
         
         # Now add to workflow
-        document = db.add_document_to_workflow(workflow_id, data.doc_type, db_id)
+        document = await run_db(db.add_document_to_workflow, workflow_id, data.doc_type, db_id)
         
         if document is None:
             return StandardResponse(
@@ -379,7 +545,7 @@ async def get_workflow(workflow_id: str):
     Get workflow with its linked documents
     """
     try:
-        workflow = db.get_workflow_with_documents(workflow_id)
+        workflow = await run_db(db.get_workflow_with_documents, workflow_id)
         
         if not workflow:
             raise HTTPException(
@@ -407,7 +573,7 @@ async def get_user_workflows(user_id: str, limit: int = 50):
     Get all workflows for a user
     """
     try:
-        workflows = db.get_user_workflows(user_id, limit)
+        workflows = await run_db(db.get_user_workflows, user_id, limit)
         
         return StandardResponse(
             status="success",
@@ -433,7 +599,7 @@ async def get_document_details(doc_type: str, doc_id: int):
                 detail=f"Invalid doc_type: {doc_type}. Must be 'press_release' or 'circular'"
             )
         
-        document = db.get_document_by_type_and_id(doc_type, doc_id)
+        document = await run_db(db.get_document_by_type_and_id, doc_type, doc_id)
         
         if not document:
             raise HTTPException(
@@ -474,7 +640,8 @@ async def workflow_chat(workflow_id: str, data: WorkflowChatRequest, user_id: st
                 detail="Mismatch between doc_ids and doc_titles count"
             )
         
-        db.save_workflow_chat_message(
+        await run_db(
+            db.save_workflow_chat_message,
             workflow_id=workflow_id,
             user_id=user_id,
             role="user",
@@ -483,10 +650,11 @@ async def workflow_chat(workflow_id: str, data: WorkflowChatRequest, user_id: st
         )
         
         # Call workflow agent
-        response = ask_workflow_question(data.query, data.doc_ids, data.doc_titles)
+        response = await aask_workflow_question(data.query, data.doc_ids, data.doc_titles)
         
         # Save assistant response to database
-        db.save_workflow_chat_message(
+        await run_db(
+            db.save_workflow_chat_message,
             workflow_id=workflow_id,
             user_id=user_id,
             role="assistant",
@@ -512,13 +680,62 @@ async def workflow_chat(workflow_id: str, data: WorkflowChatRequest, user_id: st
             detail=f"Failed to process workflow chat: {str(e)}"
         )
 
+@app.post("/workflows/{workflow_id}/chat/stream")
+async def workflow_chat_stream(workflow_id: str, data: WorkflowChatRequest, user_id: str):
+    """
+    Streaming workflow chat over server-sent events ("retrieval" with the sources found
+    across the workflow's documents, "token" events, then "done"). Both messages are
+    saved like /chat; the assistant message once the answer is complete, before "done" is sent.
+    """
+    if not data.doc_ids or not data.doc_titles:
+        raise HTTPException(
+            status_code=400,
+            detail="No documents provided for workflow chat"
+        )
+
+    if len(data.doc_ids) != len(data.doc_titles):
+        raise HTTPException(
+            status_code=400,
+            detail="Mismatch between doc_ids and doc_titles count"
+        )
+
+    try:
+        await run_db(
+            db.save_workflow_chat_message,
+            workflow_id=workflow_id,
+            user_id=user_id,
+            role="user",
+            content=data.query,
+            document_data=None
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process workflow chat: {str(e)}"
+        )
+
+    async def events():
+        async for event, payload in stream_workflow_question(data.query, data.doc_ids, data.doc_titles):
+            if event == "done":
+                await run_db(
+                    db.save_workflow_chat_message,
+                    workflow_id=workflow_id,
+                    user_id=user_id,
+                    role="assistant",
+                    content=payload["content"],
+                    document_data=None
+                )
+            yield event, payload
+
+    return sse_response(events())
+
 @app.get("/workflows/{workflow_id}/chat/history", response_model=StandardResponse)
 async def get_workflow_chat_history(workflow_id: str, user_id: str, limit: int = 50):
     """
     Get chat history for a specific workflow and user
     """
     try:        
-        chat_history = db.get_workflow_chat_history(workflow_id, user_id, limit)
+        chat_history = await run_db(db.get_workflow_chat_history, workflow_id, user_id, limit)
         
         # Convert to frontend format
         messages = []
@@ -549,7 +766,8 @@ async def save_workflow_chat_message(workflow_id: str, data: SaveWorkflowChatMes
     Save a chat message for a specific workflow
     """
     try:       
-        saved_message = db.save_workflow_chat_message(
+        saved_message = await run_db(
+            db.save_workflow_chat_message,
             workflow_id=workflow_id,
             user_id=data.user_id,
             role=data.role,
@@ -574,7 +792,7 @@ async def clear_workflow_chat_history(workflow_id: str, user_id: str):
     Clear chat history for a specific workflow and user
     """
     try:
-        deleted_count = db.clear_workflow_chat_history(workflow_id, user_id)
+        deleted_count = await run_db(db.clear_workflow_chat_history, workflow_id, user_id)
         
         return StandardResponse(
             status="success",
@@ -593,7 +811,7 @@ async def remove_document_from_workflow(workflow_id: str, data: RemoveDocumentFr
     Remove a document from a workflow
     """
     try:
-        success = db.remove_document_from_workflow(workflow_id, data.doc_type, data.doc_id)
+        success = await run_db(db.remove_document_from_workflow, workflow_id, data.doc_type, data.doc_id)
         
         if success:
             return StandardResponse(
@@ -618,7 +836,7 @@ async def delete_workflow(workflow_id: str, data: DeleteWorkflowRequest):
     Delete a workflow and all associated data
     """
     try:
-        success = db.delete_workflow(workflow_id, data.user_id)
+        success = await run_db(db.delete_workflow, workflow_id, data.user_id)
         
         if success:
             return StandardResponse(
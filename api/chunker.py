@@ -0,0 +1,157 @@
+import re
+import sys
+import time
+
+# Preferred cut points, strongest first (paragraph, line, word)
+SEPARATORS = ("\n\n", "\n", " ")
+
+# Section headings as they appear in RBI circulars: Annex/Chapter/Part lines,
+# short numbered titles without closing punctuation, and ALL CAPS title lines
+HEADING_LINE = (
+    r"[ \t]*(?P<heading>"
+    r"(?i:annex(?:ure)?|appendix|chapter|part|section|schedule)\b[^\n]{0,80}"
+    r"|(?:\d+(?:\.\d+)*\.?|\([ivxlc]+\)|[IVXL]+\.)[ \t]+[A-Z][^\n]{0,56}[^.,;:\n]"
+    r"|[A-Z][A-Z0-9,&()'/.-]*(?:[ \t]+[A-Z0-9,&()'/.-]+)+"
+    r")[ \t]*(?=\n|\Z)"
+)
+# Anchored on a literal newline (rather than ^ with re.MULTILINE) so the regex
+# engine can skip straight to line starts
+HEADING_PATTERN = re.compile(r"\n" + HEADING_LINE)
+FIRST_LINE_HEADING_PATTERN = re.compile(HEADING_LINE)
+
+
+def find_headings(text: str) -> list:
+    """[(offset, heading), ...] of heading lines in a page, in order"""
+    first = FIRST_LINE_HEADING_PATTERN.match(text)
+    matches = ([first] if first else []) + list(HEADING_PATTERN.finditer(text))
+    return [(m.start("heading"), " ".join(m.group("heading").split())) for m in matches]
+
+def split_spans(text: str, chunk_size: int, chunk_overlap: int):
+    """
+    Single pass over a page buffer yielding (start, end) spans of at most chunk_size
+    characters, cut at the strongest separator in the second half of the window.
+    Consecutive spans overlap by up to chunk_overlap characters, starting on a line or word.
+    Spans exclude surrounding whitespace and never copy the text.
+    """
+    length = len(text)
+    pos = 0
+    while pos < length:
+        limit = pos + chunk_size
+        if limit >= length:
+            end = length
+        else:
+            end = limit
+            floor = pos + chunk_size // 2
+            for separator in SEPARATORS:
+                cut = text.rfind(separator, floor, limit)
+                if cut != -1:
+                    end = cut
+                    break
+
+        start, stop = pos, end
+        while start < stop and text[start].isspace():
+            start += 1
+        while stop > start and text[stop - 1].isspace():
+            stop -= 1
+        if stop > start:
+            yield start, stop
+        if end >= length:
+            return
+
+        next_pos = max(end - chunk_overlap, pos + 1)
+        # Start the overlap at the strongest boundary (line, then word) inside the overlap window
+        for separator in SEPARATORS:
+            boundary = text.find(separator, next_pos, end)
+            if boundary != -1:
+                next_pos = boundary + len(separator)
+                break
+        pos = next_pos
+
+def format_table(table: list, table_index: int) -> str:
+    """Render an extracted table as a text chunk."""
+    # Replace None values with empty strings in each row
+    cleaned_table = [[cell if cell is not None else "" for cell in row] for row in table if row]
+    table_str = "\n".join([", ".join(row) for row in cleaned_table])
+    return f"TABLE_{table_index}:\n{table_str}"
+
+def iter_page_chunks(pages, chunk_size: int, chunk_overlap: int):
+    """
+    Turn a (page_number, text, tables) stream into chunk dicts:
+    {"text", "page", "start", "end", "heading"} for text, where start/end are
+    character offsets into the page text, and {"text", "page", "heading", "table"}
+    for tables. The heading is the latest section heading at or before the chunk,
+    carried across pages. Chunks never span pages, so a revision to one page only
+    changes that page's chunks.
+    """
+    heading = None
+    table_index = 0
+    for page_number, page_text, tables in pages:
+        headings = find_headings(page_text) if page_text else []
+        next_heading = 0
+        for start, end in split_spans(page_text or "", chunk_size, chunk_overlap):
+            while next_heading < len(headings) and headings[next_heading][0] <= start:
+                heading = headings[next_heading][1]
+                next_heading += 1
+            yield {"text": page_text[start:end], "page": page_number, "start": start, "end": end, "heading": heading}
+        if headings:
+            heading = headings[-1][1]
+        for table in tables:
+            yield {"text": format_table(table, table_index), "page": page_number, "heading": heading,
+                   "table": table_index}
+            table_index += 1
+
+def merge_chunk_texts(chunks: list) -> str:
+    """
+    Join consecutive chunks of one document into a passage, dropping the overlap
+    between neighbours on the same page (known from their offsets).
+    """
+    parts = []
+    previous = None
+    for chunk in chunks:
+        text = chunk.get("text", "")
+        if (previous is not None and chunk.get("page") == previous.get("page")
+                and chunk.get("start") is not None and previous.get("end") is not None
+                and chunk["start"] < previous["end"]):
+            text = text[previous["end"] - chunk["start"]:].lstrip()
+        if text:
+            parts.append(text)
+        previous = chunk
+    return "\n".join(parts)
+
+
+if __name__ == "__main__":
+    # Benchmark against LangChain's splitter: python chunker.py [file.pdf]
+    import textwrap
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    if len(sys.argv) > 1:
+        import pdfplumber
+        with pdfplumber.open(sys.argv[1]) as pdf:
+            page_texts = [page.extract_text() or "" for page in pdf.pages]
+    else:
+        paragraph = ("Banks are advised to ensure compliance with the instructions contained in this circular "
+                     "and to put in place a board approved policy on the subject. ")
+        # Paragraphs wrapped into ~90 character lines without blank lines, like pdfplumber output
+        page_texts = [
+            f"{p}. SECTION {p} TITLE\n" + "\n".join(
+                textwrap.fill(" ".join([paragraph] * (1 + i % 4)), 90) for i in range(12)
+            )
+            for p in range(1, 201)
+        ]
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, separators=["\n\n", "\n", " ", ""])
+    pages = [(i + 1, text, []) for i, text in enumerate(page_texts)]
+    total_chars = sum(len(text) for text in page_texts)
+
+    def bench(name, fn, repeat=5):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = len(fn())
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:<32} {best * 1000:8.1f} ms  {count:5d} chunks  {total_chars / best / 1e6:6.1f} MB/s")
+
+    print(f"{len(page_texts)} pages, {total_chars} characters")
+    bench("langchain, concatenated text", lambda: splitter.split_text("\n".join(page_texts)))
+    bench("langchain, per page", lambda: [c for text in page_texts for c in splitter.split_text(text)])
+    bench("chunker, per page (+metadata)", lambda: list(iter_page_chunks(pages, 1000, 200)))
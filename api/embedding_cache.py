@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from file_lock import file_lock
+
+# Load environment variables
+load_dotenv()
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+_KEY_BYTES = 32  # SHA-256 digest
+_LOG_LINE_BYTES = 2 * _KEY_BYTES + 12  # hex key, slot number and separators, roughly
+
+
+def text_key(text: str) -> str:
+    """Content address of a chunk: SHA-256 hex digest of its UTF-8 text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Fixed-capacity, memory-mapped embedding store for one model.
+
+    Vectors live in a (capacity, dim) float32 memmap and every slot also records the
+    SHA-256 of the text it holds. A writer clears a slot's key before replacing its
+    vector and sets the new key last, and readers check the key both before and after
+    copying the vector, so a slot being rewritten (by any process) is never served as
+    another text's vector. Slots are recycled in least-recently-used order once the
+    cache is full.
+
+    The key -> slot index is a snapshot (index.json) plus an append-only log of the
+    slots written since (index.log). Writers take the file lock, catch up with the log
+    and only then pick slots and append their writes, so worker processes sharing the
+    directory never hand out the same slot twice. The log is folded back into the
+    snapshot once it outgrows the cache and on close(); the generation file changes
+    with every snapshot so other processes know to reload it.
+    """
+
+    def __init__(self, directory: str, model_name: str, dim: int, max_entries: int):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.bin")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.log_path = os.path.join(self.directory, "index.log")
+        self.lock_path = os.path.join(self.directory, "index.lock")
+        self.generation_path = os.path.join(self.directory, "generation")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # key -> slot, oldest first
+        self._slot_keys = {}  # slot -> key, the inverse of _lru
+        self._free_slots = set()  # slots below _next_slot that hold no entry
+        self._next_slot = 0  # slots from here on have never been written
+        self._generation = None
+        self._log_offset = 0  # bytes of index.log already applied
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        with file_lock(self.lock_path):
+            index = self._read_index()
+            reuse = (
+                index is not None
+                and index.get("dim") == self.dim
+                and index.get("capacity") == self.max_entries
+                and os.path.exists(self.vectors_path)
+                and os.path.exists(self.keys_path)
+            )
+            mode = "r+" if reuse else "w+"
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode=mode,
+                                      shape=(self.max_entries, self.dim))
+            self._keys = np.memmap(self.keys_path, dtype=np.uint8, mode=mode,
+                                   shape=(self.max_entries, _KEY_BYTES))
+            if reuse:
+                self._replay(index)
+            else:
+                self._write_snapshot([])
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Embedding cache index unreadable, starting fresh: {e}")
+            return None
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.generation_path, "r", encoding="utf-8") as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _apply(self, key: str, slot: int):
+        """Record that slot now holds key; whichever key held the slot before is evicted"""
+        if not 0 <= slot < self.max_entries:
+            return
+        previous = self._slot_keys.get(slot)
+        if previous is not None and previous != key:
+            self._lru.pop(previous, None)
+        old_slot = self._lru.pop(key, None)
+        if old_slot is not None and old_slot != slot:
+            self._slot_keys.pop(old_slot, None)
+            self._free_slots.add(old_slot)
+        self._lru[key] = slot
+        self._slot_keys[slot] = key
+        self._free_slots.discard(slot)
+        if slot >= self._next_slot:
+            self._free_slots.update(range(self._next_slot, slot))
+            self._next_slot = slot + 1
+
+    def _read_log(self):
+        """Apply log lines past _log_offset; a torn final line is left for the next read"""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                parts = line.split()
+                if len(parts) == 2:
+                    self._apply(parts[0].decode("ascii"), int(parts[1]))
+                self._log_offset = f.tell()
+
+    def _replay(self, index: dict = None):
+        """
+        Rebuild key -> slot (oldest first) from the snapshot followed by the log. Entries
+        whose slot no longer holds their key (a crashed or concurrent write) are dropped
+        and their slots reused. Caller holds the file lock.
+        """
+        index = index if index is not None else (self._read_index() or {})
+        self._generation = self._read_generation()
+        self._lru, self._slot_keys, self._free_slots, self._next_slot = OrderedDict(), {}, set(), 0
+        self._log_offset = 0
+        for key, slot in index.get("entries", []):
+            self._apply(key, slot)
+        self._read_log()
+        for key, slot in list(self._lru.items()):
+            if bytes(self._keys[slot]) != bytes.fromhex(key):
+                del self._lru[key]
+                del self._slot_keys[slot]
+                self._free_slots.add(slot)
+
+    def _catch_up(self):
+        """Apply what other processes wrote since our last look. Caller holds the file lock"""
+        if self._generation != self._read_generation():
+            self._replay()  # another process compacted the log into a new snapshot
+        else:
+            self._read_log()
+
+    def _write_snapshot(self, entries: list):
+        """Replace index.json, empty the log and bump the generation; the caller holds the file lock"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model_name,
+                "dim": self.dim,
+                "capacity": self.max_entries,
+                "entries": entries
+            }, f)
+        os.replace(tmp_path, self.index_path)
+        open(self.log_path, "w").close()
+        self._generation = self._read_generation() + 1
+        with open(self.generation_path, "w", encoding="utf-8") as f:
+            f.write(str(self._generation))
+        self._log_offset = 0
+
+    def _compact(self):
+        """Fold the log into index.json. Caller holds self._lock and the file lock"""
+        self._catch_up()
+        self._write_snapshot(list(self._lru.items()))
+
+    def _allocate(self) -> int:
+        if self._free_slots:
+            return min(self._free_slots)
+        if self._next_slot < self.max_entries:
+            return self._next_slot
+        self.evictions += 1
+        return next(iter(self._lru.values()))
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: vector} for the keys present in the cache and mark them recently used."""
+        found = {}
+        with self._lock:
+            if any(key not in self._lru for key in keys) and self._log_changed():
+                with file_lock(self.lock_path, shared=True):
+                    self._catch_up()
+            for key in keys:
+                slot = self._lru.get(key)
+                if slot is not None:
+                    expected = bytes.fromhex(key)
+                    vector = None
+                    if bytes(self._keys[slot]) == expected:
+                        vector = np.array(self._vectors[slot])
+                    # Re-checked after the copy: a writer clears the key before touching the vector
+                    if vector is not None and bytes(self._keys[slot]) == expected:
+                        self._lru.move_to_end(key)
+                        found[key] = vector
+                        self.hits += 1
+                        continue
+                    # Slot was taken over by another writer; its log record tells us by whom
+                    del self._lru[key]
+                    if self._slot_keys.get(slot) == key:
+                        del self._slot_keys[slot]
+                self.misses += 1
+        return found
+
+    def _log_changed(self) -> bool:
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            size = 0
+        return size != self._log_offset or self._generation != self._read_generation()
+
+    def put_many(self, keys: list, vectors: np.ndarray):
+        """Store vectors under their keys, evicting least-recently-used entries when full."""
+        with self._lock, file_lock(self.lock_path):
+            # Slots are picked only once every other process's writes are known
+            self._catch_up()
+            written = []
+            for key, vector in zip(keys, vectors):
+                slot = self._lru.get(key)
+                if slot is None:
+                    slot = self._allocate()
+                self._keys[slot] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._apply(key, slot)
+                self._lru.move_to_end(key)
+                written.append(f"{key} {slot}\n")
+            self._vectors.flush()
+            self._keys.flush()
+            with open(self.log_path, "ab") as f:
+                if f.tell() > self._log_offset:
+                    written.insert(0, "\n")  # end a crashed writer's torn line so ours parse
+                f.write("".join(written).encode("ascii"))
+                self._log_offset = f.tell()
+            if self._log_offset > self.max_entries * _LOG_LINE_BYTES:
+                self._compact()
+
+    def close(self):
+        """Flush the vectors and fold the log into the index snapshot"""
+        with self._lock, file_lock(self.lock_path):
+            self._vectors.flush()
+            self._keys.flush()
+            self._compact()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._lru),
+                "capacity": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0
+            }
@@ -0,0 +1,243 @@
+import os
+import sys
+import importlib.util
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Load environment variables
+load_dotenv()
+
+# Embedding model configuration shared by ingestion and retrieval
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None  # None lets sentence-transformers pick
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 keeps the torch default
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+# torch, onnx (ONNX Runtime, fp32) or onnx-int8 (ONNX Runtime, dynamically quantized)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(".cache", "onnx"))
+# Instruction set targeted by int8 quantization: avx2, avx512, avx512_vnni or arm64
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+# Minimum cosine similarity of each backend's embeddings to torch's for the same text
+ONNX_PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.99}
+# Coalesce concurrent query encodes into one batch; with 0 max wait, queries that queue up
+# during a forward pass still share the next one
+QUERY_BATCHING_ENABLED = os.getenv("QUERY_BATCHING_ENABLED", "true").lower() == "true"
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "0"))
+
+if EMBEDDING_BACKEND not in ("torch", "onnx", "onnx-int8"):
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+# Checked at import so a missing optional dependency stops startup, not the first ingest
+if EMBEDDING_BACKEND != "torch" and not all(
+        importlib.util.find_spec(name) for name in ("optimum", "onnxruntime")):
+    raise ImportError(f"EMBEDDING_BACKEND={EMBEDDING_BACKEND} needs optimum[onnxruntime]: "
+                      f"pip install -r requirements-onnx.txt")
+
+# Global variables for lazy loading
+_model = None
+_model_lock = threading.Lock()
+_query_batcher = None
+
+def get_model_version(backend: str = None) -> str:
+    """
+    Identity of the vectors a backend produces, used as the registry model_version and
+    the embedding cache key. ONNX (and each int8 quantization) drifts slightly from torch,
+    so its vectors are never mixed with torch ones; torch keeps the bare model name.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "torch":
+        return EMBEDDING_MODEL
+    if backend == "onnx-int8":
+        return f"{EMBEDDING_MODEL}+onnx-int8-{EMBEDDING_ONNX_QUANTIZATION}"
+    return f"{EMBEDDING_MODEL}+{backend}"
+
+EMBEDDING_MODEL_VERSION = get_model_version()
+
+def get_onnx_model_dir() -> str:
+    """Local directory holding the exported ONNX graphs of EMBEDDING_MODEL"""
+    return os.path.join(EMBEDDING_ONNX_DIR, EMBEDDING_MODEL.strip("/").replace("/", "__"))
+
+def _onnx_model_kwargs() -> dict:
+    if EMBEDDING_THREADS <= 0:
+        return {}
+    import onnxruntime
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = EMBEDDING_THREADS
+    return {"session_options": session_options}
+
+def load_sentence_transformer(backend: str) -> SentenceTransformer:
+    """
+    Load EMBEDDING_MODEL on the given inference backend. ONNX graphs are exported
+    (and int8-quantized) once into EMBEDDING_ONNX_DIR, so later starts only load them.
+    """
+    if backend == "torch":
+        if EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        return SentenceTransformer(EMBEDDING_MODEL, device=EMBEDDING_DEVICE)
+    if backend not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+    model_dir = get_onnx_model_dir()
+    if not os.path.exists(os.path.join(model_dir, "onnx", "model.onnx")):
+        print(f"🔄 Exporting {EMBEDDING_MODEL} to ONNX...")
+        SentenceTransformer(EMBEDDING_MODEL, device="cpu", backend="onnx").save_pretrained(model_dir)
+    if backend == "onnx":
+        return SentenceTransformer(model_dir, device="cpu", backend="onnx",
+                                   model_kwargs=dict(_onnx_model_kwargs(), file_name="onnx/model.onnx"))
+
+    file_name = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        print(f"🔄 Quantizing ONNX model to int8 ({EMBEDDING_ONNX_QUANTIZATION})...")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(model_dir, device="cpu", backend="onnx"), EMBEDDING_ONNX_QUANTIZATION, model_dir,
+            file_suffix=f"qint8_{EMBEDDING_ONNX_QUANTIZATION}"
+        )
+    return SentenceTransformer(model_dir, device="cpu", backend="onnx",
+                               model_kwargs=dict(_onnx_model_kwargs(), file_name=file_name))
+
+def get_sentence_transformer():
+    """Lazy load the process-wide SentenceTransformer model"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f"🔄 Loading SentenceTransformer model ({EMBEDDING_MODEL}, {EMBEDDING_BACKEND})...")
+                _model = load_sentence_transformer(EMBEDDING_BACKEND)
+                print("✅ SentenceTransformer model loaded")
+    return _model
+
+def get_embedding_dimension() -> int:
+    """Dimension of the vectors produced by the shared model."""
+    return get_sentence_transformer().get_sentence_embedding_dimension()
+
+def embed_texts(texts: list, batch_size: int = None, model: SentenceTransformer = None) -> np.ndarray:
+    """
+    Encode texts in batches and return an (n, dim) array of normalized float32 embeddings.
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    embeddings = (model or get_sentence_transformer()).encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+class QueryBatcher:
+    """
+    Coalesces concurrent single-query encodes into one forward pass. A worker
+    thread takes every query waiting when it becomes free, waits at most max_wait
+    seconds for more (up to max_batch_size), and encodes them together, so under
+    load many callers share a batch while a lone query adds at most max_wait.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Encode one text through the shared batch; blocks until its vector is ready"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="query_batcher", daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                vectors = embed_texts([text for text, _ in batch], batch_size=len(batch))
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+def get_query_batcher() -> QueryBatcher:
+    """Lazy load the process-wide query batcher"""
+    global _query_batcher
+    if _query_batcher is None:
+        with _model_lock:
+            if _query_batcher is None:
+                _query_batcher = QueryBatcher(QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS / 1000)
+    return _query_batcher
+
+def embed_query(query: str) -> list:
+    """Encode a single query and return it as a list of Python floats for vector store calls."""
+    if QUERY_BATCHING_ENABLED:
+        vector = get_query_batcher().embed(query)
+    else:
+        vector = embed_texts([query])[0]
+    return vector.astype(float).tolist()
+
+
+if __name__ == "__main__":
+    # Parity and throughput of the ONNX backends against torch:
+    #   python embeddings.py [file.pdf]
+    # Exits non-zero if a backend's embeddings drift from torch beyond the threshold.
+    if len(sys.argv) > 1:
+        import pdfplumber
+        from chunker import iter_page_chunks
+        with pdfplumber.open(sys.argv[1]) as pdf:
+            pages = [(i + 1, page.extract_text() or "", []) for i, page in enumerate(pdf.pages)]
+        texts = [chunk["text"] for chunk in iter_page_chunks(pages, 1000, 200)][:256]
+    else:
+        texts = [
+            f"Banks shall comply with paragraph {i} of the master direction on "
+            f"{['KYC', 'priority sector lending', 'interest rates', 'NPA classification'][i % 4]} "
+            f"and report to the Reserve Bank of India within {i % 30 + 1} days." * (1 + i % 6)
+            for i in range(256)
+        ]
+    queries = [f"What is the reporting deadline under paragraph {i}?" for i in range(50)]
+
+    reference = None
+    failed = False
+    for backend in ("torch", "onnx", "onnx-int8"):
+        started = time.perf_counter()
+        model = load_sentence_transformer(backend)
+        embed_texts(queries[:2], model=model)  # warm up
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectors = embed_texts(texts, model=model)
+        throughput = len(texts) / (time.perf_counter() - started)
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            embed_texts([query], model=model)
+            latencies.append(time.perf_counter() - started)
+
+        if reference is None:
+            reference = vectors
+            parity = ""
+        else:
+            cosine = np.sum(reference * vectors, axis=1)
+            parity = f"  cosine vs torch min {cosine.min():.5f} mean {cosine.mean():.5f}"
+            if cosine.min() < ONNX_PARITY_MIN_COSINE[backend]:
+                parity += "  FAIL"
+                failed = True
+        print(f"{backend:<10} load {load_seconds:6.2f}s  {throughput:7.1f} chunks/s  "
+              f"query p50 {np.median(latencies) * 1000:6.1f} ms{parity}")
+    sys.exit(1 if failed else 0)
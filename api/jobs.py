@@ -0,0 +1,308 @@
+import os
+import uuid
+import socket
+import heapq
+import itertools
+import threading
+import traceback
+from concurrent.futures import Future, InvalidStateError
+from dotenv import load_dotenv
+from neon_database import db
+from vectorizer import process_and_store_pdf
+
+# Load environment variables
+load_dotenv()
+
+VECTORIZE_WORKERS = int(os.getenv("VECTORIZE_WORKERS", "2"))
+VECTORIZE_MAX_PENDING = int(os.getenv("VECTORIZE_MAX_PENDING", "100"))
+# Workers that background (auto-ingest) jobs may occupy at once; the rest stay free for users
+VECTORIZE_BACKGROUND_WORKERS = int(os.getenv("VECTORIZE_BACKGROUND_WORKERS", str(max(1, VECTORIZE_WORKERS - 1))))
+VECTORIZE_MAX_BACKGROUND = int(os.getenv("VECTORIZE_MAX_BACKGROUND", "1000"))
+AUTO_INGEST = os.getenv("AUTO_INGEST", "true").lower() == "true"
+# Seconds without a status or progress update after which a queued/running job is presumed lost
+VECTORIZE_STALE_AFTER = int(os.getenv("VECTORIZE_STALE_AFTER", "3600"))
+
+# Identifies this worker process in vectorization_jobs.worker
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Lower runs first
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 10
+
+
+class QueueFullError(Exception):
+    """Raised when the vectorization queue has no room for another job"""
+
+
+class VectorizationJobQueue:
+    """
+    Bounded priority worker pool that runs process_and_store_pdf off the request path.
+    Job state and progress are persisted in the vectorization_jobs table so any
+    worker process can answer status polls.
+
+    Every submit gets its own Future, so a caller that gives up (a disconnected
+    request cancelling its wait) never cancels the job or other callers' results.
+
+    User-triggered jobs always run before background ones, and background jobs
+    never occupy more than background_workers threads, so a user opening a
+    document is not stuck behind a backlog of auto-ingest work.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, background_workers: int, max_background: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.background_workers = min(background_workers, max_workers)
+        self.max_background = max_background
+        self._threads = []
+        self._cond = threading.Condition()
+        self._heap = []  # (priority, seq, job_id); superseded entries are skipped when popped
+        self._seq = itertools.count()
+        self._jobs = {}  # job_id -> queued/running job state
+        self._active_by_doc = {}  # doc_id -> job_id of the queued/running job
+        self._running_background = 0
+        self._closed = False
+
+    def _start_workers(self):
+        if not self._threads:
+            print(f"🔄 Starting vectorization workers ({self.max_workers})...")
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._worker, name=f"vectorize_{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print("✅ Vectorization workers started")
+
+    def _pending_count(self, background: bool) -> int:
+        return sum(1 for job in self._jobs.values() if (job["priority"] >= PRIORITY_BACKGROUND) == background)
+
+    def submit(self, doc_id: str, pdf_link: str, refresh: bool = False, priority: int = PRIORITY_USER):
+        """
+        Queue a document for vectorization and return (job row, Future). A document
+        that already has a queued or running job in this process reuses that job,
+        moving it up the queue if this submission has a higher priority and turning
+        on refresh if it has not started yet.
+        refresh=True re-checks an already vectorized document and applies changes incrementally.
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise QueueFullError("Vectorization queue is shutting down")
+
+            existing_job_id = self._active_by_doc.get(doc_id)
+            if existing_job_id:
+                job = self._jobs[existing_job_id]
+                job["waiters"].append(future)
+                if not job["started"]:
+                    job["refresh"] = job["refresh"] or refresh
+                    if priority < job["priority"]:
+                        job["priority"] = priority
+                        if job["queued"]:
+                            heapq.heappush(self._heap, (priority, next(self._seq), existing_job_id))
+                            self._cond.notify()
+            else:
+                background = priority >= PRIORITY_BACKGROUND
+                limit = self.max_background if background else self.max_pending
+                if self._pending_count(background) >= limit:
+                    raise QueueFullError("Vectorization queue is full, try again later")
+
+                # Reserve the slot now; the job is only handed to workers once its row exists
+                job_id = uuid.uuid4().hex
+                job = self._jobs[job_id] = {
+                    "doc_id": doc_id,
+                    "pdf_link": pdf_link,
+                    "refresh": refresh,
+                    "priority": priority,
+                    "queued": False,
+                    "started": False,
+                    "waiters": [future],
+                    "created": threading.Event()  # set once the job row insert has finished
+                }
+                self._active_by_doc[doc_id] = job_id
+
+        # Database calls happen outside the condition so other submits and workers never wait on them
+        if existing_job_id:
+            # The first submit may still be inserting the row
+            job["created"].wait()
+            job_row = db.get_vectorization_job(existing_job_id)
+            if job_row is None:
+                raise RuntimeError(f"Vectorization job {existing_job_id} could not be created")
+            return job_row, future
+
+        try:
+            job_row = db.create_vectorization_job(job_id, doc_id, pdf_link, worker=WORKER_ID)
+        except Exception as e:
+            self._finish(job_id, error=e)
+            raise
+        finally:
+            job["created"].set()
+
+        with self._cond:
+            job["queued"] = True
+            closed = self._closed
+            if not closed:
+                heapq.heappush(self._heap, (job["priority"], next(self._seq), job_id))
+                self._start_workers()
+                self._cond.notify()
+        if closed:
+            self._abandon([job_id])
+        return job_row, future
+
+    def get_job(self, job_id: str) -> dict:
+        return db.get_vectorization_job(job_id)
+
+    def _next_job(self):
+        """Block until a job may run on this worker; returns its id, or None on shutdown"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                # Drop entries of jobs that already started or were re-queued at a higher priority
+                while self._heap and (self._heap[0][2] not in self._jobs
+                                      or self._jobs[self._heap[0][2]]["started"]
+                                      or self._jobs[self._heap[0][2]]["priority"] != self._heap[0][0]):
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    priority, _, job_id = self._heap[0]
+                    background = priority >= PRIORITY_BACKGROUND
+                    if not background or self._running_background < self.background_workers:
+                        heapq.heappop(self._heap)
+                        self._jobs[job_id]["started"] = True
+                        if background:
+                            self._running_background += 1
+                        return job_id
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job_id = self._next_job()
+            if job_id is None:
+                return
+            job = self._jobs[job_id]
+            try:
+                namespace = self._run(job_id, job["doc_id"], job["pdf_link"], job["refresh"])
+            except Exception as e:
+                self._finish(job_id, error=e)
+            else:
+                self._finish(job_id, result=namespace)
+
+    def _finish(self, job_id: str, result=None, error: Exception = None):
+        """Retire a job and hand its outcome to every caller still waiting on it"""
+        with self._cond:
+            job = self._jobs.pop(job_id)
+            if job["started"] and job["priority"] >= PRIORITY_BACKGROUND:
+                self._running_background -= 1
+            if self._active_by_doc.get(job["doc_id"]) == job_id:
+                del self._active_by_doc[job["doc_id"]]
+            # Under the condition, so a concurrent submit cannot add a waiter after this
+            for waiter in job["waiters"]:
+                try:
+                    if error is None:
+                        waiter.set_result(result)
+                    else:
+                        waiter.set_exception(error)
+                except InvalidStateError:
+                    pass  # that caller cancelled its wait
+            self._cond.notify_all()
+
+    def _abandon(self, job_ids: list):
+        """Fail jobs that will never run (the queue shut down) in the table and for their callers"""
+        for job_id in job_ids:
+            error = QueueFullError("Vectorization queue shut down before the job started")
+            try:
+                db.fail_unfinished_vectorization_job(job_id, str(error))
+            except Exception as e:
+                print(f"⚠️ Could not mark vectorization job {job_id} failed: {e}")
+            self._finish(job_id, error=error)
+
+    def _run(self, job_id: str, doc_id: str, pdf_link: str, refresh: bool = False) -> str:
+        try:
+            db.update_vectorization_job(job_id, status="running")
+
+            def report(pages_parsed, chunks_embedded):
+                db.update_vectorization_job(job_id, pages_parsed=pages_parsed, chunks_embedded=chunks_embedded)
+
+            namespace = process_and_store_pdf(pdf_link, doc_id, progress=report, refresh=refresh)
+            if namespace is None:
+                raise ValueError("Document link did not return a PDF")
+            db.update_vectorization_job(job_id, status="succeeded", namespace=namespace)
+            return namespace
+        except Exception as e:
+            print(f"❌ Vectorization job {job_id} failed: {e}")
+            print(f"Detailed error: {traceback.format_exc()}")
+            try:
+                db.update_vectorization_job(job_id, status="failed", error=str(e))
+            except Exception:
+                pass
+            raise
+
+    def enqueue_new_documents(self, entries: list) -> int:
+        """
+        Queue freshly scraped documents (dicts with doc_id and pdf_link) for background
+        vectorization so they are indexed before anyone opens them. Returns the number queued.
+        """
+        queued = 0
+        for entry in entries:
+            if not entry.get("doc_id") or not entry.get("pdf_link"):
+                continue
+            try:
+                self.submit(entry["doc_id"], entry["pdf_link"], priority=PRIORITY_BACKGROUND)
+                queued += 1
+            except QueueFullError:
+                print(f"⚠️ Background vectorization queue full, {len(entries) - queued} documents left for on-demand ingest")
+                break
+            except Exception as e:
+                print(f"Error queueing {entry['doc_id']} for vectorization: {e}")
+        return queued
+
+    def recover_interrupted_jobs(self) -> int:
+        """
+        Fail jobs left queued or running by a worker process that is gone (crashed or
+        restarted) and queue their documents again in the background, so a status poll
+        never waits forever on them. Returns the number re-queued.
+        """
+        requeued = 0
+        for row in db.get_unfinished_vectorization_jobs():
+            if not self._is_orphaned(row):
+                continue
+            # Conditional update: only one starting process claims each job
+            if not db.fail_unfinished_vectorization_job(row["id"], "Interrupted before finishing; queued again"):
+                continue
+            try:
+                self.submit(row["doc_id"], row["pdf_link"], priority=PRIORITY_BACKGROUND)
+                requeued += 1
+            except QueueFullError:
+                print("⚠️ Background vectorization queue full, interrupted documents left for on-demand ingest")
+                break
+        return requeued
+
+    def _is_orphaned(self, row: dict) -> bool:
+        """Whether no live worker process can still be working on a queued/running job row"""
+        if row["idle_seconds"] is not None and row["idle_seconds"] >= VECTORIZE_STALE_AFTER:
+            return True
+        host, _, pid = (row.get("worker") or "").rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            return False  # another machine's process (or a legacy row): rely on staleness
+        if int(pid) == os.getpid():
+            with self._cond:
+                return row["id"] not in self._jobs
+        if os.name == "nt":
+            return False  # os.kill(pid, 0) would terminate the process on Windows
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            # Jobs whose row is still being inserted are abandoned by their submit
+            abandoned = [job_id for job_id, job in self._jobs.items() if job["queued"] and not job["started"]]
+            self._cond.notify_all()
+        self._abandon(abandoned)
+
+
+# Global job queue instance
+job_queue = VectorizationJobQueue(VECTORIZE_WORKERS, VECTORIZE_MAX_PENDING,
+                                  VECTORIZE_BACKGROUND_WORKERS, VECTORIZE_MAX_BACKGROUND)
@@ -1,19 +1,23 @@
 from langchain_openai import ChatOpenAI  
 from langgraph.prebuilt import create_react_agent
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
 from langchain.tools import StructuredTool
+from langchain_core.messages import ToolMessage
 import os
 from dotenv import load_dotenv
+from embeddings import embed_query
+from retrieval import retrieve_context, retrieve_passages, format_passages, get_passage_sources, run_retrieval
+from vector_registry import registry
+from answer_cache import answer_cache
 
 # Load environment variables
 load_dotenv()
 
+# "direct" retrieves from the document and answers in one LLM call;
+# "agent" lets the ReAct agent decide when to call the retrieval tool
+DOC_QA_MODE = os.getenv("DOC_QA_MODE", "direct").lower()
+
 # Global variables for lazy loading
 _llm = None
-_pc = None
-_index = None
-_model = None
 _agent_executor = None
 _tools = None
 
@@ -51,63 +55,25 @@ def get_llm():
         print("✅ ChatOpenAI model loaded")
     return _llm
 
-def get_pinecone_client():
-    """Lazy load Pinecone client"""
-    global _pc
-    if _pc is None:
-        print("🔄 Loading Pinecone client...")
-        _pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        print("✅ Pinecone client loaded")
-    return _pc
-
-def get_pinecone_index():
-    """Lazy load Pinecone index"""
-    global _index
-    if _index is None:
-        print("🔄 Loading Pinecone index...")
-        pc = get_pinecone_client()
-        _index = pc.Index("fincompilance")
-        print("✅ Pinecone index loaded")
-    return _index
-
-def get_sentence_transformer():
-    """Lazy load SentenceTransformer model"""
-    global _model
-    if _model is None:
-        print("🔄 Loading SentenceTransformer model...")
-        _model = SentenceTransformer('all-mpnet-base-v2')
-        print("✅ SentenceTransformer model loaded")
-    return _model
-
 def pinecone_query_tool(query: str, namespace: str, top_k: int = 5):
     """
-    Encode query with sentence-transformers, search Pinecone, and return top results.
+    Encode query with sentence-transformers, search the vector store, and return top results.
     """
     try:
-        # Lazy load models
-        model = get_sentence_transformer()
-        index = get_pinecone_index()
-        
         # Encode the query into an embedding
-        query_embedding = model.encode(query).tolist()
-
-        # Query Pinecone
-        results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True,
-            namespace=namespace
-        )
-
-        matches = results.get("matches", [])
-        context_chunks = [m["metadata"].get("text", "") for m in matches]
+        query_embedding = embed_query(query)
 
-        return "\n\n---\n\n".join(context_chunks)
+        # Query the vector store; chunks come back with page/section citations
+        return retrieve_context(query_embedding, namespace, top_k=top_k)
 
     except Exception as e:
         print(f" Error while querying: {e}")
         raise
 
+async def apinecone_query_tool(query: str, namespace: str, top_k: int = 5):
+    """Async pinecone_query_tool for agents run with ainvoke/astream, on the retrieval executor"""
+    return await run_retrieval(pinecone_query_tool, query, namespace, top_k)
+
 def get_tools():
     """Lazy load tools"""
     global _tools
@@ -115,6 +81,7 @@ def get_tools():
         _tools = [
             StructuredTool.from_function(
                 func=pinecone_query_tool,
+                coroutine=apinecone_query_tool,
                 name="pinecone_query",
                 description="Query Pinecone with a natural language question and a namespace (document ID). Returns top matching text chunks."
             )
@@ -132,18 +99,139 @@ def get_agent_executor():
         print("✅ React agent created")
     return _agent_executor
 
-def ask_doc_question(user_question: str, doc_id: str, top_k: int = 5):
-    """
-    Run an agent query with user input and specific doc_id (namespace).
-    """
-    # Lazy load agent
-    agent_executor = get_agent_executor()
-    
-    # Build messages properly for ChatOpenAI
-    messages = [
+def build_direct_messages(user_question: str, context: str) -> list:
+    """Messages for a single generation call over already retrieved document context"""
+    context = context or "No matching content was found in this document."
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Retrieved document context:\n{context}\n\nQuestion: {user_question}"}
+    ]
+
+def build_agent_messages(user_question: str, doc_id: str) -> list:
+    """Messages for the ReAct agent, which queries the document's namespace itself"""
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": f"Question: {user_question}\nUse namespace: pdf_chunks_{doc_id}\nReturn relevant context."}
     ]
-    response = agent_executor.invoke({"messages": messages})
-    result = response["messages"][-1].content
+
+def retrieve_document_passages(user_question: str, doc_id: str, top_k: int = 5, query_embedding=None) -> list:
+    """Top passages of the document for the question (see retrieval.build_passages)"""
+    if query_embedding is None:
+        query_embedding = embed_query(user_question)
+    return retrieve_passages(query_embedding, f"pdf_chunks_{doc_id}", top_k=top_k)
+
+def answer_direct(user_question: str, doc_id: str, top_k: int = 5, query_embedding=None) -> str:
+    """Retrieve-then-generate: embed the question, query the document's namespace, one LLM call"""
+    passages = retrieve_document_passages(user_question, doc_id, top_k, query_embedding)
+    response = get_llm().invoke(build_direct_messages(user_question, format_passages(passages)))
+    return response.content
+
+def answer_with_agent(user_question: str, doc_id: str) -> str:
+    """ReAct agent that decides itself when to query the document's namespace"""
+    # Lazy load agent
+    agent_executor = get_agent_executor()
+    response = agent_executor.invoke({"messages": build_agent_messages(user_question, doc_id)})
+    return response["messages"][-1].content
+
+async def stream_agent_events(agent, messages: list):
+    """
+    Run a LangGraph agent and yield (event, data) pairs as it goes:
+    ("retrieval", {"tool"}) whenever a tool call returns, and ("token", {"content"})
+    for every chunk of text the model writes. Text written before a tool call is
+    not part of the answer, so consumers should start the answer over on "retrieval".
+    """
+    async for message, metadata in agent.astream({"messages": messages}, stream_mode="messages"):
+        if isinstance(message, ToolMessage):
+            yield "retrieval", {"tool": message.name}
+        elif metadata.get("langgraph_node") == "agent" and isinstance(message.content, str) and message.content:
+            yield "token", {"content": message.content}
+
+def _get_cached_answer(user_question: str, doc_id: str):
+    """(cached answer or None, question embedding, document version) for the answer cache"""
+    if answer_cache is None:
+        return None, None, None
+    query_embedding = embed_query(user_question)
+    cached = answer_cache.get(doc_id, query_embedding, lambda: registry.get_version(doc_id))
+    if cached is not None:
+        return cached, query_embedding, None
+    # Version the answer will be grounded in, read before retrieval runs
+    return None, query_embedding, registry.get_version(doc_id)
+
+def _cache_answer(doc_id: str, query_embedding, answer: str, version):
+    # Documents that are not vectorized yet have no grounded answer to cache
+    if answer_cache is not None and version is not None and answer:
+        answer_cache.put(doc_id, query_embedding, answer, version)
+
+def ask_doc_question(user_question: str, doc_id: str, top_k: int = 5, mode: str = None):
+    """
+    Answer a question about one document (namespace pdf_chunks_<doc_id>), in DOC_QA_MODE
+    unless mode is given.
+    Answers are cached per document: a question close enough to one already answered
+    for the same version of the document returns the earlier answer without an LLM call.
+    """
+    mode = (mode or DOC_QA_MODE).lower()
+    cached, query_embedding, version = _get_cached_answer(user_question, doc_id)
+    if cached is not None:
+        return cached
+
+    if mode == "agent":
+        result = answer_with_agent(user_question, doc_id)
+    else:
+        result = answer_direct(user_question, doc_id, top_k, query_embedding)
+
+    _cache_answer(doc_id, query_embedding, result, version)
     return result
+
+async def aask_doc_question(user_question: str, doc_id: str, top_k: int = 5, mode: str = None):
+    """
+    ask_doc_question for the event loop: the LLM is awaited (ainvoke) and blocking
+    retrieval and cache lookups run on the bounded retrieval executor.
+    """
+    mode = (mode or DOC_QA_MODE).lower()
+    cached, query_embedding, version = await run_retrieval(_get_cached_answer, user_question, doc_id)
+    if cached is not None:
+        return cached
+
+    if mode == "agent":
+        response = await get_agent_executor().ainvoke({"messages": build_agent_messages(user_question, doc_id)})
+        result = response["messages"][-1].content
+    else:
+        passages = await run_retrieval(retrieve_document_passages, user_question, doc_id, top_k, query_embedding)
+        response = await get_llm().ainvoke(build_direct_messages(user_question, format_passages(passages)))
+        result = response.content
+
+    _cache_answer(doc_id, query_embedding, result, version)
+    return result
+
+async def stream_doc_question(user_question: str, doc_id: str, top_k: int = 5, mode: str = None):
+    """
+    Streaming aask_doc_question: yields ("retrieval", {...}) once the document context
+    is retrieved, ("token", {"content"}) as the answer is generated and finally
+    ("done", {"content", "cached"}) with the complete answer.
+    """
+    mode = (mode or DOC_QA_MODE).lower()
+    cached, query_embedding, version = await run_retrieval(_get_cached_answer, user_question, doc_id)
+    if cached is not None:
+        yield "token", {"content": cached}
+        yield "done", {"content": cached, "cached": True}
+        return
+
+    parts = []
+    if mode == "agent":
+        async for event, data in stream_agent_events(get_agent_executor(), build_agent_messages(user_question, doc_id)):
+            if event == "retrieval":
+                parts = []
+            else:
+                parts.append(data["content"])
+            yield event, data
+    else:
+        passages = await run_retrieval(retrieve_document_passages, user_question, doc_id, top_k, query_embedding)
+        yield "retrieval", {"sources": get_passage_sources(passages)}
+        async for chunk in get_llm().astream(build_direct_messages(user_question, format_passages(passages))):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield "token", {"content": chunk.content}
+
+    result = "".join(parts)
+    _cache_answer(doc_id, query_embedding, result, version)
+    yield "done", {"content": result, "cached": False}
@@ -0,0 +1,102 @@
+"""
+Load test for the chat endpoints: runs N concurrent users against a running API
+(normally a single uvicorn worker) and reports throughput and latency per level.
+
+    python load_test.py --doc-id <doc_id>
+    python load_test.py --endpoint workflow_chat --workflow-id 1 --user-id u1 \
+        --doc-id pdf_chunks_<doc_id> --doc-title "Master Circular ..." --concurrency 1,4,16
+
+With a non-blocking request path, throughput should grow with the number of
+concurrent users until the LLM provider or the executors are saturated, instead of
+staying flat at one request per LLM round trip.
+"""
+import argparse
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def build_request(args) -> tuple:
+    """(method, path, params, json body) for the chosen endpoint"""
+    if args.endpoint == "process_message":
+        return "POST", "/process_message", None, {"message": args.message, "doc_id": args.doc_id}
+    if args.endpoint == "process_message_stream":
+        return "POST", "/process_message/stream", None, {"message": args.message, "doc_id": args.doc_id}
+    if args.endpoint == "workflow_chat":
+        return "POST", f"/workflows/{args.workflow_id}/chat", {"user_id": args.user_id}, {
+            "query": args.message,
+            "doc_ids": [args.doc_id],
+            "doc_titles": [args.doc_title]
+        }
+    if args.endpoint == "get_circulars":
+        return "GET", "/get_circulars", None, None
+    raise ValueError(f"Unknown endpoint: {args.endpoint}")
+
+def run_user(session, url: str, request: tuple, count: int, timeout: float) -> list:
+    """Send count requests one after another; returns [(latency, ok), ...]"""
+    method, path, params, body = request
+    results = []
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url + path, params=params, json=body, timeout=timeout)
+            # Read the whole body so streaming endpoints are timed to the last event
+            response.content
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        results.append((time.perf_counter() - started, ok))
+    return results
+
+def run_level(url: str, request: tuple, users: int, requests_per_user: int, timeout: float) -> dict:
+    sessions = threading.local()
+
+    def user(_):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        return run_user(sessions.session, url, request, requests_per_user, timeout)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = [result for user_results in pool.map(user, range(users)) for result in user_results]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    return {
+        "users": users,
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": latencies[math.ceil(0.95 * len(latencies)) - 1] if latencies else None
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the FinCompliance API")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--endpoint", default="process_message",
+                        choices=["process_message", "process_message_stream", "workflow_chat", "get_circulars"])
+    parser.add_argument("--doc-id", default="")
+    parser.add_argument("--doc-title", default="Document")
+    parser.add_argument("--workflow-id", default="1")
+    parser.add_argument("--user-id", default="load_test")
+    parser.add_argument("--message", default="What is the effective date of this circular?")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated numbers of concurrent users")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    request = build_request(args)
+    url = args.url.rstrip("/")
+    print(f"{args.endpoint} on {url}, {args.requests_per_user} requests per user")
+    print(f"{'users':>5} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for users in [int(level) for level in args.concurrency.split(",") if level.strip()]:
+        level = run_level(url, request, users, args.requests_per_user, args.timeout)
+        p50 = f"{level['p50']:.3f}" if level["p50"] is not None else "-"
+        p95 = f"{level['p95']:.3f}" if level["p95"] is not None else "-"
+        print(f"{level['users']:>5} {level['requests']:>8} {level['errors']:>6} "
+              f"{level['throughput']:>8.2f} {p50:>8} {p95:>8}")
@@ -1,27 +1,159 @@
 # db.py
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import os
+import functools
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 load_dotenv()
+
+# Connections kept open per worker process; callers wait when all are in use
+DB_POOL_MIN_CONNECTIONS = int(os.getenv("DB_POOL_MIN_CONNECTIONS", "1"))
+DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10"))
+
+def pooled(method):
+    """
+    Run a Database method on a connection borrowed from the pool for the duration of
+    the call; self.connect() inside it returns that connection. Nested calls reuse it.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, "conn", None) is not None:
+            return method(self, *args, **kwargs)
+        with self.connection() as conn:
+            self._local.conn = conn
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._local.conn = None
+    return wrapper
+
+class AdvisorySession:
+    """Session-level advisory locks taken on one borrowed connection (see Database.advisory_session)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def lock(self, keys, timeout):
+        """
+        Take every key, in sorted order so overlapping callers cannot deadlock.
+        Raises psycopg2.errors.LockNotAvailable after timeout seconds on any one key.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("SET lock_timeout = %s", (f"{int(timeout * 1000)}ms",))
+            for key in sorted(set(keys)):
+                cur.execute("SELECT pg_advisory_lock(%s)", (key,))
+
+    def try_lock(self, key) -> bool:
+        """Take key if it is free; returns whether it was acquired"""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+            return cur.fetchone()[0]
+
+    def unlock(self, key):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (key,))
+
 class Database:
     def __init__(self):
-        self.connection = None
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(DB_POOL_MAX_CONNECTIONS)
+        self._local = threading.local()
 
-    def connect(self):
-        if self.connection and not self.connection.closed:
-            return self.connection
-
-        self.connection = psycopg2.connect(
+    def _connection_params(self):
+        return dict(
             host=os.getenv("PGHOST"),
             dbname=os.getenv("PGDATABASE"),
             user=os.getenv("PGUSER"),
             password=os.getenv("PGPASSWORD"),
             sslmode=os.getenv("PGSSLMODE", "require")
         )
-        self.connection.autocommit = False
-        return self.connection
 
+    def _open_connection(self):
+        return psycopg2.connect(**self._connection_params())
+
+    def open_pool(self):
+        """Create the connection pool on first use and return it"""
+        if self.pool is None or self.pool.closed:
+            with self._pool_lock:
+                if self.pool is None or self.pool.closed:
+                    self.pool = psycopg2.pool.ThreadedConnectionPool(
+                        DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS, **self._connection_params()
+                    )
+        return self.pool
+
+    def connect(self):
+        """Connection borrowed by the current @pooled method call"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            raise RuntimeError("Database.connect() called outside a @pooled method")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for the duration of the block, so concurrent
+        requests and workers each run their own transactions. An unfinished
+        transaction is rolled back when the connection is returned, and a
+        connection that broke (e.g. closed by the server while idle) is discarded.
+        """
+        pool = self.open_pool()
+        with self._slots:
+            conn = pool.getconn()
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+
+    @contextmanager
+    def advisory_lock(self, key, timeout):
+        """
+        Hold a session-level Postgres advisory lock for the duration of the block.
+        Uses its own connection so waiting does not hold a pooled one; if the
+        holder dies its session ends and the lock is released. Raises
+        psycopg2.errors.LockNotAvailable after timeout seconds.
+        """
+        conn = self._open_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SET lock_timeout = %s", (f"{int(timeout * 1000)}ms",))
+                cur.execute("SELECT pg_advisory_lock(%s)", (key,))
+            yield
+        finally:
+            # Closing the session releases the lock
+            conn.close()
+
+    @contextmanager
+    def advisory_session(self):
+        """
+        Borrow one pooled connection for several session-level advisory locks
+        (see AdvisorySession), instead of a new connection per lock. Locks still held
+        at the end of the block are released before the connection goes back to the
+        pool; a connection that cannot release them is closed instead.
+        """
+        with self.connection() as conn:
+            autocommit = conn.autocommit
+            conn.autocommit = True
+            try:
+                yield AdvisorySession(conn)
+            finally:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_advisory_unlock_all()")
+                        cur.execute("RESET lock_timeout")
+                    conn.autocommit = autocommit
+                except psycopg2.Error:
+                    conn.close()
+
+    @pooled
     def save_message(self, user_id, role, content):
         conn = self.connect()
         try:
@@ -36,6 +168,7 @@ class Database:
             conn.rollback()
             raise
 
+    @pooled
     def get_user_chat_history(self, user_id, limit=10):
         conn = self.connect()
         with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
@@ -48,6 +181,7 @@ class Database:
             """, (user_id, limit))
             return [dict(row) for row in cur.fetchall()]
 
+    @pooled
     def save_press_release(self, entry: dict):
         conn = self.connect()
         with conn.cursor() as cur:
@@ -68,6 +202,7 @@ class Database:
                 ),
             )
         conn.commit()
+    @pooled
     def get_existing_links(self):
         conn = self.connect()
         with conn.cursor() as cur:
@@ -75,6 +210,7 @@ class Database:
             # normalize: strip + lowercase
             links = {row[0].strip().lower() for row in cur.fetchall() if row[0]}
             return links
+    @pooled
     def get_latest_press_releases(self, limit=20):
         conn = self.connect()
         with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
@@ -86,6 +222,7 @@ class Database:
             """, (limit,))
             return [dict(row) for row in cur.fetchall()]
 
+    @pooled
     def save_circular(self, entry):
         """Save a master circular into the database"""
         conn = self.connect()
@@ -114,6 +251,7 @@ class Database:
             raise
 
 
+    @pooled
     def get_existing_circular_links(self):
         """Fetch existing circular PDF links (normalized)"""
         conn = self.connect()
@@ -121,6 +259,7 @@ class Database:
             cur.execute("SELECT pdf_link FROM rbi_circulars")
             return {row[0].strip().lower() for row in cur.fetchall() if row[0]}
 
+    @pooled
     def get_latest_circulars(self, limit=20):
         """Fetch the latest master circulars"""
         conn = self.connect()
@@ -134,6 +273,7 @@ class Database:
             return [dict(row) for row in cur.fetchall()]
 
     # Workflow methods
+    @pooled
     def create_workflow(self, user_id, name=None, description=None):
         """Create a new workflow"""
         conn = self.connect()
@@ -151,6 +291,7 @@ class Database:
             conn.rollback()
             raise
 
+    @pooled
     def add_document_to_workflow(self, workflow_id, doc_type, doc_id):
         """Add document to workflow with validation"""
         conn = self.connect()
@@ -181,6 +322,7 @@ class Database:
             raise
 
 
+    @pooled
     def get_workflow_with_documents(self, workflow_id):
         """Get workflow with its linked documents"""
         conn = self.connect()
@@ -205,6 +347,7 @@ class Database:
             
             return workflow_dict
 
+    @pooled
     def get_user_workflows(self, user_id, limit=50):
         """Get all workflows for a user"""
         conn = self.connect()
@@ -217,6 +360,7 @@ class Database:
             """, (user_id, limit))
             return [dict(row) for row in cur.fetchall()]
 
+    @pooled
     def get_press_release_id_by_doc_id(self, doc_id):
         conn = self.connect()
         with conn.cursor() as cur:
@@ -225,6 +369,7 @@ class Database:
             return result[0] if result else None
 
 
+    @pooled
     def get_circular_id_by_doc_id(self, doc_id):
         conn = self.connect()
         with conn.cursor() as cur:
@@ -232,6 +377,7 @@ class Database:
             result = cur.fetchone()
             return result[0] if result else None
 
+    @pooled
     def get_document_by_type_and_id(self, doc_type, doc_id):
         """Get document details by doc_type and database ID"""
         conn = self.connect()
@@ -255,6 +401,7 @@ class Database:
             return dict(result) if result else None
 
     # Workflow Chat Messages methods
+    @pooled
     def save_workflow_chat_message(self, workflow_id, user_id, role, content, document_data=None):
         """Save a chat message for a specific workflow"""
         conn = self.connect()
@@ -273,6 +420,7 @@ class Database:
             conn.rollback()
             raise
 
+    @pooled
     def get_workflow_chat_history(self, workflow_id, user_id, limit=50):
         """Get chat history for a specific workflow and user"""
         conn = self.connect()
@@ -286,6 +434,7 @@ class Database:
             """, (workflow_id, user_id, limit))
             return [dict(row) for row in cur.fetchall()]
 
+    @pooled
     def clear_workflow_chat_history(self, workflow_id, user_id):
         """Clear chat history for a specific workflow and user"""
         conn = self.connect()
@@ -302,6 +451,7 @@ class Database:
             conn.rollback()
             raise
 
+    @pooled
     def remove_document_from_workflow(self, workflow_id, doc_type, doc_id):
         """Remove document from workflow"""
         conn = self.connect()
@@ -318,6 +468,7 @@ class Database:
             conn.rollback()
             raise
 
+    @pooled
     def delete_workflow(self, workflow_id, user_id):
         """Delete a workflow and all associated data"""
         conn = self.connect()
@@ -345,5 +496,339 @@ class Database:
             conn.rollback()
             raise
 
+    # Vectorization job methods
+    @pooled
+    def ensure_vectorization_jobs_table(self):
+        """Create the vectorization job table if it does not exist"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS vectorization_jobs (
+                        id TEXT PRIMARY KEY,
+                        doc_id TEXT NOT NULL,
+                        pdf_link TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        namespace TEXT,
+                        pages_parsed INTEGER NOT NULL DEFAULT 0,
+                        chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                        error TEXT,
+                        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                        started_at TIMESTAMP,
+                        finished_at TIMESTAMP
+                    )
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vectorization_jobs_doc_id
+                    ON vectorization_jobs (doc_id)
+                """)
+                # Worker process that owns the job and last status/progress write, used to
+                # recognise jobs left queued or running by a process that died
+                cur.execute("""
+                    ALTER TABLE vectorization_jobs
+                    ADD COLUMN IF NOT EXISTS worker TEXT,
+                    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP
+                """)
+                conn.commit()
+        except Exception as e:
+            print(f"❌ Error creating vectorization jobs table: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def create_vectorization_job(self, job_id, doc_id, pdf_link, worker=None):
+        """Insert a queued vectorization job"""
+        conn = self.connect()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute("""
+                    INSERT INTO vectorization_jobs (id, doc_id, pdf_link, status, worker, created_at, updated_at)
+                    VALUES (%s, %s, %s, 'queued', %s, NOW(), NOW())
+                    RETURNING *
+                """, (job_id, doc_id, pdf_link, worker))
+                conn.commit()
+                return dict(cur.fetchone())
+        except Exception as e:
+            print(f"❌ Error creating vectorization job: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def update_vectorization_job(self, job_id, status=None, namespace=None, pages_parsed=None,
+                                 chunks_embedded=None, error=None):
+        """Update status and progress counters of a vectorization job"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE vectorization_jobs SET
+                        status = COALESCE(%s, status),
+                        namespace = COALESCE(%s, namespace),
+                        pages_parsed = COALESCE(%s, pages_parsed),
+                        chunks_embedded = COALESCE(%s, chunks_embedded),
+                        error = COALESCE(%s, error),
+                        started_at = CASE WHEN %s = 'running' THEN NOW() ELSE started_at END,
+                        finished_at = CASE WHEN %s IN ('succeeded', 'failed') THEN NOW() ELSE finished_at END,
+                        updated_at = NOW()
+                    WHERE id = %s
+                """, (status, namespace, pages_parsed, chunks_embedded, error, status, status, job_id))
+                conn.commit()
+        except Exception as e:
+            print(f"❌ Error updating vectorization job: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def get_vectorization_job(self, job_id):
+        """Get a vectorization job by id"""
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT * FROM vectorization_jobs WHERE id = %s
+            """, (job_id,))
+            result = cur.fetchone()
+            return dict(result) if result else None
+
+    @pooled
+    def get_unfinished_vectorization_jobs(self):
+        """Jobs still queued or running, with the seconds since their last update"""
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT id, doc_id, pdf_link, status, worker,
+                       EXTRACT(EPOCH FROM NOW() - COALESCE(updated_at, created_at)) AS idle_seconds
+                FROM vectorization_jobs
+                WHERE status IN ('queued', 'running')
+                ORDER BY created_at
+            """)
+            return [dict(row) for row in cur.fetchall()]
+
+    @pooled
+    def fail_unfinished_vectorization_job(self, job_id, error):
+        """Mark a queued/running job failed; False if it finished (or was claimed) meanwhile"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE vectorization_jobs
+                    SET status = 'failed', error = %s, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = %s AND status IN ('queued', 'running')
+                """, (error, job_id))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"❌ Error failing vectorization job: {e}")
+            conn.rollback()
+            raise
+
+    # Vectorization registry methods
+    @pooled
+    def ensure_vectorized_documents_table(self):
+        """Create the vectorization registry table if it does not exist"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS vectorized_documents (
+                        doc_id TEXT PRIMARY KEY,
+                        namespace TEXT NOT NULL,
+                        chunk_count INTEGER,
+                        model_version TEXT,
+                        content_hash TEXT,
+                        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                """)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS vectorized_chunks (
+                        doc_id TEXT NOT NULL REFERENCES vectorized_documents (doc_id) ON DELETE CASCADE,
+                        chunk_id TEXT NOT NULL,
+                        chunk_hash TEXT NOT NULL,
+                        chunk_index INTEGER NOT NULL,
+                        PRIMARY KEY (doc_id, chunk_id)
+                    )
+                """)
+                # Per-document provenance of each chunk (shared chunks have one row per document)
+                cur.execute("""
+                    ALTER TABLE vectorized_chunks
+                        ADD COLUMN IF NOT EXISTS page INTEGER,
+                        ADD COLUMN IF NOT EXISTS start_offset INTEGER,
+                        ADD COLUMN IF NOT EXISTS end_offset INTEGER,
+                        ADD COLUMN IF NOT EXISTS heading TEXT
+                """)
+                # Chunks of the document stored in the shared namespace (NULL: not tracked yet)
+                cur.execute("""
+                    ALTER TABLE vectorized_documents
+                        ADD COLUMN IF NOT EXISTS shared_chunk_count INTEGER
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vectorized_chunks_chunk_hash
+                    ON vectorized_chunks (chunk_hash)
+                """)
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_vectorized_chunks_chunk_id
+                    ON vectorized_chunks (chunk_id)
+                """)
+                conn.commit()
+        except Exception as e:
+            print(f"❌ Error creating vectorized documents table: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def get_vectorized_document(self, doc_id):
+        """Get the registry entry of a vectorized document"""
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT doc_id, namespace, chunk_count, model_version, content_hash, shared_chunk_count, updated_at
+                FROM vectorized_documents
+                WHERE doc_id = %s
+            """, (doc_id,))
+            result = cur.fetchone()
+            return dict(result) if result else None
+
+    @pooled
+    def upsert_vectorized_document(self, doc_id, namespace, chunk_count, model_version, content_hash,
+                                   chunks=None, shared_chunk_count=None):
+        """
+        Record (or refresh) the registry entry of a vectorized document. When chunks
+        is given as [(chunk_id, chunk_hash[, {"page", "start", "end", "heading"}]), ...]
+        in document order, the stored chunk list is replaced in the same transaction.
+        """
+        conn = self.connect()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute("""
+                    INSERT INTO vectorized_documents
+                        (doc_id, namespace, chunk_count, model_version, content_hash, shared_chunk_count, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                    ON CONFLICT (doc_id) DO UPDATE SET
+                        namespace = EXCLUDED.namespace,
+                        chunk_count = EXCLUDED.chunk_count,
+                        model_version = EXCLUDED.model_version,
+                        content_hash = EXCLUDED.content_hash,
+                        shared_chunk_count = EXCLUDED.shared_chunk_count,
+                        updated_at = NOW()
+                    RETURNING doc_id, namespace, chunk_count, model_version, content_hash, shared_chunk_count,
+                              updated_at
+                """, (doc_id, namespace, chunk_count, model_version, content_hash, shared_chunk_count))
+                entry = dict(cur.fetchone())
+                if chunks is not None:
+                    cur.execute("""
+                        DELETE FROM vectorized_chunks WHERE doc_id = %s
+                    """, (doc_id,))
+                    rows = []
+                    for i, (chunk_id, chunk_hash, *provenance) in enumerate(chunks):
+                        info = provenance[0] if provenance else {}
+                        rows.append((doc_id, chunk_id, chunk_hash, i, info.get("page"), info.get("start"),
+                                     info.get("end"), info.get("heading")))
+                    psycopg2.extras.execute_values(cur, """
+                        INSERT INTO vectorized_chunks
+                            (doc_id, chunk_id, chunk_hash, chunk_index, page, start_offset, end_offset, heading)
+                        VALUES %s
+                    """, rows)
+                conn.commit()
+                return entry
+        except Exception as e:
+            print(f"❌ Error saving vectorized document: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def get_vectorized_chunks(self, doc_id):
+        """Get the stored chunks of a vectorized document in document order"""
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT chunk_id, chunk_hash, chunk_index, page, start_offset, end_offset, heading
+                FROM vectorized_chunks
+                WHERE doc_id = %s
+                ORDER BY chunk_index ASC
+            """, (doc_id,))
+            return [dict(row) for row in cur.fetchall()]
+
+    @pooled
+    def get_chunk_context(self, doc_id, chunk_ids, window=0):
+        """
+        Stored chunks of doc_id within window positions of any of chunk_ids, in
+        document order, with their provenance (page, offsets, heading)
+        """
+        if not chunk_ids:
+            return []
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT DISTINCT c.chunk_id, c.chunk_index, c.page, c.start_offset, c.end_offset, c.heading
+                FROM vectorized_chunks c
+                JOIN vectorized_chunks hit
+                    ON hit.doc_id = c.doc_id
+                    AND c.chunk_index BETWEEN hit.chunk_index - %s AND hit.chunk_index + %s
+                WHERE c.doc_id = %s AND hit.chunk_id = ANY(%s)
+                ORDER BY c.chunk_index ASC
+            """, (window, window, doc_id, list(chunk_ids)))
+            return [dict(row) for row in cur.fetchall()]
+
+    @pooled
+    def get_chunk_owners(self, chunk_hashes, exclude_doc_id, model_version):
+        """
+        Find other documents (embedded with model_version) that already store any of
+        chunk_hashes. Returns {chunk_hash: [{"doc_id", "chunk_id", "namespace"}, ...]}.
+        """
+        if not chunk_hashes:
+            return {}
+        conn = self.connect()
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            cur.execute("""
+                SELECT c.chunk_hash, c.doc_id, c.chunk_id, d.namespace
+                FROM vectorized_chunks c
+                JOIN vectorized_documents d ON d.doc_id = c.doc_id
+                WHERE c.chunk_hash = ANY(%s) AND c.doc_id <> %s AND d.model_version = %s
+            """, (list(chunk_hashes), exclude_doc_id, model_version))
+            owners = {}
+            for row in cur.fetchall():
+                owners.setdefault(row["chunk_hash"], []).append(
+                    {"doc_id": row["doc_id"], "chunk_id": row["chunk_id"], "namespace": row["namespace"]}
+                )
+            return owners
+
+    @pooled
+    def rename_vectorized_chunk(self, doc_id, chunk_id, new_chunk_id):
+        """Point a document's chunk at a new vector id (e.g. after moving it to the shared namespace)"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE vectorized_chunks SET chunk_id = %s
+                    WHERE doc_id = %s AND chunk_id = %s
+                """, (new_chunk_id, doc_id, chunk_id))
+                renamed = cur.rowcount > 0
+                if renamed:
+                    cur.execute("""
+                        UPDATE vectorized_documents SET shared_chunk_count = shared_chunk_count + 1
+                        WHERE doc_id = %s
+                    """, (doc_id,))
+                conn.commit()
+                return renamed
+        except Exception as e:
+            print(f"❌ Error renaming vectorized chunk: {e}")
+            conn.rollback()
+            raise
+
+    @pooled
+    def delete_vectorized_document(self, doc_id):
+        """Remove a document from the vectorization registry"""
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM vectorized_documents WHERE doc_id = %s
+                """, (doc_id,))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"❌ Error deleting vectorized document: {e}")
+            conn.rollback()
+            raise
+
 
 db = Database()
\ No newline at end of file
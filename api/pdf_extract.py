@@ -0,0 +1,119 @@
+import os
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import pdfplumber
+from pdf_store import open_mmap
+
+# Load environment variables
+load_dotenv()
+
+# Page text and table extraction, kept apart from vectorizer so the spawned workers of
+# the extraction pool only import pdfplumber, not the embedding model or the database
+
+# auto: extract tables only on pages whose ruling lines could form one; text: never; full: every page
+TABLE_EXTRACTION_MODE = os.getenv("TABLE_EXTRACTION_MODE", "auto").lower()
+# Shortest line/rect side counted as a ruling edge (pdfplumber's default edge_min_length)
+TABLE_EDGE_MIN_LENGTH = 3
+
+
+@contextmanager
+def open_pdf(pdf_path: str):
+    """Open a PDF from the local store through a read-only memory map"""
+    with open_mmap(pdf_path) as mapped:
+        with pdfplumber.open(mapped) as pdf:
+            yield pdf
+
+def page_may_have_table(page) -> bool:
+    """
+    Cheap pre-pass over the page's ruling lines, rects and curves. pdfplumber's
+    default (lines) table strategy builds cells from intersecting edges, so a page
+    without at least two horizontal and two vertical edges cannot yield a table.
+    """
+    horizontal = vertical = 0
+    for line in page.lines:
+        width, height = line["x1"] - line["x0"], line["bottom"] - line["top"]
+        if width >= TABLE_EDGE_MIN_LENGTH and height < 1:
+            horizontal += 1
+        elif height >= TABLE_EDGE_MIN_LENGTH and width < 1:
+            vertical += 1
+    for curve in page.curves:
+        # Like pdfplumber's curve_edges: each segment between consecutive points is a candidate rule
+        points = curve["pts"]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            width, height = abs(x1 - x0), abs(y1 - y0)
+            if width >= TABLE_EDGE_MIN_LENGTH and height < 1:
+                horizontal += 1
+            elif height >= TABLE_EDGE_MIN_LENGTH and width < 1:
+                vertical += 1
+    for rect in page.rects:
+        width, height = rect["x1"] - rect["x0"], rect["bottom"] - rect["top"]
+        # A box contributes all four sides; a thin filled rect is a single rule
+        if width >= TABLE_EDGE_MIN_LENGTH and height >= TABLE_EDGE_MIN_LENGTH:
+            horizontal += 2
+            vertical += 2
+        elif width >= TABLE_EDGE_MIN_LENGTH:
+            horizontal += 1
+        elif height >= TABLE_EDGE_MIN_LENGTH:
+            vertical += 1
+        if horizontal >= 2 and vertical >= 2:
+            return True
+    return horizontal >= 2 and vertical >= 2
+
+def extract_page_tables(page) -> list:
+    """Run the table extractor according to TABLE_EXTRACTION_MODE"""
+    if TABLE_EXTRACTION_MODE == "text":
+        return []
+    if TABLE_EXTRACTION_MODE == "auto" and not page_may_have_table(page):
+        return []
+    return page.extract_tables()
+
+def _extract_pages(pdf, page_numbers):
+    """Extract (page_number, text, tables) for the given 1-based page numbers of an open PDF."""
+    for page_number in page_numbers:
+        page = pdf.pages[page_number - 1]
+        try:
+            text = page.extract_text() or ""
+            tables = extract_page_tables(page)
+            yield page_number, text, tables
+        finally:
+            page.close()
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> list:
+    """Process-pool task: extract pages start..end-1 (1-based) from a PDF on disk."""
+    with open_pdf(pdf_path) as pdf:
+        return list(_extract_pages(pdf, range(start, end)))
+
+
+if __name__ == "__main__":
+    # Serial vs process-pool extraction: python pdf_extract.py file.pdf [workers,...] [pages_per_task]
+    import sys
+    import time
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    pdf_path = sys.argv[1]
+    worker_counts = [int(n) for n in (sys.argv[2] if len(sys.argv) > 2 else "2,4").split(",")]
+    pages_per_task = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    with open_pdf(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    ranges = [(start, min(start + pages_per_task, page_count + 1))
+              for start in range(1, page_count + 1, pages_per_task)]
+
+    started = time.perf_counter()
+    with open_pdf(pdf_path) as pdf:
+        serial = sum(1 for _ in _extract_pages(pdf, range(1, page_count + 1)))
+    baseline = time.perf_counter() - started
+    print(f"{page_count} pages, {multiprocessing.cpu_count()} CPUs")
+    print(f"serial               {baseline:7.2f} s")
+
+    for workers in worker_counts:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # Start the workers first so the timing matches a long-lived pool
+            list(pool.map(abs, range(workers)))
+            started = time.perf_counter()
+            futures = [pool.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+            pages = sum(len(future.result()) for future in futures)
+            elapsed = time.perf_counter() - started
+        assert pages == serial
+        print(f"{workers} workers (spawn)    {elapsed:7.2f} s  {baseline / elapsed:5.2f}x")
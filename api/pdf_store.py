@@ -0,0 +1,265 @@
+import os
+import json
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import requests
+from dotenv import load_dotenv
+from file_lock import file_lock
+
+# Load environment variables
+load_dotenv()
+
+PDF_STORE_DIR = os.getenv("PDF_STORE_DIR", os.path.join(".cache", "pdfs"))
+# Seconds a stored PDF is trusted before revalidating with a conditional GET
+PDF_STORE_MAX_AGE = int(os.getenv("PDF_STORE_MAX_AGE", "0"))
+# Total size of stored PDFs beyond which the least recently fetched are deleted; 0 keeps everything
+PDF_STORE_MAX_BYTES = int(os.getenv("PDF_STORE_MAX_BYTES", str(5 * 1024 ** 3)))
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+_LOG_MIN_COMPACT_BYTES = 1024 * 1024  # index.log is folded into index.json past this (and index.json's size)
+_EVICT_MIN_AGE = 3600  # seconds; a PDF fetched more recently may still be being ingested
+
+PDF_DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/115.0 Safari/537.36",
+    "Referer": "https://rbi.org.in/",
+    "Accept": "application/pdf",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+
+def normalize_link(pdf_link: str) -> str:
+    """Normalize a PDF link the same way the scrapers do before saving it"""
+    return pdf_link.strip().lower()
+
+
+class PdfStore:
+    """
+    Content-addressed local copy of downloaded PDFs.
+
+    Blobs are stored once per SHA-256 under blobs/, and the index maps each
+    normalized pdf_link to its blob plus the ETag/Last-Modified validators used
+    for conditional GET revalidation. The index is a snapshot (index.json) plus an
+    append-only log of the entries written since (index.log), both read and written
+    under a file lock so worker processes sharing the directory see each other's
+    downloads. Once the blobs exceed max_bytes, the least recently fetched are deleted.
+    """
+
+    def __init__(self, directory: str, max_age: int, max_bytes: int = 0):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(directory, "blobs")
+        self.index_path = os.path.join(directory, "index.json")
+        self.log_path = os.path.join(directory, "index.log")
+        self.lock_path = os.path.join(directory, "index.lock")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._snapshot_version = None  # index.json mtime the in-memory index was loaded from
+        self._log_offset = 0  # bytes of index.log applied to the in-memory index
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        with self._lock, file_lock(self.lock_path, shared=True):
+            self._refresh()
+
+    def _snapshot_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ PDF store index unreadable, starting fresh: {e}")
+            return {}
+
+    def _changed(self) -> bool:
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            log_size = 0
+        return self._snapshot_mtime() != self._snapshot_version or log_size != self._log_offset
+
+    def _refresh(self):
+        """Catch up with entries other processes wrote. Caller holds self._lock and the file lock"""
+        mtime = self._snapshot_mtime()
+        if mtime != self._snapshot_version:
+            # Another process compacted the log into a new snapshot
+            self._index = self._load_index()
+            self._snapshot_version = mtime
+            self._log_offset = 0
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # end of log (or a crashed writer's torn record)
+                record = json.loads(line)
+                if record["entry"] is None:
+                    self._index.pop(record["key"], None)
+                else:
+                    self._index[record["key"]] = record["entry"]
+                self._log_offset = f.tell()
+
+    def _append(self, records: list):
+        """Log index changes ([(key, entry or None), ...]). Caller holds self._lock and the file lock"""
+        with open(self.log_path, "ab") as f:
+            if f.tell() > self._log_offset:
+                f.write(b"\n")  # end a crashed writer's torn record so ours parse
+            for key, entry in records:
+                f.write(json.dumps({"key": key, "entry": entry}).encode("utf-8") + b"\n")
+            self._log_offset = f.tell()
+        for key, entry in records:
+            if entry is None:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = entry
+        snapshot_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        if self._log_offset > max(_LOG_MIN_COMPACT_BYTES, snapshot_size):
+            self._save_index()
+
+    def _save_index(self):
+        """Fold the log into index.json. Caller holds self._lock and the file lock"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        open(self.log_path, "w").close()
+        self._snapshot_version = self._snapshot_mtime()
+        self._log_offset = 0
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blobs_dir, f"{sha256}.pdf")
+
+    def get(self, pdf_link: str) -> dict:
+        """Stored entry for a link without touching the network, or None"""
+        with self._lock:
+            if self._changed():
+                with file_lock(self.lock_path, shared=True):
+                    self._refresh()
+            entry = self._index.get(normalize_link(pdf_link))
+        if entry and os.path.exists(self.blob_path(entry["sha256"])):
+            return dict(entry, path=self.blob_path(entry["sha256"]))
+        return None
+
+    def fetch(self, pdf_link: str, revalidate: bool = True) -> dict:
+        """
+        Return the stored entry for pdf_link ({"path", "sha256", ...}), downloading or
+        revalidating it as needed. Returns None if the server did not send a PDF.
+        """
+        key = normalize_link(pdf_link)
+        entry = self.get(key)
+        if entry and (not revalidate or time.time() - entry["fetched_at"] < self.max_age):
+            return entry
+
+        headers = dict(PDF_DOWNLOAD_HEADERS)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with requests.get(pdf_link, headers=headers, stream=True, timeout=60) as response:
+            if entry and response.status_code == 304:
+                entry["fetched_at"] = time.time()
+                self._put(key, entry)
+                return entry
+
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if "pdf" not in content_type.lower():
+                return None
+
+            sha256 = self._write_blob(response)
+            entry = {
+                "sha256": sha256,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+                "path": self.blob_path(sha256)
+            }
+            self._put(key, entry, evict=True)
+            return entry
+
+    def _write_blob(self, response) -> str:
+        """Stream a response body into the store, hashing on the way. Returns its SHA-256."""
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=self.blobs_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                    f.write(block)
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            os.replace(tmp_path, self.blob_path(sha256))
+            return sha256
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _put(self, key: str, entry: dict, evict: bool = False):
+        with self._lock, file_lock(self.lock_path):
+            self._refresh()
+            self._append([(key, {k: v for k, v in entry.items() if k != "path"})])
+            if evict and self.max_bytes > 0:
+                self._evict(keep=entry["sha256"])
+
+    def _evict(self, keep: str):
+        """
+        Delete the least recently fetched blobs (and their links) until the store fits
+        in max_bytes. Caller holds self._lock and the file lock.
+        """
+        sizes = {}
+        with os.scandir(self.blobs_dir) as entries:
+            for blob in entries:
+                if blob.name.endswith(".pdf"):
+                    sizes[blob.name[:-len(".pdf")]] = blob.stat().st_size
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        last_fetched = dict.fromkeys(sizes, 0.0)  # unreferenced blobs go first
+        links = {}
+        for key, entry in self._index.items():
+            sha256 = entry["sha256"]
+            last_fetched[sha256] = max(last_fetched.get(sha256, 0.0), entry.get("fetched_at") or 0.0)
+            links.setdefault(sha256, []).append(key)
+        cutoff = time.time() - _EVICT_MIN_AGE
+        removed = []
+        for sha256 in sorted(sizes, key=lambda sha256: last_fetched[sha256]):
+            if total <= self.max_bytes or last_fetched[sha256] > cutoff:
+                break
+            if sha256 == keep:
+                continue
+            try:
+                os.remove(self.blob_path(sha256))
+            except FileNotFoundError:
+                pass
+            total -= sizes[sha256]
+            removed.extend((key, None) for key in links.get(sha256, []))
+        if removed:
+            self._append(removed)
+
+
+@contextmanager
+def open_mmap(path: str):
+    """Memory-map a stored PDF read-only"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+# Global PDF store instance
+pdf_store = PdfStore(PDF_STORE_DIR, PDF_STORE_MAX_AGE, PDF_STORE_MAX_BYTES)
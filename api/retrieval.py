@@ -0,0 +1,204 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from chunker import merge_chunk_texts
+from vector_registry import registry
+from vector_store import (
+    get_vector_store, query_document, is_shared_chunk_id,
+    DOCUMENT_NAMESPACE_PREFIX, SHARED_NAMESPACE
+)
+
+# Load environment variables
+load_dotenv()
+
+# Chunks before and after each match added to the context (0 = matches only)
+RETRIEVAL_NEIGHBOURS = int(os.getenv("RETRIEVAL_NEIGHBOURS", "0"))
+# Reciprocal-rank fusion constant: a passage at rank r in one document's results scores 1 / (RRF_K + r)
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Threads running blocking retrieval (embedding, vector store, registry) for async callers
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+# Seconds a registry entry is trusted when deciding whether a document has shared chunks
+SHARED_CHUNKS_MAX_AGE = 60
+
+_retrieval_executor = None
+
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Lazy load the bounded executor for retrieval on the async request path"""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        _retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+    return _retrieval_executor
+
+async def run_retrieval(fn, *args, **kwargs):
+    """Await a blocking retrieval call on the retrieval executor instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_retrieval_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def get_namespace_doc_id(namespace: str) -> str:
+    """doc_id of a document namespace (pdf_chunks_<doc_id>)"""
+    namespace = str(namespace)
+    return namespace[len(DOCUMENT_NAMESPACE_PREFIX):] if namespace.startswith(DOCUMENT_NAMESPACE_PREFIX) else namespace
+
+def format_citation(page=None, heading=None, title=None) -> str:
+    parts = []
+    if title:
+        parts.append(title)
+    if page is not None:
+        parts.append(f"Page {page}")
+    if heading:
+        parts.append(heading)
+    return " · ".join(parts)
+
+def fetch_chunk_metadata(chunk_ids: list, namespace: str) -> dict:
+    """{chunk_id: metadata} of a document's chunks, looking up shared chunks in the shared namespace"""
+    store = get_vector_store()
+    shared_ids = [chunk_id for chunk_id in chunk_ids if is_shared_chunk_id(chunk_id)]
+    own_ids = [chunk_id for chunk_id in chunk_ids if not is_shared_chunk_id(chunk_id)]
+    metadata = {}
+    for ids, ids_namespace in ((own_ids, namespace), (shared_ids, SHARED_NAMESPACE)):
+        if ids:
+            metadata.update({chunk_id: v["metadata"] for chunk_id, v in store.fetch(ids, ids_namespace).items()})
+    return metadata
+
+def metadata_passages(matches: list) -> list:
+    """One passage per match, with the provenance stored in its vector metadata"""
+    passages = [
+        {"text": m["metadata"].get("text", ""), "page": m["metadata"].get("page"),
+         "heading": m["metadata"].get("heading"), "score": m["score"]}
+        for m in matches
+    ]
+    passages.sort(key=lambda passage: passage["score"], reverse=True)
+    return passages
+
+def build_passages(matches: list, namespace: str, neighbours: int = 0) -> list:
+    """
+    Turn query matches into passages ({"text", "page", "heading", "score"}) best first.
+    With neighbours == 0 the vector metadata has all the provenance needed; with
+    neighbours > 0 each match is widened by the adjacent chunks of the same document
+    (looked up in the registry), and touching matches merge into one passage.
+    """
+    if not matches:
+        return []
+    if neighbours <= 0:
+        return metadata_passages(matches)
+    scores = {m["id"]: m["score"] for m in matches}
+    try:
+        rows = registry.get_chunk_context(get_namespace_doc_id(namespace), list(scores), neighbours)
+    except Exception as e:
+        print(f"⚠️ Chunk provenance unavailable: {e}")
+        rows = []
+    if not rows:
+        # Not in the registry (legacy ingest): fall back to the vector metadata
+        return metadata_passages(matches)
+
+    texts = {m["id"]: m["metadata"].get("text", "") for m in matches}
+    missing = [row["chunk_id"] for row in rows if row["chunk_id"] not in texts]
+    if missing:
+        texts.update({chunk_id: meta.get("text", "") for chunk_id, meta in fetch_chunk_metadata(missing, namespace).items()})
+
+    # Runs of consecutive chunk positions form one passage
+    runs = []
+    for row in rows:
+        if runs and row["chunk_index"] == runs[-1][-1]["chunk_index"] + 1:
+            runs[-1].append(row)
+        else:
+            runs.append([row])
+
+    passages = []
+    for run in runs:
+        hits = [row for row in run if row["chunk_id"] in scores]
+        if not hits:
+            continue
+        best = max(hits, key=lambda row: scores[row["chunk_id"]])
+        passages.append({
+            "text": merge_chunk_texts([
+                {"text": texts.get(row["chunk_id"], ""), "page": row["page"],
+                 "start": row["start_offset"], "end": row["end_offset"]}
+                for row in run
+            ]),
+            "page": best["page"],
+            "heading": best["heading"],
+            "score": scores[best["chunk_id"]]
+        })
+    passages.sort(key=lambda passage: passage["score"], reverse=True)
+    return passages
+
+def format_passages(passages: list) -> str:
+    """Render passages as a context block, each headed by its citation when known"""
+    blocks = []
+    for passage in passages:
+        citation = format_citation(passage.get("page"), passage.get("heading"), passage.get("title"))
+        blocks.append(f"[{citation}]\n{passage['text']}" if citation else passage["text"])
+    return "\n\n---\n\n".join(blocks)
+
+def retrieve_passages(query_vector, namespace: str, top_k: int = 5, neighbours: int = None) -> list:
+    """Top passages of a document, best first (see build_passages)"""
+    # Documents that reference no shared chunks (all of them with dedup off) skip the shared query
+    include_shared = registry.has_shared_chunks(get_namespace_doc_id(namespace), max_age=SHARED_CHUNKS_MAX_AGE)
+    matches = query_document(query_vector, namespace, top_k=top_k, include_shared=include_shared)
+    neighbours = RETRIEVAL_NEIGHBOURS if neighbours is None else neighbours
+    return build_passages(matches, namespace, neighbours)
+
+def get_passage_sources(passages: list) -> list:
+    """Citations of passages ({"page", "heading", "score"}, plus "doc_id"/"title" when known), e.g. for showing sources to the user"""
+    sources = []
+    for p in passages:
+        source = {"page": p.get("page"), "heading": p.get("heading"),
+                  "score": float(p["score"]) if p.get("score") is not None else None}
+        source.update({key: p[key] for key in ("doc_id", "title") if p.get(key) is not None})
+        sources.append(source)
+    return sources
+
+def retrieve_context(query_vector, namespace: str, top_k: int = 5, neighbours: int = None) -> str:
+    """Top chunks of a document as a cited context block (empty string if nothing matched)"""
+    return format_passages(retrieve_passages(query_vector, namespace, top_k, neighbours))
+
+def fuse_document_passages(ranked_passages: dict, titles: dict = None, limit: int = None, k: int = None) -> list:
+    """
+    Merge per-document passage rankings ({namespace: [passage, ...] best first}) with
+    reciprocal-rank fusion: a passage at rank r scores 1 / (k + r), so every document's
+    best hits lead the merged list regardless of how the documents' raw similarity
+    scores compare. Passages with identical text (chunks shared between documents,
+    such as letterheads) are listed once with their best rank: the rankings cover
+    different documents, so appearing in several is no sign of relevance.
+    Returns up to limit passages, each tagged with "doc_id", "title" and "rrf_score".
+    """
+    k = RRF_K if k is None else k
+    titles = titles or {}
+    fused = {}  # passage text -> fused passage
+    for namespace, passages in ranked_passages.items():
+        for rank, passage in enumerate(passages, start=1):
+            key = " ".join(passage["text"].split())
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = dict(passage, doc_id=namespace, title=titles.get(namespace), rrf_score=0.0)
+            entry["rrf_score"] = max(entry["rrf_score"], 1.0 / (k + rank))
+            entry["score"] = max(entry.get("score") or 0.0, passage.get("score") or 0.0)
+    merged = sorted(fused.values(), key=lambda p: (p["rrf_score"], p["score"]), reverse=True)
+    return merged[:limit] if limit else merged
+
+def retrieve_documents(query_vector, namespaces: list, top_k: int = 5, limit: int = None,
+                       titles: dict = None, neighbours: int = None) -> list:
+    """
+    Top passages across several documents for one query vector: every namespace is
+    queried concurrently on the retrieval executor and the rankings are fused
+    (see fuse_document_passages). Not for use from inside a retrieval executor thread.
+    """
+    executor = get_retrieval_executor()
+    futures = {namespace: executor.submit(retrieve_passages, query_vector, namespace, top_k, neighbours)
+               for namespace in dict.fromkeys(namespaces)}
+    return fuse_document_passages({namespace: future.result() for namespace, future in futures.items()},
+                                  titles, limit)
+
+async def aretrieve_documents(query_vector, namespaces: list, top_k: int = 5, limit: int = None,
+                              titles: dict = None, neighbours: int = None) -> list:
+    """retrieve_documents for the event loop"""
+    namespaces = list(dict.fromkeys(namespaces))
+    results = await asyncio.gather(*(
+        run_retrieval(retrieve_passages, query_vector, namespace, top_k, neighbours) for namespace in namespaces
+    ))
+    return fuse_document_passages(dict(zip(namespaces, results)), titles, limit)
@@ -0,0 +1,107 @@
+import os
+import json
+import numpy as np
+import pytest
+import ann_index
+from ann_index import IVFIndex
+
+DIM = 8
+
+
+def make_vectors(ids, seed=0):
+    values = np.random.default_rng(seed).standard_normal((len(ids), DIM)).astype(np.float32)
+    return [{"id": vector_id, "values": row, "metadata": {"text": vector_id}} for vector_id, row in zip(ids, values)]
+
+
+def build(directory, count=40):
+    vectors = make_vectors([f"v{i}" for i in range(count)])
+    return IVFIndex.build(str(directory), [("ns", vector) for vector in vectors], nlist=4, iters=3)
+
+
+def ids(index, vector, top_k=50):
+    return {match["id"] for match in index.search(vector["values"], top_k=top_k, nprobe=4)}
+
+
+def test_writers_in_two_processes_see_each_others_deltas(tmp_path):
+    build(tmp_path)
+    first, second = IVFIndex.load(str(tmp_path)), IVFIndex.load(str(tmp_path))
+    a, b = make_vectors(["a", "b"], seed=1)
+    first.add("ns", [a])
+    second.add("ns", [b])  # appended after first's record, without second having read it
+    first.add("ns", make_vectors(["c"], seed=2))
+
+    for index in (first, second, IVFIndex.load(str(tmp_path))):
+        assert {"a", "b", "c"} <= ids(index, a)
+        assert index._delta_offset == os.path.getsize(index.delta_path)
+
+
+def test_unchanged_vector_only_logs_metadata(tmp_path):
+    index = build(tmp_path)
+    vector = make_vectors(["shared"], seed=3)[0]
+    index.add("ns", [vector])
+    size = os.path.getsize(index.delta_path)
+    index.add("ns", [dict(vector, metadata={"text": "shared", "doc_ids": ["x", "y"]})])
+
+    with open(index.delta_path, encoding="utf-8") as f:
+        last = json.loads(f.readlines()[-1])
+    assert last["op"] == "metadata" and "values" not in last
+    assert os.path.getsize(index.delta_path) - size < 200
+    reloaded = IVFIndex.load(str(tmp_path))
+    match = next(m for m in reloaded.search(vector["values"], top_k=1, nprobe=4))
+    assert match["metadata"]["doc_ids"] == ["x", "y"]
+
+
+def test_delta_is_compacted_and_other_processes_reload(tmp_path, monkeypatch):
+    build(tmp_path)
+    reader = IVFIndex.load(str(tmp_path))
+    writer = IVFIndex.load(str(tmp_path))
+    monkeypatch.setattr(ann_index, "ANN_DELTA_COMPACT_BYTES", 500)
+    new = make_vectors([f"n{i}" for i in range(5)], seed=4)
+    writer.add("ns", new)
+    writer.remove("ns", ["v0"])
+
+    assert os.path.getsize(writer.delta_path) < 500
+    assert writer._read_generation() == 2
+    reader.refresh()
+    assert reader._generation == 2
+    found = ids(reader, new[0])
+    assert {"n0", "n4"} <= found and "v0" not in found
+
+
+def test_add_replaces_and_remove_drops_vectors(tmp_path):
+    index = build(tmp_path)
+    new = make_vectors(["x"], seed=5)[0]
+    index.add("other", [new])
+    best = index.search(new["values"], top_k=1, nprobe=4)[0]
+    assert (best["id"], best["namespace"]) == ("x", "other")
+    assert best["score"] == pytest.approx(1.0, abs=1e-5)
+
+    moved = make_vectors(["x"], seed=6)[0]
+    index.add("other", [moved])  # same id, new values: replaced, not duplicated
+    assert [m["namespace"] for m in index.search(moved["values"], top_k=50, nprobe=4)].count("other") == 1
+    assert index.search(moved["values"], top_k=1, nprobe=4)[0]["id"] == "x"
+
+    index.remove("ns", ["v1", "v2"])
+    assert not {"v1", "v2"} & ids(index, make_vectors(["v1"])[0])
+    index.remove_namespace("other")
+    assert all(m["namespace"] == "ns" for m in index.search(moved["values"], top_k=50, nprobe=4))
+    assert IVFIndex.load(str(tmp_path)).stats()["vectors"] == 40 - 2
+
+
+def test_refresh_replays_other_writers_changes(tmp_path):
+    build(tmp_path)
+    reader = IVFIndex.load(str(tmp_path))
+    writer = IVFIndex.load(str(tmp_path))
+    new = make_vectors(["y"], seed=7)[0]
+    writer.add("ns", [new])
+    writer.remove("ns", ["v0"])
+    writer.remove_namespace("missing")
+
+    assert ("ns", "y") not in reader.key_rows
+    reader.refresh()
+    assert ("ns", "y") in reader.key_rows
+    assert reader._delta_offset == os.path.getsize(reader.delta_path)
+    found = ids(reader, new)
+    assert "y" in found and "v0" not in found
+    reader.refresh()  # nothing new: a no-op
+    assert ids(reader, new) == found
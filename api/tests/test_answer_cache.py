@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import answer_cache
+from answer_cache import AnswerCache
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_hit_needs_threshold_similarity_within_the_document():
+    cache = AnswerCache(threshold=0.9, ttl=0, max_entries=10)
+    cache.put("d1", [1.0, 0.0], "answer")
+    assert cache.get("d1", [2.0, 0.1]) == "answer"  # cosine 0.999, magnitude ignored
+    assert cache.get("d1", unit(0.8, 0.6)) is None  # cosine 0.8
+    assert cache.get("d2", [1.0, 0.0]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_best_match_wins():
+    cache = AnswerCache(threshold=0.5, ttl=0, max_entries=10)
+    cache.put("d1", [1.0, 0.0], "x axis")
+    cache.put("d1", [0.0, 1.0], "y axis")
+    assert cache.get("d1", [0.2, 1.0]) == "y axis"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(threshold=0.9, ttl=60, max_entries=10)
+    cache.put("d1", [1.0, 0.0], "answer")
+    clock[0] += 60
+    assert cache.get("d1", [1.0, 0.0]) == "answer"
+    clock[0] += 1
+    assert cache.get("d1", [1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_answers_of_another_version_are_dropped():
+    cache = AnswerCache(threshold=0.9, ttl=0, max_entries=10)
+    cache.put("d1", [1.0, 0.0], "old", version=("hash1", "model"))
+    cache.put("d1", [0.0, 1.0], "also old", version=("hash1", "model"))
+    assert cache.get("d1", [1.0, 0.0], lambda: ("hash1", "model")) == "old"
+    assert cache.get("d1", [1.0, 0.0], lambda: ("hash2", "model")) is None
+    # Every answer of the retired version went, not just the candidate
+    assert cache.stats()["entries"] == 0
+
+
+def test_version_is_only_looked_up_for_a_candidate():
+    cache = AnswerCache(threshold=0.9, ttl=0, max_entries=10)
+
+    def current_version():
+        raise AssertionError("version looked up without a candidate")
+
+    assert cache.get("d1", [1.0, 0.0], current_version) is None
+
+
+def test_invalidate_and_lru_eviction():
+    cache = AnswerCache(threshold=0.9, ttl=0, max_entries=2)
+    cache.put("d1", [1.0, 0.0], "a")
+    cache.put("d2", [1.0, 0.0], "b")
+    assert cache.get("d1", [1.0, 0.0]) == "a"  # d2 is now least recently used
+    cache.put("d3", [1.0, 0.0], "c")
+    assert cache.get("d2", [1.0, 0.0]) is None
+    assert cache.stats()["evictions"] == 1
+    cache.invalidate("d1")
+    assert cache.get("d1", [1.0, 0.0]) is None
+    assert cache.get("d3", [1.0, 0.0]) == "c"
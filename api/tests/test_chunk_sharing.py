@@ -0,0 +1,144 @@
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pytest
+import vectorizer
+from vector_store import LocalVectorStore, SHARED_NAMESPACE
+
+DIM = 8
+
+
+class FakeRegistry:
+    def __init__(self, owners):
+        self.owners = owners
+        self.renamed = []
+
+    def get_chunk_owners(self, chunk_hashes, exclude_doc_id, model_version):
+        return {h: refs for h, refs in self.owners.items() if h in chunk_hashes}
+
+    def rename_chunk(self, doc_id, chunk_id, new_chunk_id):
+        self.renamed.append((doc_id, chunk_id, new_chunk_id))
+        return True
+
+
+class FakeSession:
+    def __init__(self, held):
+        self.held = held
+
+    def lock(self, keys, timeout):
+        self.held.update(keys)
+
+    def try_lock(self, key):
+        if key in self.held:
+            return False
+        self.held.add(key)
+        return True
+
+    def unlock(self, key):
+        self.held.discard(key)
+
+
+class FakeLockDb:
+    def __init__(self):
+        self.sessions = 0
+        self.held = set()
+
+    @contextmanager
+    def advisory_session(self):
+        self.sessions += 1
+        yield FakeSession(self.held)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalVectorStore(str(tmp_path))
+    monkeypatch.setattr(vectorizer, "get_vector_store", lambda: store)
+    monkeypatch.setattr(vectorizer, "get_ann_index", lambda: None)
+    monkeypatch.setattr(vectorizer, "db", FakeLockDb())
+    return store
+
+
+def private_chunk(store, doc_id, chunk_hash):
+    chunk_id = vectorizer.get_chunk_id(doc_id, chunk_hash)
+    store.upsert([{"id": chunk_id, "values": np.ones(DIM), "metadata": {"text": "boilerplate"}}],
+                 vectorizer.get_namespace_name(doc_id))
+    return {"doc_id": doc_id, "chunk_id": chunk_id, "namespace": vectorizer.get_namespace_name(doc_id)}
+
+
+def test_idle_owner_chunk_is_moved(store, monkeypatch):
+    ref = private_chunk(store, "owner", "h1")
+    registry = FakeRegistry({"h1": [ref]})
+    monkeypatch.setattr(vectorizer, "registry", registry)
+
+    shared = vectorizer.share_existing_chunks("new", ["h1"])
+    shared_id = vectorizer.get_shared_chunk_id("h1")
+    assert shared == {"h1": shared_id}
+    assert store.fetch([shared_id], SHARED_NAMESPACE)[shared_id]["metadata"]["doc_ids"] == ["new", "owner"]
+    assert registry.renamed == [("owner", ref["chunk_id"], shared_id)]
+    assert store.fetch([ref["chunk_id"]], ref["namespace"]) == {}
+
+
+def test_owner_being_ingested_keeps_its_private_copy(store, monkeypatch):
+    ref = private_chunk(store, "owner", "h1")
+    registry = FakeRegistry({"h1": [ref]})
+    monkeypatch.setattr(vectorizer, "registry", registry)
+
+    with vectorizer.single_flight("owner"):
+        shared = vectorizer.share_existing_chunks("new", ["h1"])
+    shared_id = vectorizer.get_shared_chunk_id("h1")
+    assert shared == {"h1": shared_id}
+    assert store.fetch([shared_id], SHARED_NAMESPACE)[shared_id]["metadata"]["doc_ids"] == ["new"]
+    assert registry.renamed == []
+    assert ref["chunk_id"] in store.fetch([ref["chunk_id"]], ref["namespace"])
+
+
+def test_doc_ids_are_read_from_the_shared_vector(store, monkeypatch):
+    shared_id = vectorizer.get_shared_chunk_id("h1")
+    store.upsert([{"id": shared_id, "values": np.ones(DIM), "metadata": {"text": "boilerplate", "doc_ids": ["a", "b"]}}],
+                 SHARED_NAMESPACE)
+    # The registry has not seen "b" yet (its ingest is still running), the shared vector has
+    monkeypatch.setattr(vectorizer, "registry", FakeRegistry(
+        {"h1": [{"doc_id": "a", "chunk_id": shared_id, "namespace": SHARED_NAMESPACE}]}
+    ))
+
+    vectorizer.share_existing_chunks("c", ["h1"])
+    assert store.fetch([shared_id], SHARED_NAMESPACE)[shared_id]["metadata"]["doc_ids"] == ["a", "b", "c"]
+    vectorizer.release_shared_chunks("a", [shared_id])
+    assert store.fetch([shared_id], SHARED_NAMESPACE)[shared_id]["metadata"]["doc_ids"] == ["b", "c"]
+    vectorizer.release_shared_chunks("b", [shared_id])
+    vectorizer.release_shared_chunks("c", [shared_id])
+    assert store.fetch([shared_id], SHARED_NAMESPACE) == {}
+
+
+def test_one_session_per_sharing_step_and_locks_released(store, monkeypatch):
+    refs = [private_chunk(store, f"owner{i}", f"h{i}") for i in range(3)]
+    monkeypatch.setattr(vectorizer, "registry", FakeRegistry({f"h{i}": [ref] for i, ref in enumerate(refs)}))
+
+    vectorizer.share_existing_chunks("new", ["h0", "h1", "h2"])
+    assert vectorizer.db.sessions == 1
+    assert vectorizer.db.held == set()
+
+
+def test_sharing_different_chunks_does_not_wait_on_each_other():
+    inside, release, acquired = threading.Event(), threading.Event(), threading.Event()
+
+    def hold():
+        with vectorizer.shared_chunk_locks(None, ["shared_a"]):
+            inside.set()
+            release.wait(5)
+
+    def other():
+        with vectorizer.shared_chunk_locks(None, ["shared_b"]):
+            acquired.set()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    try:
+        assert inside.wait(5)
+        thread = threading.Thread(target=other)
+        thread.start()
+        assert acquired.wait(2)  # not blocked behind the other chunk's holder
+        thread.join()
+    finally:
+        release.set()
+        holder.join()
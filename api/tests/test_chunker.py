@@ -0,0 +1,41 @@
+import pytest
+from chunker import split_spans, iter_page_chunks, merge_chunk_texts
+
+PARAGRAPH = ("Banks are advised to ensure compliance with the instructions contained in this circular "
+             "and to put in place a board approved policy on the subject. ")
+PAGE = "\n".join(
+    [f"{i}. Scope of paragraph {i}\n" + PARAGRAPH * (1 + i % 4) for i in range(1, 8)]
+    + ["ONEVERYLONGWORDWITHOUTSEPARATORS" * 20]
+)
+
+
+def squash(text: str) -> str:
+    # Chunks are joined with newlines, and a word longer than a chunk is cut mid-word
+    return "".join(text.split())
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(200, 0), (200, 50), (500, 100), (1000, 200)])
+def test_spans_are_bounded_and_trimmed(chunk_size, chunk_overlap):
+    spans = list(split_spans(PAGE, chunk_size, chunk_overlap))
+    assert spans and spans[-1][1] == len(PAGE.rstrip())
+    for (start, end), (next_start, _) in zip(spans, spans[1:]):
+        assert start < next_start and next_start >= end - chunk_overlap
+    for start, end in spans:
+        assert 0 < end - start <= chunk_size
+        assert not PAGE[start].isspace() and not PAGE[end - 1].isspace()
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(200, 0), (200, 50), (500, 100), (1000, 200)])
+def test_merged_chunks_reproduce_the_page(chunk_size, chunk_overlap):
+    chunks = list(iter_page_chunks([(1, PAGE, [])], chunk_size, chunk_overlap))
+    assert len(chunks) > 1
+    assert squash(merge_chunk_texts(chunks)) == squash(PAGE)
+
+
+def test_merge_keeps_overlap_across_pages():
+    chunks = list(iter_page_chunks([(1, "alpha beta", []), (2, "alpha beta", [])], 100, 50))
+    assert merge_chunk_texts(chunks) == "alpha beta\nalpha beta"
+
+
+def test_blank_page_has_no_spans():
+    assert list(split_spans(" \n\n ", 100, 10)) == []
@@ -0,0 +1,111 @@
+import os
+import multiprocessing
+import numpy as np
+from embedding_cache import EmbeddingCache, text_key
+
+DIM = 4
+
+
+def vectors_for(texts):
+    rng = np.random.default_rng(len(texts))
+    return rng.standard_normal((len(texts), DIM)).astype(np.float32)
+
+
+def test_put_many_appends_to_log_instead_of_rewriting_index(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", DIM, 16)
+    snapshot_mtime = os.path.getmtime(cache.index_path)
+    keys = [text_key(t) for t in ["a", "b", "c"]]
+    cache.put_many(keys, vectors_for(keys))
+
+    with open(cache.log_path, encoding="utf-8") as f:
+        assert [line.split()[0] for line in f] == keys
+    assert os.path.getmtime(cache.index_path) == snapshot_mtime
+
+
+def test_reopen_replays_log(tmp_path):
+    keys = [text_key(t) for t in ["a", "b"]]
+    vectors = vectors_for(keys)
+    EmbeddingCache(str(tmp_path), "model", DIM, 16).put_many(keys, vectors)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", DIM, 16)
+    found = reopened.get_many(keys)
+    np.testing.assert_array_equal(found[keys[0]], vectors[0])
+    np.testing.assert_array_equal(found[keys[1]], vectors[1])
+
+
+def test_processes_sharing_a_directory_keep_each_others_entries(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "model", DIM, 16)
+    second = EmbeddingCache(str(tmp_path), "model", DIM, 16)
+    first_key, second_key = text_key("first"), text_key("second")
+    first_vector, second_vector = vectors_for([first_key, second_key])
+    first.put_many([first_key], [first_vector])
+    # Opened before the first write, the second writer still must not reuse its slot
+    second.put_many([second_key], [second_vector])
+    assert first._lru[first_key] != second._lru[second_key]
+
+    np.testing.assert_array_equal(first.get_many([first_key])[first_key], first_vector)
+    np.testing.assert_array_equal(first.get_many([second_key])[second_key], second_vector)
+    first.close()
+    second.close()
+    reopened = EmbeddingCache(str(tmp_path), "model", DIM, 16)
+    assert set(reopened.get_many([first_key, second_key])) == {first_key, second_key}
+    assert os.path.getsize(reopened.log_path) == 0
+
+
+def test_evicted_slot_is_not_served(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "model", DIM, 1)
+    second = EmbeddingCache(str(tmp_path), "model", DIM, 1)
+    old_key, new_key = text_key("old"), text_key("new")
+    first.put_many([old_key], vectors_for([old_key]))
+    second.put_many([new_key], vectors_for([new_key]))  # full: evicts the old entry
+
+    assert list(first.get_many([old_key, new_key])) == [new_key]
+    reopened = EmbeddingCache(str(tmp_path), "model", DIM, 1)
+    assert list(reopened.get_many([old_key, new_key])) == [new_key]
+
+
+def test_slot_being_rewritten_is_not_served(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", DIM, 4)
+    key = text_key("text")
+    cache.put_many([key], vectors_for([key]))
+    slot = cache._lru[key]
+    cache._keys[slot] = 0  # what another writer does first before replacing the vector
+    assert cache.get_many([key]) == {}
+
+
+def _write_texts(directory, prefix, count):
+    cache = EmbeddingCache(directory, "model", DIM, 256)
+    for i in range(count):
+        key = text_key(f"{prefix}{i}")
+        cache.put_many([key], np.full((1, DIM), i, dtype=np.float32))
+    cache.close()
+
+
+def test_concurrent_processes_get_distinct_slots(tmp_path):
+    EmbeddingCache(str(tmp_path), "model", DIM, 256).close()
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_write_texts, args=(str(tmp_path), prefix, 50)) for prefix in "ab"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), "model", DIM, 256)
+    for prefix in "ab":
+        keys = [text_key(f"{prefix}{i}") for i in range(50)]
+        found = cache.get_many(keys)
+        assert len(found) == 50
+        for i, key in enumerate(keys):
+            assert found[key][0] == i
+
+
+def test_log_is_compacted_past_threshold(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", DIM, 2)
+    for i in range(8):
+        key = text_key(str(i))
+        cache.put_many([key], vectors_for([key]))
+
+    assert os.path.getsize(cache.log_path) < 4 * 80
+    reopened = EmbeddingCache(str(tmp_path), "model", DIM, 2)
+    assert set(reopened.get_many([text_key("6"), text_key("7")])) == {text_key("6"), text_key("7")}
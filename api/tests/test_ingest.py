@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+import vectorizer
+from vector_store import LocalVectorStore
+
+DIM = 8
+NAMESPACE = vectorizer.get_namespace_name("d1")
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.entry = None
+        self.chunks = []
+        self.owners = {}
+
+    def get_chunk_owners(self, chunk_hashes, exclude_doc_id, model_version):
+        return {h: refs for h, refs in self.owners.items() if h in chunk_hashes}
+
+    def rename_chunk(self, doc_id, chunk_id, new_chunk_id):
+        return True
+
+    def get(self, doc_id, fresh=False):
+        return self.entry
+
+    def get_chunks(self, doc_id):
+        return [(chunk_id, chunk_hash, dict(provenance)) for chunk_id, chunk_hash, provenance in self.chunks]
+
+    def record(self, doc_id, namespace, chunk_count, model_version, content_hash=None, chunks=None,
+               shared_chunk_count=None):
+        self.entry = {"doc_id": doc_id, "content_hash": content_hash, "model_version": model_version}
+        self.chunks = list(chunks or [])
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    store = LocalVectorStore(str(tmp_path))
+    registry = FakeRegistry()
+    pages = {}
+    embedded = []
+
+    def embed_chunks(texts):
+        embedded.extend(texts)
+        return np.ones((len(texts), DIM), dtype=np.float32)
+
+    monkeypatch.setattr(vectorizer, "get_vector_store", lambda: store)
+    monkeypatch.setattr(vectorizer, "get_ann_index", lambda: None)
+    monkeypatch.setattr(vectorizer, "registry", registry)
+    monkeypatch.setattr(vectorizer, "answer_cache", None)
+    monkeypatch.setattr(vectorizer, "CHUNK_DEDUP_ENABLED", False)
+    monkeypatch.setattr(vectorizer, "embed_chunks", embed_chunks)
+    monkeypatch.setattr(vectorizer, "iter_pdf_pages", lambda path: iter(pages[path]))
+    monkeypatch.setattr(vectorizer.pdf_store, "fetch", lambda link: {"path": link, "sha256": link})
+
+    def run(revision, page_texts):
+        pages[revision] = [(number, text, []) for number, text in enumerate(page_texts, start=1)]
+        embedded.clear()
+        vectorizer._ingest_pdf(revision, "d1", NAMESPACE)
+        return list(embedded)
+
+    run.store = store
+    run.registry = registry
+    return run
+
+
+def metadata_of(store, text):
+    chunk_id = vectorizer.get_chunk_id("d1", vectorizer.get_chunk_hash(text))
+    return store.fetch([chunk_id], NAMESPACE)[chunk_id]["metadata"]
+
+
+SCOPE = "1. Scope\nThe direction applies to banks."
+REPORTING = "2. Reporting\nReport within 30 days."
+APPENDIX = "Forms are in the appendix."
+
+
+def test_reused_chunk_gets_its_new_page_and_heading(ingest):
+    ingest("v1", [SCOPE, REPORTING, APPENDIX])
+    assert metadata_of(ingest.store, APPENDIX)["page"] == 3
+    assert metadata_of(ingest.store, APPENDIX)["heading"] == "2. Reporting"
+
+    embedded = ingest("v2", [SCOPE, "Inserted page.", APPENDIX, REPORTING])
+    assert embedded == ["Inserted page."]  # the moved chunks kept their vectors
+    assert metadata_of(ingest.store, REPORTING)["page"] == 4
+    moved = metadata_of(ingest.store, APPENDIX)
+    assert moved["page"] == 3 and moved["heading"] == "1. Scope"
+    assert metadata_of(ingest.store, SCOPE)["page"] == 1
+
+
+def test_failed_ingest_takes_its_doc_id_off_shared_chunks(ingest, monkeypatch):
+    monkeypatch.setattr(vectorizer, "CHUNK_DEDUP_ENABLED", True)
+    monkeypatch.setattr(vectorizer, "db", None)  # no advisory locks: best effort
+    owner_id = vectorizer.get_chunk_id("owner", vectorizer.get_chunk_hash(SCOPE))
+    owner_namespace = vectorizer.get_namespace_name("owner")
+    ingest.store.upsert([{"id": owner_id, "values": np.ones(DIM), "metadata": {"text": SCOPE}}], owner_namespace)
+    ingest.registry.owners = {
+        vectorizer.get_chunk_hash(SCOPE): [{"doc_id": "owner", "chunk_id": owner_id, "namespace": owner_namespace}]
+    }
+
+    def fail(texts):
+        raise RuntimeError("embedding failed")
+
+    monkeypatch.setattr(vectorizer, "embed_chunks", fail)
+    with pytest.raises(RuntimeError):
+        ingest("v1", [SCOPE, REPORTING])
+    shared_id = vectorizer.get_shared_chunk_id(vectorizer.get_chunk_hash(SCOPE))
+    # The owner could not be locked, so the shared copy was d1's alone and goes with it
+    assert ingest.store.fetch([shared_id], vectorizer.SHARED_NAMESPACE) == {}
+    assert owner_id in ingest.store.fetch([owner_id], owner_namespace)
+    assert ingest.registry.entry is None
@@ -0,0 +1,157 @@
+import os
+import threading
+import pytest
+import jobs
+from jobs import VectorizationJobQueue, PRIORITY_BACKGROUND, WORKER_ID
+
+
+class FakeJobsDb:
+    def __init__(self):
+        self.rows = {}
+        self.create_gate = threading.Event()
+        self.create_gate.set()
+
+    def create_vectorization_job(self, job_id, doc_id, pdf_link, worker=None):
+        self.create_gate.wait(5)
+        self.rows[job_id] = {"id": job_id, "doc_id": doc_id, "pdf_link": pdf_link,
+                             "status": "queued", "worker": worker, "idle_seconds": 0}
+        return dict(self.rows[job_id])
+
+    def get_vectorization_job(self, job_id):
+        row = self.rows.get(job_id)
+        return dict(row) if row else None
+
+    def update_vectorization_job(self, job_id, status=None, **fields):
+        if status:
+            self.rows[job_id]["status"] = status
+
+    def get_unfinished_vectorization_jobs(self):
+        return [dict(row) for row in self.rows.values() if row["status"] in ("queued", "running")]
+
+    def fail_unfinished_vectorization_job(self, job_id, error):
+        if self.rows[job_id]["status"] not in ("queued", "running"):
+            return False
+        self.rows[job_id]["status"] = "failed"
+        return True
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeJobsDb()
+    monkeypatch.setattr(jobs, "db", fake)
+    monkeypatch.setattr(jobs, "process_and_store_pdf", lambda pdf_link, doc_id, **kwargs: f"pdf_chunks_{doc_id}")
+    return fake
+
+
+@pytest.fixture
+def queue():
+    queue = VectorizationJobQueue(1, 10, 1, 10)
+    yield queue
+    queue.shutdown()
+
+
+def test_database_calls_do_not_hold_the_queue_lock(fake_db, queue):
+    fake_db.create_gate.clear()
+    blocked = threading.Thread(target=queue.submit, args=("slow", "link"))
+    blocked.start()
+    try:
+        acquired = queue._cond.acquire(timeout=1)
+        assert acquired
+        queue._cond.release()
+    finally:
+        fake_db.create_gate.set()
+        blocked.join()
+
+
+def test_refresh_submit_upgrades_queued_job(fake_db, queue, monkeypatch):
+    ran = []
+    release = threading.Event()
+
+    def fake_ingest(pdf_link, doc_id, progress=None, refresh=False):
+        ran.append((doc_id, refresh))
+        release.wait(5)
+        return f"pdf_chunks_{doc_id}"
+
+    monkeypatch.setattr(jobs, "process_and_store_pdf", fake_ingest)
+    _, busy = queue.submit("busy", "link")  # occupies the only worker
+    first_job, first = queue.submit("doc", "link")
+    second_job, second = queue.submit("doc", "link", refresh=True)
+    assert first_job["id"] == second_job["id"]
+    release.set()
+    assert first.result(5) == second.result(5) == "pdf_chunks_doc"
+    busy.result(5)
+    assert ("doc", True) in ran
+
+
+def test_recover_interrupted_jobs_requeues_dead_workers_jobs(fake_db, queue, monkeypatch):
+    host = WORKER_ID.rpartition(":")[0]
+    fake_db.rows = {
+        "dead": {"id": "dead", "doc_id": "a", "pdf_link": "link", "status": "running",
+                 "worker": f"{host}:999999999", "idle_seconds": 5},
+        "stale": {"id": "stale", "doc_id": "b", "pdf_link": "link", "status": "queued",
+                  "worker": "elsewhere:1", "idle_seconds": jobs.VECTORIZE_STALE_AFTER + 1},
+        "live": {"id": "live", "doc_id": "c", "pdf_link": "link", "status": "running",
+                 "worker": f"{host}:{os.getppid()}", "idle_seconds": 5},
+    }
+
+    assert queue.recover_interrupted_jobs() == 2
+    assert fake_db.rows["dead"]["status"] == "failed"
+    assert fake_db.rows["stale"]["status"] == "failed"
+    assert fake_db.rows["live"]["status"] == "running"
+    requeued = {row["doc_id"] for row in fake_db.rows.values() if row["id"] not in ("dead", "stale", "live")}
+    assert requeued == {"a", "b"}
+
+
+def test_cancelled_caller_does_not_cancel_the_job(fake_db, queue, monkeypatch):
+    release = threading.Event()
+
+    def fake_ingest(pdf_link, doc_id, progress=None, refresh=False):
+        release.wait(5)
+        return f"pdf_chunks_{doc_id}"
+
+    monkeypatch.setattr(jobs, "process_and_store_pdf", fake_ingest)
+    queue.submit("busy", "link")
+    job, gone = queue.submit("doc", "link")
+    _, waiting = queue.submit("doc", "link")
+    assert gone.cancel()  # a disconnected request cancelling its wait
+    release.set()
+    assert waiting.result(5) == "pdf_chunks_doc"
+    assert fake_db.rows[job["id"]]["status"] == "succeeded"
+
+
+def test_duplicate_submit_waits_for_the_job_row(fake_db, queue):
+    fake_db.create_gate.clear()
+    first = threading.Thread(target=queue.submit, args=("doc", "link"))
+    first.start()
+    result = []
+    second = threading.Thread(target=lambda: result.append(queue.submit("doc", "link")))
+    second.start()
+    second.join(0.2)
+    assert second.is_alive()  # waiting for the first submit's insert, not returning a missing row
+    fake_db.create_gate.set()
+    first.join()
+    second.join(5)
+    job, future = result[0]
+    assert job["doc_id"] == "doc"
+    assert future.result(5) == "pdf_chunks_doc"
+
+
+def test_shutdown_fails_jobs_that_never_started(fake_db, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def fake_ingest(pdf_link, doc_id, progress=None, refresh=False):
+        started.set()
+        release.wait(5)
+        return f"pdf_chunks_{doc_id}"
+
+    monkeypatch.setattr(jobs, "process_and_store_pdf", fake_ingest)
+    queue = VectorizationJobQueue(1, 10, 1, 10)
+    _, running = queue.submit("busy", "link")
+    assert started.wait(5)
+    job, waiting = queue.submit("doc", "link")
+    queue.shutdown()
+    release.set()
+    with pytest.raises(jobs.QueueFullError):
+        waiting.result(5)
+    assert fake_db.rows[job["id"]]["status"] == "failed"
+    assert running.result(5) == "pdf_chunks_busy"
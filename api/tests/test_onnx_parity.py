@@ -0,0 +1,82 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+import embeddings
+
+WORDS = ("banks shall comply with paragraph of the master direction on kyc priority sector lending "
+         "interest rates npa classification and report to reserve bank india within days what is "
+         "reporting deadline under").split()
+TEXTS = [
+    f"Banks shall comply with paragraph {i} of the master direction on "
+    f"{['KYC', 'priority sector lending', 'interest rates', 'NPA classification'][i % 4]} "
+    f"and report to the Reserve Bank of India within {i % 30 + 1} days." * (1 + i % 3)
+    for i in range(16)
+] + [f"What is the reporting deadline under paragraph {i}?" for i in range(4)]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """A small randomly initialised BERT sentence-transformer, saved locally"""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("optimum.onnxruntime")
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    directory = tmp_path_factory.mktemp("tiny_model")
+    vocab = directory / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS + list("0123456789.?")))
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab))
+    config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=64, num_hidden_layers=2,
+                        num_attention_heads=4, intermediate_size=128, max_position_embeddings=128)
+    transformer_dir = directory / "transformer"
+    BertModel(config).save_pretrained(transformer_dir)
+    tokenizer.save_pretrained(transformer_dir)
+    transformer = models.Transformer(str(transformer_dir), max_seq_length=128)
+    pooling = models.Pooling(config.hidden_size, pooling_mode="mean")
+    SentenceTransformer(modules=[transformer, pooling], device="cpu").save(str(directory / "model"))
+    return str(directory / "model")
+
+
+@pytest.fixture
+def local_model(tiny_model, tmp_path, monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL", tiny_model)
+    monkeypatch.setattr(embeddings, "EMBEDDING_DEVICE", "cpu")
+    monkeypatch.setattr(embeddings, "EMBEDDING_THREADS", 0)
+    monkeypatch.setattr(embeddings, "EMBEDDING_ONNX_DIR", str(tmp_path / "onnx"))
+    return tiny_model
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backend_matches_torch(local_model, backend):
+    reference = embeddings.embed_texts(TEXTS, model=embeddings.load_sentence_transformer("torch"))
+    vectors = embeddings.embed_texts(TEXTS, model=embeddings.load_sentence_transformer(backend))
+    assert vectors.shape == reference.shape
+    cosine = np.sum(reference * vectors, axis=1)
+    assert cosine.min() >= embeddings.ONNX_PARITY_MIN_COSINE[backend]
+
+
+def test_model_version_distinguishes_backends(monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL", "all-mpnet-base-v2")
+    monkeypatch.setattr(embeddings, "EMBEDDING_ONNX_QUANTIZATION", "avx2")
+    assert embeddings.get_model_version("torch") == "all-mpnet-base-v2"
+    assert embeddings.get_model_version("onnx") == "all-mpnet-base-v2+onnx"
+    assert embeddings.get_model_version("onnx-int8") == "all-mpnet-base-v2+onnx-int8-avx2"
+    monkeypatch.setattr(embeddings, "EMBEDDING_ONNX_QUANTIZATION", "arm64")
+    assert embeddings.get_model_version("onnx-int8") == "all-mpnet-base-v2+onnx-int8-arm64"
+
+
+def test_onnx_backend_without_optimum_fails_at_import():
+    # find_spec reporting optimum as missing, as on an install without requirements-onnx.txt
+    script = (
+        "import importlib.util, sys\n"
+        "find_spec = importlib.util.find_spec\n"
+        "importlib.util.find_spec = lambda name, *a: None if name == 'optimum' else find_spec(name, *a)\n"
+        "import embeddings\n"
+    )
+    env = dict(os.environ, EMBEDDING_BACKEND="onnx")
+    result = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(embeddings.__file__),
+                            env=env, capture_output=True, text=True, timeout=300)
+    assert result.returncode != 0
+    assert "needs optimum[onnxruntime]" in result.stderr
@@ -0,0 +1,79 @@
+import pdfplumber
+from pdf_extract import page_may_have_table, extract_page_tables
+
+CELLS = [["Bank", "Ratio", "Limit"], ["A", "4.5", "10"], ["B", "5.0", "12"]]
+XS = [100, 200, 300, 400]
+YS = [700, 680, 660, 640]
+
+
+def make_pdf(path, drawing: str):
+    """One-page PDF with the CELLS text laid out on the XS/YS grid plus the given path operators"""
+    text = " ".join(
+        f"BT /F1 10 Tf {XS[col] + 10} {YS[row] - 14} Td ({value}) Tj ET"
+        for row, values in enumerate(CELLS) for col, value in enumerate(values)
+    )
+    content = f"{text} {drawing}".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+def polyline_grid() -> str:
+    """The grid as two zig-zag paths, which pdfminer reports as curves rather than lines or rects"""
+    rows = []
+    for i, y in enumerate(YS):
+        xs = (XS[0], XS[-1]) if i % 2 == 0 else (XS[-1], XS[0])
+        rows += [(xs[0], y), (xs[1], y)]
+    columns = []
+    for i, x in enumerate(XS):
+        ys = (YS[0], YS[-1]) if i % 2 == 0 else (YS[-1], YS[0])
+        columns += [(x, ys[0]), (x, ys[1])]
+    return " ".join(
+        " ".join(f"{x} {y} {'m' if j == 0 else 'l'}" for j, (x, y) in enumerate(points)) + " S"
+        for points in (rows, columns)
+    )
+
+
+def line_grid() -> str:
+    horizontal = [f"{XS[0]} {y} m {XS[-1]} {y} l S" for y in YS]
+    vertical = [f"{x} {YS[0]} m {x} {YS[-1]} l S" for x in XS]
+    return " ".join(horizontal + vertical)
+
+
+def test_table_drawn_with_curves_is_detected_and_extracted(tmp_path):
+    with pdfplumber.open(make_pdf(tmp_path / "curves.pdf", polyline_grid())) as pdf:
+        page = pdf.pages[0]
+        assert not page.lines and not page.rects and page.curves
+        assert page_may_have_table(page)
+        assert extract_page_tables(page) == [CELLS]
+
+
+def test_table_drawn_with_lines_is_detected_and_extracted(tmp_path):
+    with pdfplumber.open(make_pdf(tmp_path / "lines.pdf", line_grid())) as pdf:
+        page = pdf.pages[0]
+        assert page.lines and not page.curves
+        assert page_may_have_table(page)
+        assert extract_page_tables(page) == [CELLS]
+
+
+def test_page_without_rules_is_skipped(tmp_path):
+    with pdfplumber.open(make_pdf(tmp_path / "text.pdf", "")) as pdf:
+        page = pdf.pages[0]
+        assert not page_may_have_table(page)
+        assert extract_page_tables(page) == []
@@ -0,0 +1,81 @@
+import os
+import time
+import pytest
+import pdf_store
+from pdf_store import PdfStore
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, status_code: int = 200):
+        self.body = body
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/pdf", "ETag": f'"{len(body)}"'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+@pytest.fixture
+def server(monkeypatch):
+    bodies = {}
+    monkeypatch.setattr(pdf_store.requests, "get",
+                        lambda link, headers=None, **kwargs: FakeResponse(bodies[link]))
+    return bodies
+
+
+def test_processes_sharing_a_directory_keep_each_others_entries(tmp_path, server):
+    first, second = PdfStore(str(tmp_path), 0), PdfStore(str(tmp_path), 0)
+    server.update({"http://a/1.pdf": b"%PDF-one", "http://a/2.pdf": b"%PDF-two"})
+    one = first.fetch("http://a/1.pdf")
+    two = second.fetch("http://a/2.pdf")  # second has never seen first's entry
+
+    assert first.get("http://a/2.pdf")["sha256"] == two["sha256"]
+    reopened = PdfStore(str(tmp_path), 0)
+    assert reopened.get("http://a/1.pdf")["sha256"] == one["sha256"]
+    assert reopened.get("http://a/2.pdf")["sha256"] == two["sha256"]
+    # Entries were appended to the log, not written by rewriting the snapshot
+    assert not os.path.exists(first.index_path)
+
+
+def test_log_is_compacted_and_other_processes_reload(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(pdf_store, "_LOG_MIN_COMPACT_BYTES", 0)
+    reader, writer = PdfStore(str(tmp_path), 0), PdfStore(str(tmp_path), 0)
+    for i in range(5):
+        server[f"http://a/{i}.pdf"] = f"%PDF-{i}".encode()
+        writer.fetch(f"http://a/{i}.pdf")
+    assert os.path.getsize(writer.log_path) <= os.path.getsize(writer.index_path)
+    assert all(reader.get(f"http://a/{i}.pdf") for i in range(5))
+
+
+def test_least_recently_fetched_blobs_are_evicted(tmp_path, server):
+    store = PdfStore(str(tmp_path), 0, max_bytes=250)
+    day = 24 * 3600
+    for i in range(3):
+        server[f"http://a/{i}.pdf"] = bytes([i]) * 100
+        store.fetch(f"http://a/{i}.pdf")
+        entry = store.get(f"http://a/{i}.pdf")
+        store._put(f"http://a/{i}.pdf", dict(entry, fetched_at=time.time() - (3 - i) * day))
+
+    server["http://a/new.pdf"] = b"n" * 100
+    store.fetch("http://a/new.pdf")
+    assert store.get("http://a/0.pdf") is None and store.get("http://a/1.pdf") is None
+    assert store.get("http://a/2.pdf") and store.get("http://a/new.pdf")
+    assert len(os.listdir(store.blobs_dir)) == 2
+    assert PdfStore(str(tmp_path), 0).get("http://a/0.pdf") is None
+
+
+def test_recently_fetched_blobs_are_kept_over_the_cap(tmp_path, server):
+    store = PdfStore(str(tmp_path), 0, max_bytes=150)
+    for i in range(3):
+        server[f"http://a/{i}.pdf"] = bytes([i]) * 100
+        store.fetch(f"http://a/{i}.pdf")
+    assert all(store.get(f"http://a/{i}.pdf") for i in range(3))
@@ -0,0 +1,63 @@
+import asyncio
+import time
+import httpx
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import app
+import llm
+
+LLM_LATENCY = 0.3
+
+
+class SlowChatModel(BaseChatModel):
+    """Chat model that answers after LLM_LATENCY seconds, blocking or awaited"""
+
+    @property
+    def _llm_type(self):
+        return "slow-fake"
+
+    def _result(self):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer"))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(LLM_LATENCY)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(LLM_LATENCY)
+        return self._result()
+
+
+@pytest.fixture
+def stubbed_llm(monkeypatch):
+    model = SlowChatModel()
+    monkeypatch.setattr(llm, "get_llm", lambda: model)
+    monkeypatch.setattr(llm, "answer_cache", None)
+    monkeypatch.setattr(llm, "embed_query", lambda query: [0.1] * 768)
+    monkeypatch.setattr(llm, "retrieve_passages", lambda *args, **kwargs: [
+        {"text": "context", "page": 1, "heading": None, "score": 0.9}
+    ])
+
+
+async def _post_concurrently(users: int) -> float:
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/process_message", json={"message": "What is the effective date?", "doc_id": "1"})
+            for _ in range(users)
+        ))
+        elapsed = time.perf_counter() - started
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["response"]["content"] == "answer" for response in responses)
+    return elapsed
+
+
+def test_concurrent_questions_overlap_on_one_worker(stubbed_llm):
+    # A blocking request path would take users * LLM_LATENCY; a non-blocking one about one LLM round trip
+    users = 8
+    elapsed = asyncio.run(_post_concurrently(users))
+    assert elapsed < 3 * LLM_LATENCY, f"{users} concurrent requests took {elapsed:.2f}s"
@@ -0,0 +1,64 @@
+import retrieval
+
+
+def match(chunk_id, score, **metadata):
+    return {"id": chunk_id, "score": score, "metadata": dict({"text": f"text of {chunk_id}"}, **metadata)}
+
+
+def test_build_passages_without_neighbours_uses_vector_metadata(monkeypatch):
+    def no_registry(*args, **kwargs):
+        raise AssertionError("registry queried for neighbours=0")
+
+    monkeypatch.setattr(retrieval.registry, "get_chunk_context", no_registry)
+    passages = retrieval.build_passages(
+        [match("a", 0.5, page=3, heading="2. Scope"), match("shared_x", 0.9)], "pdf_chunks_d1", neighbours=0
+    )
+    assert passages == [
+        {"text": "text of shared_x", "page": None, "heading": None, "score": 0.9},
+        {"text": "text of a", "page": 3, "heading": "2. Scope", "score": 0.5},
+    ]
+
+
+def test_build_passages_widens_from_the_registry(monkeypatch):
+    calls = []
+
+    def chunk_context(doc_id, chunk_ids, window):
+        calls.append((doc_id, chunk_ids, window))
+        return [
+            {"chunk_id": "a", "chunk_index": 0, "page": 1, "start_offset": 0, "end_offset": 9, "heading": "H"},
+            {"chunk_id": "b", "chunk_index": 1, "page": 1, "start_offset": 10, "end_offset": 19, "heading": "H"},
+        ]
+
+    monkeypatch.setattr(retrieval.registry, "get_chunk_context", chunk_context)
+    monkeypatch.setattr(retrieval, "fetch_chunk_metadata", lambda ids, namespace: {"b": {"text": "neighbour"}})
+    passages = retrieval.build_passages([match("a", 0.7)], "pdf_chunks_d1", neighbours=1)
+    assert calls == [("d1", ["a"], 1)]
+    assert passages == [{"text": "text of a\nneighbour", "page": 1, "heading": "H", "score": 0.7}]
+
+
+def passage(text, score):
+    return {"text": text, "page": 1, "heading": None, "score": score}
+
+
+def test_fuse_orders_by_rank_not_raw_score():
+    fused = retrieval.fuse_document_passages({
+        "pdf_chunks_d1": [passage("d1 first", 0.9), passage("d1 second", 0.8), passage("d1 third", 0.7)],
+        "pdf_chunks_d2": [passage("d2 first", 0.3), passage("d2 second", 0.2)],
+    }, titles={"pdf_chunks_d1": "One"}, k=60)
+    # Each document's best hit leads, whatever its raw similarity; ties go to the higher score
+    assert [p["text"] for p in fused] == ["d1 first", "d2 first", "d1 second", "d2 second", "d1 third"]
+    assert fused[0]["rrf_score"] == fused[1]["rrf_score"] == 1 / 61
+    assert (fused[0]["doc_id"], fused[0]["title"]) == ("pdf_chunks_d1", "One")
+    assert (fused[1]["doc_id"], fused[1]["title"]) == ("pdf_chunks_d2", None)
+
+
+def test_fuse_lists_shared_text_once_with_its_best_rank():
+    fused = retrieval.fuse_document_passages({
+        "pdf_chunks_d1": [passage("own d1", 0.9), passage("Reserve  Bank\nof India", 0.5)],
+        "pdf_chunks_d2": [passage("Reserve Bank of India", 0.6), passage("own d2", 0.4)],
+    }, k=60, limit=3)
+    assert len(fused) == 3
+    shared = [p for p in fused if p["text"].startswith("Reserve")]
+    assert len(shared) == 1
+    assert shared[0]["rrf_score"] == 1 / 61 and shared[0]["score"] == 0.6
+    assert [" ".join(p["text"].split()) for p in fused] == ["own d1", "Reserve Bank of India", "own d2"]
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import pytest
+import vector_store
+from vector_store import LocalVectorStore
+
+DIM = 8
+
+
+def make_vectors(ids, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.standard_normal((len(ids), DIM)).astype(np.float32)
+    values /= np.linalg.norm(values, axis=1, keepdims=True)
+    return [{"id": vector_id, "values": row, "metadata": {"text": vector_id}} for vector_id, row in zip(ids, values)]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_upserts_append_rows_without_rewriting_the_namespace(tmp_path, dtype):
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    first = make_vectors(["a", "b"], seed=1)
+    store.upsert(first, "ns")
+    ns_dir = store._namespace_dir("ns")
+    records_inode = os.stat(os.path.join(ns_dir, "records.json")).st_ino
+    vectors_inode = os.stat(os.path.join(ns_dir, "vectors.f32")).st_ino
+
+    second = make_vectors(["c", "a"], seed=2)  # one new row, one overwritten in place
+    store.upsert(second, "ns")
+    assert os.stat(os.path.join(ns_dir, "records.json")).st_ino == records_inode
+    assert os.stat(os.path.join(ns_dir, "vectors.f32")).st_ino == vectors_inode
+
+    reader = LocalVectorStore(str(tmp_path), dtype=dtype)  # as another process would see it
+    fetched = reader.fetch(["a", "b", "c"], "ns")
+    np.testing.assert_allclose(fetched["a"]["values"], second[1]["values"], rtol=1e-6)
+    np.testing.assert_allclose(fetched["b"]["values"], first[1]["values"], rtol=1e-6)
+    np.testing.assert_allclose(fetched["c"]["values"], second[0]["values"], rtol=1e-6)
+    assert reader.query(second[0]["values"], "ns", top_k=1)[0]["id"] == "c"
+    assert [v["id"] for batch in reader.iter_vectors("ns") for v in batch] == ["a", "b", "c"]
+
+
+def test_log_is_compacted_into_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_RECORDS_LOG_MIN_BYTES", 0)
+    store = LocalVectorStore(str(tmp_path))
+    for i in range(20):
+        store.upsert(make_vectors([f"v{i}"], seed=i), "ns")
+    ns_dir = store._namespace_dir("ns")
+    log_path = os.path.join(ns_dir, "records.log")
+    log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    assert log_size <= os.path.getsize(os.path.join(ns_dir, "records.json"))
+    assert len(LocalVectorStore(str(tmp_path)).fetch([f"v{i}" for i in range(20)], "ns")) == 20
+
+
+def test_uncommitted_rows_are_ignored_and_overwritten(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.upsert(make_vectors(["a"]), "ns")
+    vectors_path = os.path.join(store._namespace_dir("ns"), "vectors.f32")
+    with open(vectors_path, "ab") as f:
+        f.write(np.ones(DIM, dtype=np.float32).tobytes())  # crashed writer: rows but no log record
+
+    reader = LocalVectorStore(str(tmp_path))
+    assert [match["id"] for match in reader.query(np.ones(DIM), "ns", top_k=5)] == ["a"]
+    store.upsert(make_vectors(["b"], seed=3), "ns")
+    assert os.path.getsize(vectors_path) == 2 * DIM * 4
+
+
+def test_delete_after_incremental_upserts(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dtype="int8")
+    store.upsert(make_vectors(["a", "b"]), "ns")
+    store.upsert(make_vectors(["c"], seed=4), "ns")
+    store.delete(["b"], "ns")
+    store.upsert(make_vectors(["d"], seed=5), "ns")
+    assert sorted(LocalVectorStore(str(tmp_path), dtype="int8").fetch(["a", "b", "c", "d"], "ns")) == ["a", "c", "d"]
+
+
+def test_query_document_includes_shared_chunks_only_when_asked(tmp_path, monkeypatch):
+    store = LocalVectorStore(str(tmp_path))
+    monkeypatch.setattr(vector_store, "_vector_store", store)
+    own, shared, other = make_vectors(["own", "shared", "other"], seed=6)
+    store.upsert([own], "pdf_chunks_d1")
+    shared["metadata"] = {"text": "shared", "doc_ids": ["d1", "d2"]}
+    other["metadata"] = {"text": "other", "doc_ids": ["d2"]}
+    store.upsert([shared, other], vector_store.SHARED_NAMESPACE)
+
+    with_shared = vector_store.query_document(shared["values"], "pdf_chunks_d1", top_k=5)
+    assert [match["id"] for match in with_shared] == ["shared", "own"]
+    without = vector_store.query_document(shared["values"], "pdf_chunks_d1", top_k=5, include_shared=False)
+    assert [match["id"] for match in without] == ["own"]
+
+
+def test_retrieval_skips_shared_query_for_documents_without_shared_chunks(monkeypatch):
+    import retrieval
+    calls = []
+    monkeypatch.setattr(retrieval, "query_document",
+                        lambda vector, namespace, top_k, include_shared: calls.append(include_shared) or [])
+    monkeypatch.setattr(retrieval.registry, "get", lambda doc_id, fresh=False, max_age=None: {
+        "d1": {"shared_chunk_count": 0}, "d2": {"shared_chunk_count": 3}, "d3": {"shared_chunk_count": None}
+    }.get(doc_id))
+    for doc_id in ("d1", "d2", "d3", "unknown"):
+        retrieval.retrieve_passages([1.0], f"pdf_chunks_{doc_id}")
+    assert calls == [False, True, True, True]
+
+
+@pytest.mark.parametrize("dtype, rescore", [("float16", True), ("int8", True), ("int8", False)])
+def test_quantized_query_ranks_like_float32(tmp_path, dtype, rescore):
+    vectors = make_vectors([f"v{i}" for i in range(200)], seed=7)
+    exact = LocalVectorStore(str(tmp_path / "exact"))
+    quantized = LocalVectorStore(str(tmp_path / dtype), dtype=dtype, rescore=rescore)
+    exact.upsert(vectors, "ns")
+    quantized.upsert(vectors, "ns")
+    assert quantized._load("ns").codes is not None
+
+    for query in make_vectors([f"q{i}" for i in range(10)], seed=8):
+        expected = exact.query(query["values"], "ns", top_k=5)
+        found = quantized.query(query["values"], "ns", top_k=5)
+        assert found[0]["id"] == expected[0]["id"]
+        assert len({m["id"] for m in found} & {m["id"] for m in expected}) >= 4
+        if rescore:
+            assert found[0]["score"] == pytest.approx(expected[0]["score"], abs=1e-6)
+        else:
+            assert found[0]["score"] == pytest.approx(expected[0]["score"], abs=0.02)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_query_filter_scores_matching_rows_only(tmp_path, dtype):
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    vectors = make_vectors(["a", "b", "c", "d"], seed=9)
+    for vector, doc_ids, page in zip(vectors, (["d1"], ["d1", "d2"], ["d2"], ["d3"]), (1, 2, 1, 2)):
+        vector["metadata"] = {"text": vector["id"], "doc_ids": doc_ids, "page": page}
+    store.upsert(vectors, "ns")
+    query = vectors[2]["values"]
+
+    def ids(filter):
+        return [match["id"] for match in store.query(query, "ns", top_k=10, filter=filter)]
+
+    assert ids({"doc_ids": {"$eq": "d2"}})[0] == "c"
+    assert sorted(ids({"doc_ids": {"$eq": "d2"}})) == ["b", "c"]
+    assert sorted(ids({"doc_ids": {"$in": ["d1", "d3"]}})) == ["a", "b", "d"]
+    assert sorted(ids({"doc_ids": "d1", "page": 2})) == ["b"]
+    assert ids({"doc_ids": {"$eq": "missing"}}) == []
+    match = store.query(query, "ns", top_k=1, filter={"page": 1})[0]
+    assert match["id"] == "c" and match["score"] == pytest.approx(1.0, abs=1e-6)
@@ -0,0 +1,99 @@
+import time
+import threading
+from neon_database import db
+
+
+class VectorRegistry:
+    """
+    Record of which documents are vectorized, kept in Postgres (vectorized_documents)
+    and mirrored in memory. Only positive lookups are cached locally, so a document
+    vectorized by another worker is still found on the next lookup.
+    """
+
+    def __init__(self):
+        self._entries = {}  # doc_id -> (registry row, time read)
+        self._lock = threading.Lock()
+
+    def get(self, doc_id: str, fresh: bool = False, max_age: float = None) -> dict:
+        """
+        Registry entry for doc_id, or None if it has not been vectorized.
+        fresh=True skips the in-memory copy and reads Postgres; max_age re-reads
+        copies older than that many seconds (another worker may have re-ingested).
+        """
+        if not fresh:
+            with self._lock:
+                entry, read_at = self._entries.get(doc_id, (None, None))
+            if entry is not None and (max_age is None or time.monotonic() - read_at <= max_age):
+                return entry
+
+        entry = db.get_vectorized_document(doc_id)
+        if entry is not None:
+            with self._lock:
+                self._entries[doc_id] = (entry, time.monotonic())
+        return entry
+
+    def is_vectorized(self, doc_id: str, model_version: str = None) -> bool:
+        """True if doc_id is vectorized (with model_version, when given)"""
+        entry = self.get(doc_id)
+        if entry is None:
+            return False
+        return model_version is None or entry.get("model_version") in (None, model_version)
+
+    def get_version(self, doc_id: str) -> tuple:
+        """(content_hash, model_version) of doc_id as currently stored in Postgres, or None"""
+        entry = self.get(doc_id, fresh=True)
+        if entry is None:
+            return None
+        return (entry.get("content_hash"), entry.get("model_version"))
+
+    def get_chunks(self, doc_id: str) -> list:
+        """Stored [(chunk_id, chunk_hash, provenance), ...] of doc_id in document order"""
+        return [
+            (row["chunk_id"], row["chunk_hash"], {"page": row["page"], "start": row["start_offset"],
+                                                  "end": row["end_offset"], "heading": row["heading"]})
+            for row in db.get_vectorized_chunks(doc_id)
+        ]
+
+    def get_chunk_context(self, doc_id: str, chunk_ids: list, window: int = 0) -> list:
+        """Chunks of doc_id within window positions of chunk_ids, in order, with page/offsets/heading"""
+        return db.get_chunk_context(doc_id, chunk_ids, window)
+
+    def get_chunk_owners(self, chunk_hashes: list, exclude_doc_id: str, model_version: str) -> dict:
+        """Other documents already storing any of chunk_hashes: {chunk_hash: [{"doc_id", "chunk_id", "namespace"}]}"""
+        return db.get_chunk_owners(chunk_hashes, exclude_doc_id, model_version)
+
+    def rename_chunk(self, doc_id: str, chunk_id: str, new_chunk_id: str) -> bool:
+        """Point doc_id's chunk at another vector id; False if doc_id no longer has chunk_id"""
+        renamed = db.rename_vectorized_chunk(doc_id, chunk_id, new_chunk_id)
+        with self._lock:
+            self._entries.pop(doc_id, None)
+        return renamed
+
+    def has_shared_chunks(self, doc_id: str, max_age: float = None) -> bool:
+        """False only when the registry knows doc_id references no chunks in the shared namespace"""
+        try:
+            entry = self.get(doc_id, max_age=max_age)
+        except Exception as e:
+            print(f"⚠️ Registry lookup for {doc_id} failed, querying shared chunks too: {e}")
+            return True
+        return entry is None or entry.get("shared_chunk_count") != 0
+
+    def record(self, doc_id: str, namespace: str, chunk_count: int, model_version: str,
+               content_hash: str = None, chunks: list = None, shared_chunk_count: int = None) -> dict:
+        """Register a completed ingest, replacing the stored chunk list when chunks is given"""
+        entry = db.upsert_vectorized_document(doc_id, namespace, chunk_count, model_version, content_hash,
+                                              chunks=chunks, shared_chunk_count=shared_chunk_count)
+        with self._lock:
+            self._entries[doc_id] = (entry, time.monotonic())
+        return entry
+
+    def invalidate(self, doc_id: str, delete: bool = False):
+        """Drop the local copy of doc_id (and the Postgres row when delete=True)"""
+        with self._lock:
+            self._entries.pop(doc_id, None)
+        if delete:
+            db.delete_vectorized_document(doc_id)
+
+
+# Global registry instance
+registry = VectorRegistry()
@@ -0,0 +1,646 @@
+import os
+import re
+import json
+import shutil
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+from pinecone import Pinecone
+from pinecone.exceptions import NotFoundException
+from file_lock import file_lock
+
+# Load environment variables
+load_dotenv()
+
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "fincompilance")
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", os.path.join(".cache", "vectors"))
+# In-memory scan precision of the local store: float32, float16 or int8
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32").lower()
+# Rescore quantized candidates against the full-precision vectors on disk
+LOCAL_VECTOR_RESCORE = os.getenv("LOCAL_VECTOR_RESCORE", "true").lower() == "true"
+LOCAL_VECTOR_RESCORE_FACTOR = int(os.getenv("LOCAL_VECTOR_RESCORE_FACTOR", "4"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_MAX_BYTES = int(os.getenv("UPSERT_MAX_BYTES", str(2 * 1024 * 1024)))
+# Threads running a document's shared-namespace query alongside its own namespace query
+VECTOR_QUERY_WORKERS = int(os.getenv("VECTOR_QUERY_WORKERS", "8"))
+
+DOCUMENT_NAMESPACE_PREFIX = "pdf_chunks_"
+# Chunks that appear in several documents are stored once here, tagged with all their doc_ids
+SHARED_NAMESPACE = "pdf_chunks_shared"
+
+# Global variables for lazy loading
+_pc = None
+_index = None
+_vector_store = None
+_vector_store_lock = threading.Lock()
+_query_executor = None
+
+def get_pinecone_client():
+    """Lazy load Pinecone client"""
+    global _pc
+    if _pc is None:
+        print("🔄 Loading Pinecone client...")
+        _pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        print("✅ Pinecone client loaded")
+    return _pc
+
+def get_pinecone_index():
+    """Lazy load Pinecone index"""
+    global _index
+    if _index is None:
+        print("🔄 Loading Pinecone index...")
+        pc = get_pinecone_client()
+        _index = pc.Index(PINECONE_INDEX_NAME)
+        print("✅ Pinecone index loaded")
+    return _index
+
+# -----------------------------
+# Upsert paging
+# -----------------------------
+def _estimate_vector_bytes(vector: dict) -> int:
+    """Rough JSON payload size of a single vector record."""
+    metadata_bytes = sum(len(str(k)) + len(str(v).encode("utf-8")) for k, v in vector["metadata"].items())
+    # ~12 bytes per serialized float plus ids and JSON overhead
+    return len(vector["id"]) + len(vector["values"]) * 12 + metadata_bytes + 64
+
+def iter_upsert_batches(vectors: list, max_vectors: int = None, max_bytes: int = None):
+    """
+    Yield pages of vectors bounded by both vector count and estimated payload size.
+    """
+    max_vectors = max_vectors or UPSERT_BATCH_SIZE
+    max_bytes = max_bytes or UPSERT_MAX_BYTES
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        size = _estimate_vector_bytes(vector)
+        if batch and (len(batch) >= max_vectors or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+# -----------------------------
+# Vector store backends
+# -----------------------------
+class VectorStore:
+    """
+    Interface shared by the vector store backends. Vectors are dicts with
+    "id", "values" and "metadata"; query matches are dicts with "id", "score"
+    and "metadata", best first. Query filters use the Pinecone metadata filter
+    syntax (the local backend supports plain values, $eq and $in).
+    """
+
+    def upsert(self, vectors: list, namespace: str) -> int:
+        raise NotImplementedError
+
+    def query(self, vector, namespace: str, top_k: int = 5, filter: dict = None) -> list:
+        raise NotImplementedError
+
+    def fetch(self, ids: list, namespace: str) -> dict:
+        """Return {id: vector dict} for the ids that exist in the namespace"""
+        raise NotImplementedError
+
+    def delete(self, ids: list, namespace: str):
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace: str):
+        raise NotImplementedError
+
+    def list_namespaces(self) -> list:
+        raise NotImplementedError
+
+    def iter_vectors(self, namespace: str, batch_size: int = 100):
+        """Yield lists of vector dicts covering every vector in the namespace"""
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Vector store backed by the hosted Pinecone index"""
+
+    def upsert(self, vectors: list, namespace: str) -> int:
+        index = get_pinecone_index()
+        written = 0
+        for batch in iter_upsert_batches(vectors):
+            index.upsert(vectors=batch, namespace=namespace)
+            written += len(batch)
+        return written
+
+    def query(self, vector, namespace: str, top_k: int = 5, filter: dict = None) -> list:
+        if isinstance(vector, np.ndarray):
+            vector = vector.astype(float).tolist()
+        results = get_pinecone_index().query(
+            vector=vector,
+            top_k=int(top_k),
+            include_metadata=True,
+            namespace=str(namespace),
+            filter=filter
+        )
+        return [
+            {"id": m["id"], "score": m["score"], "metadata": m.get("metadata") or {}}
+            for m in results.get("matches", [])
+        ]
+
+    def fetch(self, ids: list, namespace: str) -> dict:
+        response = get_pinecone_index().fetch(ids=list(ids), namespace=namespace)
+        return {
+            vector_id: {"id": vector_id, "values": list(v.values), "metadata": v.metadata or {}}
+            for vector_id, v in response.vectors.items()
+        }
+
+    def delete(self, ids: list, namespace: str):
+        index = get_pinecone_index()
+        ids = list(ids)
+        for start in range(0, len(ids), 1000):
+            index.delete(ids=ids[start:start + 1000], namespace=namespace)
+
+    def delete_namespace(self, namespace: str):
+        try:
+            get_pinecone_index().delete(delete_all=True, namespace=namespace)
+        except NotFoundException:
+            pass
+
+    def list_namespaces(self) -> list:
+        # Index-wide stats call: only meant for offline jobs such as building the ANN index
+        stats = get_pinecone_index().describe_index_stats()
+        return list(stats.get("namespaces", {}).keys())
+
+    def iter_vectors(self, namespace: str, batch_size: int = 100):
+        for page in get_pinecone_index().list(namespace=namespace, limit=min(batch_size, 100)):
+            # Older clients yield lists of id strings, newer ones pages of items with .id
+            ids = [item if isinstance(item, str) else item.id for item in page]
+            if ids:
+                yield list(self.fetch(ids, namespace).values())
+
+
+# -----------------------------
+# Quantization for the local store
+# -----------------------------
+_QUANTIZED_SUFFIX = {"float16": "f16", "int8": "i8"}
+_SCAN_BLOCK_ROWS = 8192
+# records.log is folded into records.json once it is larger than both this and records.json
+_RECORDS_LOG_MIN_BYTES = 1024 * 1024
+
+def quantize(matrix: np.ndarray, dtype: str):
+    """
+    Quantize float32 rows for scanning. Returns (codes, scales): float16 codes with
+    no scales, or int8 codes with one float32 scale per row (max |x| / 127).
+    """
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unsupported LOCAL_VECTOR_DTYPE: {dtype}")
+
+def scan_scores(codes: np.ndarray, scales, query: np.ndarray) -> np.ndarray:
+    """Dot products of every row with query, dequantizing block by block to bound temporary memory"""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), _SCAN_BLOCK_ROWS):
+        block = codes[start:start + _SCAN_BLOCK_ROWS].astype(np.float32)
+        scores[start:start + len(block)] = block @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """Evaluate a Pinecone-style metadata filter; list-valued fields match if any element does"""
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            if "$eq" in condition and condition["$eq"] not in values:
+                return False
+            if "$in" in condition and not any(v in condition["$in"] for v in values):
+                return False
+        elif condition not in values:
+            return False
+    return True
+
+
+class _LocalNamespace:
+    """In-memory view of one namespace of the local store"""
+
+    def __init__(self, matrix, ids, metadata, version, codes=None, scales=None):
+        self.matrix = matrix  # full-precision float32 memmap
+        self.codes = codes  # quantized copy held in RAM for scanning, or None
+        self.scales = scales
+        self.ids = ids
+        self.metadata = metadata
+        self.rows = {vector_id: row for row, vector_id in enumerate(ids)}
+        self.version = version
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process flat index. Each namespace is a directory holding a raw float32
+    matrix (vectors.f32, opened as a read-only memmap) and records.json with the
+    row-aligned ids and metadata. Queries are one vectorized dot product over the
+    namespace matrix, which equals cosine similarity for the normalized
+    embeddings written by the vectorizer.
+
+    With dtype float16 or int8, a quantized copy (vectors.f16 / vectors.i8 plus
+    per-row scales.f32) is written next to the float32 matrix and loaded into RAM
+    for scanning. When rescore is on, the best top_k * rescore_factor candidates
+    are re-ranked with exact scores read from the float32 memmap.
+
+    Upserts only touch the rows they write: new rows are appended to the vector
+    files, existing rows are overwritten in place, and their ids and metadata are
+    appended to records.log, which is folded into records.json once it outgrows
+    it (and 1 MB). Deletes rewrite the namespace. Writers hold an exclusive file lock on the
+    namespace and readers a shared one, so worker processes can share the directory.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float32", rescore: bool = True, rescore_factor: int = 4):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported LOCAL_VECTOR_DTYPE: {dtype}")
+        self.directory = directory
+        self.dtype = dtype
+        self.rescore = rescore
+        self.rescore_factor = max(1, rescore_factor)
+        self._lock = threading.RLock()
+        self._namespaces = {}  # namespace -> _LocalNamespace
+        self._row_maps = {}  # namespace -> (version, dim, dtype, {id: row}) used by upsert
+        os.makedirs(directory, exist_ok=True)
+
+    def _namespace_dir(self, namespace: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", namespace))
+
+    @staticmethod
+    def _version(ns_dir: str):
+        """(records.json mtime, records.log size): changes with every write to the namespace"""
+        try:
+            mtime = os.stat(os.path.join(ns_dir, "records.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        try:
+            log_size = os.path.getsize(os.path.join(ns_dir, "records.log"))
+        except FileNotFoundError:
+            log_size = 0
+        return mtime, log_size
+
+    @staticmethod
+    def _read_records(ns_dir: str):
+        """records.json with the rows appended or rewritten in records.log applied"""
+        with open(os.path.join(ns_dir, "records.json"), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        log_path = os.path.join(ns_dir, "records.log")
+        if os.path.exists(log_path):
+            ids, metadata = records["ids"], records["metadata"]
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn final record of a crashed writer; its rows are not committed
+                    record = json.loads(line)
+                    if record["row"] == len(ids):
+                        ids.append(record["id"])
+                        metadata.append(record["metadata"])
+                    else:
+                        ids[record["row"]] = record["id"]
+                        metadata[record["row"]] = record["metadata"]
+        return records
+
+    def _load(self, namespace: str, locked: bool = False):
+        """
+        Return the cached namespace view, reloading it if another writer changed it.
+        locked=True when the caller already holds the namespace's exclusive file lock.
+        """
+        ns_dir = self._namespace_dir(namespace)
+        version = self._version(ns_dir)
+        if version is None:
+            self._namespaces.pop(namespace, None)
+            return None
+        cached = self._namespaces.get(namespace)
+        if cached is not None and cached.version == version:
+            return cached
+
+        with nullcontext() if locked else file_lock(os.path.join(ns_dir, "lock"), shared=True):
+            version = self._version(ns_dir)
+            if version is None:
+                return None
+            records = self._read_records(ns_dir)
+            ids, dim = records["ids"], records["dim"]
+            codes, scales = None, None
+            if ids:
+                # Vector files may be longer than the committed rows; only len(ids) rows are read
+                matrix = np.memmap(os.path.join(ns_dir, "vectors.f32"), dtype=np.float32, mode="r",
+                                   shape=(len(ids), dim))
+                if self.dtype != "float32":
+                    codes_path = os.path.join(ns_dir, f"vectors.{_QUANTIZED_SUFFIX[self.dtype]}")
+                    if records.get("dtype") == self.dtype and os.path.exists(codes_path):
+                        codes = np.fromfile(codes_path, dtype=self.dtype, count=len(ids) * dim).reshape(len(ids), dim)
+                        if self.dtype == "int8":
+                            scales = np.fromfile(os.path.join(ns_dir, "scales.f32"), dtype=np.float32, count=len(ids))
+                    else:
+                        # Written with another precision setting: quantize from the float32 matrix
+                        codes, scales = quantize(np.asarray(matrix), self.dtype)
+            else:
+                matrix = np.empty((0, dim), dtype=np.float32)
+        loaded = _LocalNamespace(matrix, ids, records["metadata"], version, codes, scales)
+        self._namespaces[namespace] = loaded
+        return loaded
+
+    def _write(self, namespace: str, matrix: np.ndarray, ids: list, metadata: list):
+        """Atomically replace a namespace's files; the caller holds the namespace's file lock"""
+        ns_dir = self._namespace_dir(namespace)
+        os.makedirs(ns_dir, exist_ok=True)
+        vectors_path = os.path.join(ns_dir, "vectors.f32")
+        records_path = os.path.join(ns_dir, "records.json")
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        written = [vectors_path]
+        matrix.tofile(vectors_path + ".tmp")
+        if self.dtype != "float32":
+            codes, scales = quantize(matrix, self.dtype)
+            codes_path = os.path.join(ns_dir, f"vectors.{_QUANTIZED_SUFFIX[self.dtype]}")
+            codes.tofile(codes_path + ".tmp")
+            written.append(codes_path)
+            if scales is not None:
+                scales_path = os.path.join(ns_dir, "scales.f32")
+                scales.tofile(scales_path + ".tmp")
+                written.append(scales_path)
+        with open(records_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": int(matrix.shape[1]), "dtype": self.dtype, "ids": ids, "metadata": metadata}, f)
+        # Drop our memmap before replacing the files underneath it; records.json goes last
+        self._namespaces.pop(namespace, None)
+        self._row_maps.pop(namespace, None)
+        for path in written + [records_path]:
+            os.replace(path + ".tmp", path)
+        log_path = os.path.join(ns_dir, "records.log")
+        if os.path.exists(log_path):
+            os.remove(log_path)
+
+    def _compact_records(self, ns_dir: str, records: dict):
+        """Fold records.log into records.json; vector rows are unchanged. Caller holds the file lock"""
+        records_path = os.path.join(ns_dir, "records.json")
+        with open(records_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(records, f)
+        os.replace(records_path + ".tmp", records_path)
+        os.remove(os.path.join(ns_dir, "records.log"))
+
+    @staticmethod
+    def _write_rows(path: str, row_count: int, row_bytes: int, updates: list, appended: bytes):
+        """Overwrite rows in place and append new ones after the committed row_count rows"""
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            for row, data in updates:
+                f.seek(row * row_bytes)
+                f.write(data)
+            # Drop rows a crashed writer appended but never committed to records.log
+            f.truncate(row_count * row_bytes)
+            f.seek(row_count * row_bytes)
+            f.write(appended)
+
+    def upsert(self, vectors: list, namespace: str) -> int:
+        if not vectors:
+            return 0
+        new_values = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+        ns_dir = self._namespace_dir(namespace)
+        with self._lock:
+            os.makedirs(ns_dir, exist_ok=True)
+            with file_lock(os.path.join(ns_dir, "lock")):
+                version = self._version(ns_dir)
+                row_map = self._row_maps.get(namespace)
+                if row_map is None or row_map[0] != version:
+                    if version is None:
+                        row_map = (None, new_values.shape[1], self.dtype, {})
+                    else:
+                        records = self._read_records(ns_dir)
+                        row_map = (version, records["dim"], records.get("dtype"),
+                                   {vector_id: row for row, vector_id in enumerate(records["ids"])})
+                _, dim, dtype, rows = row_map
+
+                if version is None or dtype != self.dtype:
+                    # New namespace, or written with another precision: write it out in full
+                    current = self._load(namespace, locked=True) if version is not None else None
+                    matrix = np.array(current.matrix) if current is not None else np.empty((0, dim), dtype=np.float32)
+                    ids = list(current.ids) if current is not None else []
+                    metadata = list(current.metadata) if current is not None else []
+                    rows = dict(current.rows) if current is not None else {}
+                    appended = []
+                    for vector, values in zip(vectors, new_values):
+                        row = rows.get(vector["id"])
+                        if row is None:
+                            rows[vector["id"]] = len(ids)
+                            ids.append(vector["id"])
+                            metadata.append(vector.get("metadata") or {})
+                            appended.append(values)
+                        else:
+                            matrix[row] = values
+                            metadata[row] = vector.get("metadata") or {}
+                    if appended:
+                        matrix = np.vstack([matrix, np.asarray(appended, dtype=np.float32)])
+                    self._write(namespace, matrix, ids, metadata)
+                    return len(vectors)
+
+                # Last write of an id in this batch wins, as with a sequential upsert
+                latest = {}
+                for vector, values in zip(vectors, new_values):
+                    latest[vector["id"]] = (vector.get("metadata") or {}, values)
+                row_count = len(rows)
+                updates, appended, log_records = [], [], []
+                for vector_id, (metadata, values) in latest.items():
+                    row = rows.get(vector_id)
+                    if row is None:
+                        row = row_count + len(appended)
+                        appended.append(values)
+                    else:
+                        updates.append((row, values))
+                    log_records.append({"row": row, "id": vector_id, "metadata": metadata})
+
+                self._write_rows(os.path.join(ns_dir, "vectors.f32"), row_count, dim * 4,
+                                 [(row, values.tobytes()) for row, values in updates],
+                                 np.asarray(appended, dtype=np.float32).tobytes())
+                if self.dtype != "float32":
+                    changed = np.asarray([values for _, values in updates] + appended, dtype=np.float32)
+                    codes, scales = quantize(changed, self.dtype)
+                    code_rows = [row for row, _ in updates]
+                    code_bytes = codes.itemsize * dim
+                    self._write_rows(os.path.join(ns_dir, f"vectors.{_QUANTIZED_SUFFIX[self.dtype]}"),
+                                     row_count, code_bytes,
+                                     [(row, codes[i].tobytes()) for i, row in enumerate(code_rows)],
+                                     codes[len(code_rows):].tobytes())
+                    if scales is not None:
+                        self._write_rows(os.path.join(ns_dir, "scales.f32"), row_count, 4,
+                                         [(row, scales[i].tobytes()) for i, row in enumerate(code_rows)],
+                                         scales[len(code_rows):].tobytes())
+
+                # The log record commits the rows: readers only see rows listed in the records
+                log_path = os.path.join(ns_dir, "records.log")
+                with open(log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(record) + "\n" for record in log_records))
+                for record in log_records:
+                    rows[record["id"]] = record["row"]
+                log_size = os.path.getsize(log_path)
+                if log_size > _RECORDS_LOG_MIN_BYTES and log_size > os.path.getsize(os.path.join(ns_dir, "records.json")):
+                    self._compact_records(ns_dir, self._read_records(ns_dir))
+                self._row_maps[namespace] = (self._version(ns_dir), dim, dtype, rows)
+        return len(vectors)
+
+    def query(self, vector, namespace: str, top_k: int = 5, filter: dict = None) -> list:
+        with self._lock:
+            current = self._load(namespace)
+        if current is None or not current.ids:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        if filter:
+            # Exact scores over the matching rows only
+            rows = np.array([row for row, metadata in enumerate(current.metadata) if matches_filter(metadata, filter)],
+                            dtype=np.int64)
+            if len(rows) == 0:
+                return []
+            scores = current.matrix[rows] @ query
+            k = min(int(top_k), len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": current.ids[rows[i]], "score": float(scores[i]), "metadata": current.metadata[rows[i]]}
+                for i in top
+            ]
+
+        k = min(int(top_k), len(current.ids))
+        if current.codes is None:
+            scores = current.matrix @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            scores = scan_scores(current.codes, current.scales, query)
+            if self.rescore:
+                candidates = min(k * self.rescore_factor, len(scores))
+                top = np.sort(np.argpartition(-scores, candidates - 1)[:candidates])
+                # Exact scores for the candidates only; the memmap reads just these rows
+                scores[top] = current.matrix[top] @ query
+            else:
+                top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])][:k]
+        return [
+            {"id": current.ids[row], "score": float(scores[row]), "metadata": current.metadata[row]}
+            for row in top
+        ]
+
+    def fetch(self, ids: list, namespace: str) -> dict:
+        with self._lock:
+            current = self._load(namespace)
+        if current is None:
+            return {}
+        found = {}
+        for vector_id in ids:
+            row = current.rows.get(vector_id)
+            if row is not None:
+                found[vector_id] = {
+                    "id": vector_id,
+                    "values": current.matrix[row].astype(float).tolist(),
+                    "metadata": current.metadata[row]
+                }
+        return found
+
+    def delete(self, ids: list, namespace: str):
+        ns_dir = self._namespace_dir(namespace)
+        with self._lock:
+            if not os.path.isdir(ns_dir):
+                return
+            with file_lock(os.path.join(ns_dir, "lock")):
+                current = self._load(namespace, locked=True)
+                if current is None:
+                    return
+                drop = set(ids)
+                keep = [row for row, vector_id in enumerate(current.ids) if vector_id not in drop]
+                if len(keep) == len(current.ids):
+                    return
+                self._write(
+                    namespace,
+                    np.array(current.matrix[keep]),
+                    [current.ids[row] for row in keep],
+                    [current.metadata[row] for row in keep]
+                )
+
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            self._row_maps.pop(namespace, None)
+            shutil.rmtree(self._namespace_dir(namespace), ignore_errors=True)
+
+    def list_namespaces(self) -> list:
+        # Directory names are the sanitized namespace names, which are already safe for pdf_chunks_*
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.exists(os.path.join(self.directory, name, "records.json"))
+        )
+
+    def iter_vectors(self, namespace: str, batch_size: int = 100):
+        with self._lock:
+            current = self._load(namespace)
+        if current is None:
+            return
+        for start in range(0, len(current.ids), batch_size):
+            yield [
+                {"id": current.ids[row], "values": np.asarray(current.matrix[row]), "metadata": current.metadata[row]}
+                for row in range(start, min(start + batch_size, len(current.ids)))
+            ]
+
+
+def normalize_chunk_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a chunk, used to detect duplicates"""
+    return " ".join(text.split()).lower()
+
+def is_shared_chunk_id(chunk_id: str) -> bool:
+    """True for ids of chunks stored once in the shared namespace"""
+    return chunk_id.startswith("shared_")
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """Lazy load the executor for shared-namespace queries (never used by its own tasks, so it cannot deadlock)"""
+    global _query_executor
+    if _query_executor is None:
+        with _vector_store_lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(max_workers=VECTOR_QUERY_WORKERS, thread_name_prefix="vector_query")
+    return _query_executor
+
+def query_document(vector, namespace: str, top_k: int = 5, include_shared: bool = True) -> list:
+    """
+    Top matches for a document namespace, including (unless include_shared is False)
+    its chunks that are stored once in the shared namespace; the two namespaces are
+    queried concurrently. Duplicate texts are collapsed to the best match.
+    """
+    store = get_vector_store()
+    shared_matches = None
+    if include_shared and namespace.startswith(DOCUMENT_NAMESPACE_PREFIX) and namespace != SHARED_NAMESPACE:
+        doc_id = namespace[len(DOCUMENT_NAMESPACE_PREFIX):]
+        shared_matches = get_query_executor().submit(
+            store.query, vector, SHARED_NAMESPACE, top_k=top_k, filter={"doc_ids": {"$in": [doc_id]}}
+        )
+    matches = store.query(vector, namespace, top_k=top_k)
+    if shared_matches is not None:
+        matches += shared_matches.result()
+
+    collapsed = {}
+    for match in sorted(matches, key=lambda m: m["score"], reverse=True):
+        collapsed.setdefault(normalize_chunk_text(match["metadata"].get("text", "")), match)
+    return list(collapsed.values())[:int(top_k)]
+
+
+def get_vector_store() -> VectorStore:
+    """Lazy load the configured vector store backend (VECTOR_STORE_BACKEND)"""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                print(f"🔄 Loading vector store ({VECTOR_STORE_BACKEND})...")
+                if VECTOR_STORE_BACKEND == "local":
+                    _vector_store = LocalVectorStore(
+                        LOCAL_VECTOR_DIR, LOCAL_VECTOR_DTYPE, LOCAL_VECTOR_RESCORE, LOCAL_VECTOR_RESCORE_FACTOR
+                    )
+                elif VECTOR_STORE_BACKEND == "pinecone":
+                    _vector_store = PineconeVectorStore()
+                else:
+                    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND}")
+                print("✅ Vector store loaded")
+    return _vector_store
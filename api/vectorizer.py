@@ -1,121 +1,484 @@
 import requests
-from io import BytesIO
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
 import hashlib
 import os
+import threading
+from contextlib import contextmanager, ExitStack
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import pdfplumber
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
 import numpy as np
+from embeddings import EMBEDDING_MODEL, EMBEDDING_MODEL_VERSION, EMBED_BATCH_SIZE, embed_texts, get_embedding_dimension
+from vector_registry import registry
+from neon_database import db
+from vector_store import get_vector_store, normalize_chunk_text, is_shared_chunk_id, SHARED_NAMESPACE
+from pdf_store import pdf_store
+from pdf_extract import open_pdf, _extract_pages, _extract_page_range
+from chunker import iter_page_chunks
+from ann_index import get_ann_index
+from answer_cache import answer_cache
+from embedding_cache import (
+    EmbeddingCache, text_key,
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES
+)
 
 # Load environment variables
 load_dotenv()
 
+# Streaming pipeline configuration
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Parallel page extraction (1 = extract serially in the calling process)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "1"))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "8"))
+
+# Cross-document chunk deduplication (boilerplate shared by many RBI documents is stored once)
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "true").lower() == "true"
+# A chunk referenced by more documents than this gets private copies (keeps shared metadata small)
+CHUNK_DEDUP_MAX_DOCS = int(os.getenv("CHUNK_DEDUP_MAX_DOCS", "200"))
+
+# Seconds to wait for another worker's ingest of the same document before duplicating it
+INGEST_LOCK_TIMEOUT = int(os.getenv("INGEST_LOCK_TIMEOUT", "600"))
+
 # Global variables for lazy loading
-_pc = None
-_index = None
-_model = None
-
-def get_pinecone_client():
-    """Lazy load Pinecone client"""
-    global _pc
-    if _pc is None:
-        print("🔄 Loading Pinecone client...")
-        _pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        print("✅ Pinecone client loaded")
-    return _pc
-
-def get_pinecone_index():
-    """Lazy load Pinecone index"""
-    global _index
-    if _index is None:
-        print("🔄 Loading Pinecone index...")
-        pc = get_pinecone_client()
-        _index = pc.Index("fincompilance")
-        print("✅ Pinecone index loaded")
-    return _index
-
-def get_sentence_transformer():
-    """Lazy load SentenceTransformer model"""
-    global _model
-    if _model is None:
-        print("🔄 Loading SentenceTransformer model...")
-        _model = SentenceTransformer('all-mpnet-base-v2')
-        print("✅ SentenceTransformer model loaded")
-    return _model
+_embedding_cache = None
+_extraction_pool = None
+_ingest_locks = {}  # doc_id -> [threading.Lock, holders and waiters]
+_ingest_locks_guard = threading.Lock()
+_shared_chunk_locks = {}  # shared chunk id -> [threading.Lock, holders and waiters]
+
+def get_embedding_cache():
+    """Lazy load the on-disk embedding cache (None when disabled)"""
+    global _embedding_cache
+    if _embedding_cache is None and EMBEDDING_CACHE_ENABLED:
+        print("🔄 Loading embedding cache...")
+        _embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_VERSION, get_embedding_dimension(), EMBEDDING_CACHE_MAX_ENTRIES
+        )
+        print(f"✅ Embedding cache loaded ({_embedding_cache.stats()['entries']} entries)")
+    return _embedding_cache
+
+def close_embedding_cache():
+    """Write the embedding cache index snapshot (called on shutdown)"""
+    if _embedding_cache is not None:
+        _embedding_cache.close()
 
 def get_namespace_name(doc_id: str) -> str:
     """Generate a consistent namespace name for each document."""
     return f"pdf_chunks_{doc_id}"
 
+# -----------------------------
+# Cached embedding and upsert
+# -----------------------------
+def embed_chunks(texts: list) -> np.ndarray:
+    """
+    Embed chunk texts, encoding only those not already in the embedding cache.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return embed_texts(texts)
+
+    keys = [text_key(t) for t in texts]
+    cached = cache.get_many(list(dict.fromkeys(keys)))
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    if missing:
+        new_embeddings = embed_texts(list(missing.values()))
+        cache.put_many(list(missing.keys()), new_embeddings)
+        cached.update(zip(missing.keys(), new_embeddings))
+    print(f"📦 Embedded {len(missing)} new chunks, {len(texts) - len(missing)} from cache")
+    return np.stack([cached[key] for key in keys]) if keys else np.empty((0, cache.dim), dtype=np.float32)
+
+def upsert_vectors(vectors: list, namespace: str) -> int:
+    """Upsert vectors to the configured vector store (and the corpus ANN index). Returns the number written."""
+    written = get_vector_store().upsert(vectors, namespace)
+    ann_index = get_ann_index()
+    if ann_index is not None:
+        ann_index.add(namespace, vectors)
+    return written
+
+def delete_vectors(ids: list, namespace: str):
+    """Delete vectors from the configured vector store (and the corpus ANN index)"""
+    get_vector_store().delete(ids, namespace)
+    ann_index = get_ann_index()
+    if ann_index is not None:
+        ann_index.remove(namespace, ids)
+
+# -----------------------------
+# Vectorization registry
+# -----------------------------
+def is_document_vectorized(doc_id: str) -> bool:
+    """
+    O(1) "already vectorized" check against the registry. Documents ingested before
+    the registry existed are detected by fetching their first chunk id from the
+    namespace and are then backfilled into the registry.
+    """
+    if registry.is_vectorized(doc_id, EMBEDDING_MODEL_VERSION):
+        return True
+
+    namespace_name = get_namespace_name(doc_id)
+    legacy = get_vector_store().fetch([f"{doc_id}_chunk_0"], namespace_name)
+    if legacy:
+        registry.record(doc_id, namespace_name, None, EMBEDDING_MODEL_VERSION)
+        return True
+    return False
+
+# -----------------------------
+# Streaming PDF pipeline
+# -----------------------------
+def get_extraction_pool():
+    """Lazy load the process pool used for parallel page extraction"""
+    global _extraction_pool
+    if _extraction_pool is None:
+        print(f"🔄 Starting PDF extraction pool ({PDF_EXTRACT_WORKERS} workers)...")
+        # spawn, not fork: the API process is threaded and has torch loaded, and forking
+        # it can deadlock children on locks held by other threads at fork time
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        print("✅ PDF extraction pool started")
+    return _extraction_pool
+
+def iter_pdf_pages(pdf_path: str):
+    """
+    Yield (page_number, text, tables) in page order, releasing each page's parsed
+    layout objects before moving on. With PDF_EXTRACT_WORKERS > 1, page ranges are
+    extracted in a process pool; only a few ranges are in flight at once so the
+    stream stays bounded.
+    """
+    with open_pdf(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if PDF_EXTRACT_WORKERS <= 1 or page_count <= PDF_EXTRACT_PAGES_PER_TASK:
+            yield from _extract_pages(pdf, range(1, page_count + 1))
+            return
+
+    pool = get_extraction_pool()
+    ranges = deque(
+        (start, min(start + PDF_EXTRACT_PAGES_PER_TASK, page_count + 1))
+        for start in range(1, page_count + 1, PDF_EXTRACT_PAGES_PER_TASK)
+    )
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < PDF_EXTRACT_WORKERS * 2:
+            start, end = ranges.popleft()
+            in_flight.append(pool.submit(_extract_page_range, pdf_path, start, end))
+        yield from in_flight.popleft().result()
+
+def iter_chunks(pages):
+    """
+    Turn a page stream into a stream of chunk dicts ({"text", "page", "start", "end",
+    "heading"}, see chunker.iter_page_chunks). Each page is split on its own, so chunk
+    boundaries are anchored to pages: a revision to one page only changes that
+    page's chunks, which keeps incremental re-vectorization proportional to the edit.
+    """
+    return iter_page_chunks(pages, CHUNK_SIZE, CHUNK_OVERLAP)
+
+def get_chunk_metadata(chunk: dict, doc_id: str) -> dict:
+    """Vector metadata of a chunk: its text plus provenance for citations and neighbour lookup"""
+    metadata = {"text": chunk["text"], "doc_id": doc_id}
+    for key in ("page", "start", "end", "heading", "table"):
+        # Pinecone rejects null metadata values
+        if chunk.get(key) is not None:
+            metadata[key] = chunk[key]
+    return metadata
+
+def get_chunk_provenance(chunk: dict) -> dict:
+    """What the registry keeps of a chunk (its position, not its text)"""
+    return {key: chunk.get(key) for key in ("page", "start", "end", "heading")}
+
+def refresh_chunk_metadata(chunks: list, doc_id: str, namespace: str):
+    """
+    Rewrite the metadata of reused vectors ([(chunk_id, chunk), ...]) whose page,
+    offsets or heading changed in a new revision, so citations built from vector
+    metadata follow the chunk. The stored values are written back unchanged.
+    """
+    stored = get_vector_store().fetch([chunk_id for chunk_id, _ in chunks], namespace)
+    vectors = [
+        {"id": chunk_id, "values": stored[chunk_id]["values"], "metadata": get_chunk_metadata(chunk, doc_id)}
+        for chunk_id, chunk in chunks if chunk_id in stored
+    ]
+    if vectors:
+        upsert_vectors(vectors, namespace)
+
+def iter_batches(items, batch_size: int):
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 # -----------------------------
 # PDF processing
 # -----------------------------
-def process_and_store_pdf(pdf_link: str, doc_id: str = None) -> str:
+@contextmanager
+def single_flight(doc_id: str):
+    """
+    Serialize ingestion of one doc_id: across threads with an in-process lock and
+    across worker processes with a Postgres advisory lock. Callers re-check the
+    registry once inside, so only the first one does the work.
+    """
+    with _ingest_locks_guard:
+        entry = _ingest_locks.setdefault(doc_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0], ExitStack() as stack:
+            try:
+                stack.enter_context(db.advisory_lock(get_ingest_lock_key(doc_id), INGEST_LOCK_TIMEOUT))
+            except Exception as e:
+                # Duplicate work is better than failing the request
+                print(f"⚠️ Ingest lock for {doc_id} unavailable, continuing without it: {e}")
+            yield
+    finally:
+        with _ingest_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _ingest_locks[doc_id]
+
+@contextmanager
+def try_single_flight(doc_id: str, session):
+    """
+    Like single_flight, but never waits: yields False while doc_id is being ingested
+    anywhere. The advisory lock is taken on session (None: treated as unavailable).
+    """
+    with _ingest_locks_guard:
+        entry = _ingest_locks.setdefault(doc_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        if not entry[0].acquire(blocking=False):
+            yield False
+            return
+        try:
+            key = get_ingest_lock_key(doc_id)
+            try:
+                acquired = session is not None and session.try_lock(key)
+            except Exception as e:
+                print(f"⚠️ Ingest lock for {doc_id} unavailable: {e}")
+                acquired = False
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    _advisory_unlock(session, [key])
+        finally:
+            entry[0].release()
+    finally:
+        with _ingest_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _ingest_locks[doc_id]
+
+@contextmanager
+def advisory_session():
+    """
+    One pooled connection for the advisory locks of a chunk-sharing step, or None
+    when the database is unavailable (the locks are best effort)
     """
-    Download PDF, extract text, display it, split into chunks, embed, and store in Pinecone.
-    Returns the namespace name.
+    with ExitStack() as stack:
+        try:
+            session = stack.enter_context(db.advisory_session())
+        except Exception as e:
+            print(f"⚠️ Advisory locks unavailable, continuing without them: {e}")
+            session = None
+        yield session
+
+def _advisory_unlock(session, keys: list):
+    try:
+        for key in keys:
+            session.unlock(key)
+    except Exception as e:
+        # The session releases whatever is left when it ends
+        print(f"⚠️ Could not release advisory locks: {e}")
+
+@contextmanager
+def shared_chunk_locks(session, shared_ids: list):
+    """
+    Serialize read-modify-writes of shared chunk vectors (their doc_ids): across threads
+    with one in-process lock per chunk id, and across worker processes with advisory
+    locks taken on session. Locks are taken in sorted order, so ingests touching
+    different chunks run side by side and overlapping ones cannot deadlock.
+    """
+    shared_ids = sorted(set(shared_ids))
+    with _ingest_locks_guard:
+        entries = [_shared_chunk_locks.setdefault(shared_id, [threading.Lock(), 0]) for shared_id in shared_ids]
+        for entry in entries:
+            entry[1] += 1
+    try:
+        with ExitStack() as stack:
+            for entry in entries:
+                stack.enter_context(entry[0])
+            if session is not None:
+                keys = [get_shared_chunk_lock_key(shared_id) for shared_id in shared_ids]
+                stack.callback(_advisory_unlock, session, keys)
+                try:
+                    session.lock(keys, INGEST_LOCK_TIMEOUT)
+                except Exception as e:
+                    print(f"⚠️ Shared chunk locks unavailable, continuing without them: {e}")
+            yield
+    finally:
+        with _ingest_locks_guard:
+            for shared_id, entry in zip(shared_ids, entries):
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del _shared_chunk_locks[shared_id]
+
+def get_shared_chunk_lock_key(shared_id: str) -> int:
+    """Signed 64-bit advisory lock key for a shared chunk id"""
+    return int.from_bytes(hashlib.sha256(f"chunk:{shared_id}".encode()).digest()[:8], "big", signed=True)
+
+def get_ingest_lock_key(doc_id: str) -> int:
+    """Signed 64-bit advisory lock key for a doc_id"""
+    return int.from_bytes(hashlib.sha256(f"ingest:{doc_id}".encode()).digest()[:8], "big", signed=True)
+
+def get_chunk_hash(text_chunk: str) -> str:
+    """Hash of the normalized chunk text; equal for the same boilerplate in any document"""
+    return text_key(normalize_chunk_text(text_chunk))
+
+def get_chunk_id(doc_id: str, chunk_hash: str) -> str:
+    """Content-derived chunk id, stable across re-ingests of a revised document"""
+    return f"{doc_id}_{chunk_hash[:16]}"
+
+def get_shared_chunk_id(chunk_hash: str) -> str:
+    """
+    Id of a chunk stored once in the shared namespace. Vectors from other backends than
+    torch get their own ids, so documents embedded differently never share a vector.
+    """
+    if EMBEDDING_MODEL_VERSION == EMBEDDING_MODEL:
+        return f"shared_{chunk_hash[:32]}"
+    version = hashlib.sha256(EMBEDDING_MODEL_VERSION.encode()).hexdigest()[:8]
+    return f"shared_{version}_{chunk_hash[:32]}"
+
+def share_existing_chunks(doc_id: str, chunk_hashes: list) -> dict:
+    """
+    For chunks that other documents already store, reference a single copy in the
+    shared namespace instead of embedding them again. A private copy in another
+    document's namespace is moved there the first time it is reused, but only if that
+    document's ingest lock is free; while it is being ingested its copy is left alone
+    and only copied. Shared vectors are read and rewritten under per-chunk locks, so
+    concurrent ingests never drop each other from a chunk's doc_ids.
+    Returns {chunk_hash: shared chunk_id} for the chunks that were shared.
+    """
+    owners = registry.get_chunk_owners(chunk_hashes, doc_id, EMBEDDING_MODEL_VERSION)
+    candidates = {
+        chunk_hash: get_shared_chunk_id(chunk_hash) for chunk_hash in chunk_hashes
+        if owners.get(chunk_hash)
+        and len({ref["doc_id"] for ref in owners[chunk_hash]}) + 1 <= CHUNK_DEDUP_MAX_DOCS
+    }
+    if not candidates:
+        return {}
+
+    store = get_vector_store()
+    with advisory_session() as session, shared_chunk_locks(session, list(candidates.values())):
+        existing = store.fetch(list(candidates.values()), SHARED_NAMESPACE)
+        private_refs = {
+            chunk_hash: [ref for ref in owners[chunk_hash] if ref["chunk_id"] != shared_id]
+            for chunk_hash, shared_id in candidates.items()
+        }
+        # Chunks not in the shared namespace yet are copied from another document's private vector
+        ids_by_namespace = {}
+        for chunk_hash, shared_id in candidates.items():
+            if shared_id not in existing and private_refs[chunk_hash]:
+                ref = private_refs[chunk_hash][0]
+                ids_by_namespace.setdefault(ref["namespace"], []).append(ref["chunk_id"])
+        private = {}
+        for namespace, ids in ids_by_namespace.items():
+            for chunk_id, vector in store.fetch(ids, namespace).items():
+                private[(namespace, chunk_id)] = vector
+
+        with ExitStack() as owner_locks:
+            # Owners whose ingest lock we hold; their private copies can be moved safely
+            movable = {}
+            for refs in private_refs.values():
+                for ref in refs:
+                    if ref["doc_id"] not in movable:
+                        movable[ref["doc_id"]] = owner_locks.enter_context(
+                            try_single_flight(ref["doc_id"], session)
+                        )
+
+            shared, vectors, moved = {}, [], []
+            for chunk_hash, shared_id in candidates.items():
+                vector = existing.get(shared_id)
+                doc_ids = set(vector["metadata"].get("doc_ids", [])) if vector is not None else set()
+                if vector is None and private_refs[chunk_hash]:
+                    ref = private_refs[chunk_hash][0]
+                    vector = private.get((ref["namespace"], ref["chunk_id"]))
+                if vector is None:
+                    continue  # vector missing from the store; embed a private copy instead
+                moves = [ref for ref in private_refs[chunk_hash] if movable[ref["doc_id"]]]
+                doc_ids |= {doc_id} | {ref["doc_id"] for ref in moves}
+                if len(doc_ids) > CHUNK_DEDUP_MAX_DOCS:
+                    continue
+                if shared_id not in existing or doc_ids != set(vector["metadata"].get("doc_ids", [])):
+                    vectors.append({
+                        "id": shared_id,
+                        "values": np.asarray(vector["values"], dtype=np.float32).tolist(),
+                        "metadata": {"text": vector["metadata"].get("text", ""), "doc_ids": sorted(doc_ids)}
+                    })
+                moved.extend((ref, shared_id) for ref in moves)
+                shared[chunk_hash] = shared_id
+
+            if vectors:
+                upsert_vectors(vectors, SHARED_NAMESPACE)
+            for ref, shared_id in moved:
+                if registry.rename_chunk(ref["doc_id"], ref["chunk_id"], shared_id):
+                    delete_vectors([ref["chunk_id"]], ref["namespace"])
+    return shared
+
+def release_shared_chunks(doc_id: str, shared_ids: list):
+    """Drop doc_id from shared chunks it no longer contains, deleting chunks nobody references"""
+    if not shared_ids:
+        return
+    store = get_vector_store()
+    with advisory_session() as session, shared_chunk_locks(session, shared_ids):
+        stored = store.fetch(shared_ids, SHARED_NAMESPACE)
+        for shared_id in shared_ids:
+            vector = stored.get(shared_id)
+            if vector is None:
+                continue
+            doc_ids = sorted(set(vector["metadata"].get("doc_ids", [])) - {doc_id})
+            if not doc_ids:
+                delete_vectors([shared_id], SHARED_NAMESPACE)
+                continue
+            upsert_vectors([{
+                "id": shared_id,
+                "values": np.asarray(vector["values"], dtype=np.float32).tolist(),
+                "metadata": dict(vector["metadata"], doc_ids=doc_ids)
+            }], SHARED_NAMESPACE)
+
+def process_and_store_pdf(pdf_link: str, doc_id: str = None, progress=None, refresh: bool = False) -> str:
+    """
+    Fetch PDF through the local store, extract it page by page, split into chunks, embed, and store in the vector store.
+    Each stage is a generator, so memory stays bounded and vectors are upserted
+    batch by batch while later pages are still being parsed.
+
+    With refresh=True an already vectorized document is revalidated: if the PDF
+    changed, only new or changed chunks are embedded and upserted, and chunks that
+    disappeared are deleted (diffed against the chunk hashes in the registry).
+    Chunks another document already stores are shared instead of embedded again.
+    If given, progress(pages_parsed, chunks_processed) is called after every batch.
+    Concurrent calls for one doc_id (threads or worker processes) run one at a time,
+    and later callers reuse the first ingest. Returns the namespace name.
     """
     try:
         if doc_id is None:
             doc_id = f"doc_{hashlib.sha256(pdf_link.encode()).hexdigest()[:16]}"
         
         namespace_name = get_namespace_name(doc_id)
-        stats = get_pinecone_index().describe_index_stats()
-        if namespace_name in stats.get("namespaces", {}):
+        if not refresh and is_document_vectorized(doc_id):
             return namespace_name
-        headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                  "(KHTML, like Gecko) Chrome/115.0 Safari/537.36",
-    "Referer": "https://rbi.org.in/",
-    "Accept": "application/pdf",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
-         } 
-        response = requests.get(pdf_link, headers=headers)
-        response.raise_for_status()
-        content_type = response.headers.get("Content-Type", "")
-        if "pdf" not in content_type.lower():
-            return None, None
-        pdf_file = BytesIO(response.content)  # Keep PDF in memory
-
-        text = ""
-        tables = []
-        with pdfplumber.open(pdf_file) as pdf:
-            for i, page in enumerate(pdf.pages, start=1):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-
-                page_tables = page.extract_tables()
-                for t in page_tables:
-                    tables.append(t)
-        text_splitter = RecursiveCharacterTextSplitter(
-                      chunk_size=1000,
-                      chunk_overlap=200,
-                      separators=["\n\n", "\n", " ", ""]
-                         )
-        text_chunks = text_splitter.create_documents([text])
-        table_chunks = []
-        for idx, table in enumerate(tables):
-            # Replace None values with empty strings in each row
-            cleaned_table = [[cell if cell is not None else "" for cell in row] for row in table if row]
-            table_str = "\n".join([", ".join(row) for row in cleaned_table])
-            table_chunks.append(f"TABLE_{idx}:\n{table_str}")
-
-        # Final list of chunks
-        all_chunks = text_chunks + [Document(page_content=t) for t in table_chunks]
-        vectors = []
-        for i, chunk in enumerate(all_chunks):
-            embedding = get_sentence_transformer().encode(chunk.page_content).tolist()
-            vectors.append({
-                "id": f"{doc_id}_chunk_{i}",
-                "values": embedding,
-                "metadata": {"text": chunk.page_content, "doc_id": doc_id}
-            })
-        get_pinecone_index().upsert(vectors=vectors, namespace=namespace_name)
+
+        with single_flight(doc_id):
+            # Whoever held the lock before us may have just ingested this document
+            if not refresh and is_document_vectorized(doc_id):
+                return namespace_name
+            return _ingest_pdf(pdf_link, doc_id, namespace_name, progress)
     except requests.exceptions.RequestException as e:
         print(f"Error downloading PDF: {e}")
         raise
@@ -124,16 +487,121 @@ def process_and_store_pdf(pdf_link: str, doc_id: str = None) -> str:
         raise
 
 
+def _ingest_pdf(pdf_link: str, doc_id: str, namespace_name: str, progress=None) -> str:
+    """Body of process_and_store_pdf, run while holding the doc_id's single-flight lock"""
+    stored_pdf = pdf_store.fetch(pdf_link)
+    if stored_pdf is None:
+        return None
+    pdf_path, content_hash = stored_pdf["path"], stored_pdf["sha256"]
+
+    entry = registry.get(doc_id, fresh=True)
+    if (entry and entry.get("content_hash") == content_hash
+            and entry.get("model_version") == EMBEDDING_MODEL_VERSION):
+        return namespace_name
+
+    # Chunks already in the namespace, by hash, with their provenance; their vectors are reused if the
+    # model is unchanged
+    old_chunks = {
+        chunk_hash: (chunk_id, provenance) for chunk_id, chunk_hash, provenance in registry.get_chunks(doc_id)
+    } if entry else {}
+    reuse_vectors = bool(entry) and entry.get("model_version") == EMBEDDING_MODEL_VERSION
+    if entry and not old_chunks:
+        # Ingested before chunk hashes were tracked (positional ids): rebuild from scratch
+        get_vector_store().delete_namespace(namespace_name)
+        if get_ann_index() is not None:
+            get_ann_index().remove_namespace(namespace_name)
+
+    pages_parsed = 0
+
+    def tracked_pages():
+        nonlocal pages_parsed
+        for page in iter_pdf_pages(pdf_path):
+            pages_parsed = page[0]
+            yield page
+
+    new_chunks = []  # (chunk_id, chunk_hash, provenance) in document order; chunk texts are not kept
+    seen_hashes = set()
+    embedded_count = shared_count = 0
+    # Shared chunks this ingest added doc_id to; until the registry write records them,
+    # a failure has to take doc_id back off
+    old_ids = {chunk_id for chunk_id, _ in old_chunks.values()}
+    joined_ids = []
+    try:
+        for batch in iter_batches(iter_chunks(tracked_pages()), EMBED_BATCH_SIZE):
+            batch_chunks = []  # (chunk_hash, chunk) of chunks not seen earlier in the document
+            for chunk in batch:
+                chunk_hash = get_chunk_hash(chunk["text"])
+                if chunk_hash in seen_hashes:
+                    continue
+                seen_hashes.add(chunk_hash)
+                batch_chunks.append((chunk_hash, chunk))
+
+            # Unchanged chunks keep their vectors, chunks stored by other documents are shared,
+            # and only the rest are embedded
+            chunk_ids = {h: old_chunks[h][0] for h, _ in batch_chunks if reuse_vectors and h in old_chunks}
+            # Unchanged text in a new position: the reused vector's citation metadata must move with it
+            moved_chunks = [
+                (chunk_ids[h], chunk) for h, chunk in batch_chunks
+                if h in chunk_ids and not is_shared_chunk_id(chunk_ids[h])
+                and old_chunks[h][1] != get_chunk_provenance(chunk)
+            ]
+            if moved_chunks:
+                refresh_chunk_metadata(moved_chunks, doc_id, namespace_name)
+            if CHUNK_DEDUP_ENABLED:
+                shared = share_existing_chunks(doc_id, [h for h, _ in batch_chunks if h not in chunk_ids])
+                chunk_ids.update(shared)
+                shared_count += len(shared)
+                joined_ids.extend(shared_id for shared_id in shared.values() if shared_id not in old_ids)
+            fresh_chunks = [(h, get_chunk_id(doc_id, h), chunk) for h, chunk in batch_chunks if h not in chunk_ids]
+            chunk_ids.update((h, chunk_id) for h, chunk_id, _ in fresh_chunks)
+            new_chunks.extend((chunk_ids[h], h, get_chunk_provenance(chunk)) for h, chunk in batch_chunks)
+
+            if fresh_chunks:
+                embeddings = embed_chunks([chunk["text"] for _, _, chunk in fresh_chunks])
+                vectors = []
+                for (_, chunk_id, chunk), embedding in zip(fresh_chunks, embeddings):
+                    vectors.append({
+                        "id": chunk_id,
+                        "values": embedding.tolist(),
+                        "metadata": get_chunk_metadata(chunk, doc_id)
+                    })
+                upsert_vectors(vectors, namespace_name)
+                embedded_count += len(fresh_chunks)
+            if progress:
+                progress(pages_parsed, len(new_chunks))
+
+        # Old vectors no longer referenced under the same id (removed chunks, or re-embedded after a model change)
+        new_ids = {chunk_hash: chunk_id for chunk_id, chunk_hash, _ in new_chunks}
+        stale_ids = [chunk_id for chunk_hash, (chunk_id, _) in old_chunks.items()
+                     if new_ids.get(chunk_hash) != chunk_id]
+        private_stale_ids = [chunk_id for chunk_id in stale_ids if not is_shared_chunk_id(chunk_id)]
+        if private_stale_ids:
+            delete_vectors(private_stale_ids, namespace_name)
+
+        registry.record(doc_id, namespace_name, len(new_chunks), EMBEDDING_MODEL_VERSION, content_hash,
+                        chunks=new_chunks,
+                        shared_chunk_count=sum(1 for chunk_id, _, _ in new_chunks if is_shared_chunk_id(chunk_id)))
+    except BaseException:
+        try:
+            release_shared_chunks(doc_id, joined_ids)
+        except Exception as e:
+            print(f"⚠️ Could not remove {doc_id} from shared chunks after a failed ingest: {e}")
+        raise
+    if answer_cache is not None:
+        # Stale answers are also rejected by version on lookup; this just frees them now
+        answer_cache.invalidate(doc_id)
+    release_shared_chunks(doc_id, [chunk_id for chunk_id in stale_ids if is_shared_chunk_id(chunk_id)])
+    print(f"✅ Vectorized {doc_id}: {embedded_count} embedded, {shared_count} shared, "
+          f"{len(new_chunks) - embedded_count - shared_count} unchanged, {len(stale_ids)} removed")
+    return namespace_name
+
+
 def vectorize_pdf(pdf_path: str, doc_id: str):
     """
     Extract text from PDF, chunk it, vectorize with SentenceTransformer,
     and store in Pinecone with doc_id as namespace.
     """
     try:
-        # Lazy load models
-        model = get_sentence_transformer()
-        index = get_pinecone_index()
-        
         # Extract text from PDF
         text_content = ""
         with pdfplumber.open(pdf_path) as pdf:
@@ -151,23 +619,17 @@ def vectorize_pdf(pdf_path: str, doc_id: str):
         if not chunks:
             return {"error": "No chunks created from PDF text"}
 
-        # Vectorize each chunk and prepare for Pinecone
+        # Vectorize chunks in batches and prepare for Pinecone
+        embeddings = embed_chunks(chunks)
         vectors_to_upsert = []
-        for i, chunk in enumerate(chunks):
-            # Create embedding
-            embedding = model.encode(chunk)
-            
-            # Convert numpy array to list if needed
-            if isinstance(embedding, np.ndarray):
-                embedding = embedding.astype(float).tolist()
-            
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
             # Create unique ID for this chunk
             chunk_id = f"{doc_id}_chunk_{i}"
             
             # Prepare vector with metadata
             vector_data = {
                 "id": chunk_id,
-                "values": embedding,
+                "values": embedding.tolist(),
                 "metadata": {
                     "text": chunk,
                     "doc_id": doc_id,
@@ -178,7 +640,8 @@ def vectorize_pdf(pdf_path: str, doc_id: str):
 
         # Upsert to Pinecone using doc_id as namespace
         namespace = f"pdf_chunks_{doc_id}"
-        index.upsert(vectors=vectors_to_upsert, namespace=namespace)
+        upsert_vectors(vectors_to_upsert, namespace)
+        registry.record(doc_id, namespace, len(chunks), EMBEDDING_MODEL_VERSION)
         
         return {
             "success": True,
@@ -1,20 +1,31 @@
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
 from langchain.tools import StructuredTool
 import os
+import time
+import threading
 from dotenv import load_dotenv
-import numpy as np
+from embeddings import embed_query
+from retrieval import (
+    retrieve_context, run_retrieval, retrieve_documents, aretrieve_documents,
+    format_passages, get_passage_sources
+)
+from llm import stream_agent_events
 
 # Load environment variables
 load_dotenv()
 
+# "direct" retrieves from every workflow document at once and answers in one LLM call;
+# "agent" lets the ReAct agent look documents up one tool call at a time
+WORKFLOW_QA_MODE = os.getenv("WORKFLOW_QA_MODE", "direct").lower()
+WORKFLOW_RETRIEVAL_TOP_K = int(os.getenv("WORKFLOW_RETRIEVAL_TOP_K", "5"))  # per document
+WORKFLOW_CONTEXT_PASSAGES = int(os.getenv("WORKFLOW_CONTEXT_PASSAGES", "8"))  # after fusion
+
 # Global variables for lazy loading
 _llm = None
-_pc = None
-_index = None
-_model = None
+_workflow_tools = None
+_workflow_agent = None
+_workflow_agent_lock = threading.Lock()
 
 def get_llm():
     """Lazy load ChatOpenAI model"""
@@ -33,71 +44,62 @@ def get_llm():
         print("✅ ChatOpenAI model loaded")
     return _llm
 
-def get_pinecone_client():
-    """Lazy load Pinecone client"""
-    global _pc
-    if _pc is None:
-        print("🔄 Loading Pinecone client...")
-        _pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        print("✅ Pinecone client loaded")
-    return _pc
-
-def get_pinecone_index():
-    """Lazy load Pinecone index"""
-    global _index
-    if _index is None:
-        print("🔄 Loading Pinecone index...")
-        pc = get_pinecone_client()
-        _index = pc.Index("fincompilance")
-        print("✅ Pinecone index loaded")
-    return _index
-
-def get_sentence_transformer():
-    """Lazy load SentenceTransformer model"""
-    global _model
-    if _model is None:
-        print("🔄 Loading SentenceTransformer model...")
-        _model = SentenceTransformer('all-mpnet-base-v2')
-        print("✅ SentenceTransformer model loaded")
-    return _model
-
 
 def retrieve_document_content(query: str, doc_id: str, top_k: int = 5):
     """
-    Retrieve document content from Pinecone using doc_id as namespace.
+    Retrieve document content from the vector store using doc_id as namespace.
     """
     try:
-        # Lazy load models
-        model = get_sentence_transformer()
-        index = get_pinecone_index()
-        
         # Encode query into embeddings
-        query_embedding = model.encode(query)
-        if isinstance(query_embedding, np.ndarray):
-            query_embedding = query_embedding.astype(float).tolist()
-
-        # Query Pinecone
-        results = index.query(
-            vector=query_embedding,
-            top_k=int(top_k),             # ensure Python int
-            include_metadata=True,
-            namespace=str(doc_id)         # ensure Python str
-        )
+        query_embedding = embed_query(query)
 
-        matches = results.get("matches", [])
-        context_chunks = [m["metadata"].get("text", "") for m in matches]
-        return "\n\n---\n\n".join(context_chunks) if context_chunks else "No relevant content found."
+        # Query the vector store; chunks come back with page/section citations
+        context = retrieve_context(query_embedding, str(doc_id), top_k=int(top_k))
+        return context or "No relevant content found."
 
     except Exception as e:
         return f"Error retrieving document content: {e}"
 
 
-def ask_workflow_question(user_question: str, doc_ids: list, doc_titles: list):
+async def aretrieve_document_content(query: str, doc_id: str, top_k: int = 5):
+    """Async retrieve_document_content for the agent under ainvoke/astream, on the retrieval executor"""
+    return await run_retrieval(retrieve_document_content, query, doc_id, top_k)
+
+def get_workflow_tools():
+    """Lazy load workflow tools"""
+    global _workflow_tools
+    if _workflow_tools is None:
+        _workflow_tools = [
+            StructuredTool.from_function(
+                func=retrieve_document_content,
+                coroutine=aretrieve_document_content,
+                name="retrieve_document_content",
+                description="Retrieve content from a document using its doc_id. Input: query, doc_id."
+            )
+        ]
+    return _workflow_tools
+
+def build_workflow_agent():
+    """Compile the workflow React agent graph"""
+    return create_react_agent(get_llm(), get_workflow_tools())
+
+def get_workflow_agent():
     """
-    Workflow agent where the LLM chooses the right doc_id based on titles.
-    If user asks for documentation/report, a Word file is created and returned separately.
+    Lazy load the workflow React agent. The graph does not depend on the workflow:
+    each request's document catalog travels in its system message, so one compiled
+    agent serves every workflow.
     """
+    global _workflow_agent
+    if _workflow_agent is None:
+        with _workflow_agent_lock:
+            if _workflow_agent is None:
+                print("🔄 Creating workflow React agent...")
+                _workflow_agent = build_workflow_agent()
+                print("✅ Workflow React agent created")
+    return _workflow_agent
 
+def build_workflow_messages(user_question: str, doc_ids: list, doc_titles: list) -> list:
+    """System message with the workflow's document catalog, followed by the user question"""
     # Build document catalog with actual doc_ids
     doc_catalog_items = []
     for doc_id, title in zip(doc_ids, doc_titles):
@@ -117,25 +119,67 @@ Instructions:
 - Only use listed doc_ids
 """
 
-
-    messages = [
+    return [
         {"role": "system", "content": workflow_system_prompt},
         {"role": "user", "content": user_question}
     ]
 
-    # Define tools
-    workflow_tools = [
-        StructuredTool.from_function(
-            func=retrieve_document_content,
-            name="retrieve_document_content",
-            description="Retrieve content from a document using its doc_id. Input: query, doc_id."
-        )
+def build_workflow_context_messages(user_question: str, doc_ids: list, doc_titles: list, context: str) -> list:
+    """System message with the document catalog and the fused excerpts of all documents, then the question"""
+    doc_catalog = "\n".join(f"- {title}" for title in doc_titles)
+    context = context or "No matching content was found in these documents."
+
+    workflow_system_prompt = f"""You are FinCompliance AI, an RBI regulations expert.
+
+Documents in this workflow:
+{doc_catalog}
+
+Instructions:
+- Answer user queries using only the retrieved excerpts below
+- Each excerpt is labelled with its document title, page and section; cite them
+- If the excerpts do not answer the question, say so
+
+Retrieved excerpts:
+{context}
+"""
+
+    return [
+        {"role": "system", "content": workflow_system_prompt},
+        {"role": "user", "content": user_question}
     ]
 
-    # Lazy load LLM
-    llm = get_llm()
-    
-    workflow_agent = create_react_agent(llm, workflow_tools)
+def retrieve_workflow_passages(user_question: str, doc_ids: list, doc_titles: list) -> list:
+    """Encode the question once and retrieve from every workflow document concurrently, fused by rank"""
+    query_embedding = embed_query(user_question)
+    return retrieve_documents(query_embedding, [str(doc_id) for doc_id in doc_ids], top_k=WORKFLOW_RETRIEVAL_TOP_K,
+                              limit=WORKFLOW_CONTEXT_PASSAGES, titles=dict(zip(map(str, doc_ids), doc_titles)))
+
+async def aretrieve_workflow_passages(user_question: str, doc_ids: list, doc_titles: list) -> list:
+    """retrieve_workflow_passages for the event loop"""
+    query_embedding = await run_retrieval(embed_query, user_question)
+    return await aretrieve_documents(query_embedding, [str(doc_id) for doc_id in doc_ids],
+                                     top_k=WORKFLOW_RETRIEVAL_TOP_K, limit=WORKFLOW_CONTEXT_PASSAGES,
+                                     titles=dict(zip(map(str, doc_ids), doc_titles)))
+
+
+def ask_workflow_question(user_question: str, doc_ids: list, doc_titles: list, mode: str = None):
+    """
+    Answer a question over the workflow's documents (doc_ids are their namespaces), in
+    WORKFLOW_QA_MODE unless mode is given: one fused retrieval over all documents and a
+    single LLM call, or the agent choosing doc_ids from their titles.
+    If user asks for documentation/report, a Word file is created and returned separately.
+    """
+    if (mode or WORKFLOW_QA_MODE).lower() != "agent":
+        passages = retrieve_workflow_passages(user_question, doc_ids, doc_titles)
+        messages = build_workflow_context_messages(user_question, doc_ids, doc_titles, format_passages(passages))
+        return {
+            "answer_text": get_llm().invoke(messages).content
+        }
+
+    messages = build_workflow_messages(user_question, doc_ids, doc_titles)
+
+    # Reuse the compiled agent; the catalog is part of the messages
+    workflow_agent = get_workflow_agent()
     response = workflow_agent.invoke({"messages": messages})
 
     # Extract final LLM answer
@@ -145,3 +189,73 @@ Instructions:
         "answer_text": agent_message
     }
 
+async def aask_workflow_question(user_question: str, doc_ids: list, doc_titles: list, mode: str = None):
+    """ask_workflow_question for the event loop (LLM awaited, retrieval on the retrieval executor)"""
+    if (mode or WORKFLOW_QA_MODE).lower() != "agent":
+        passages = await aretrieve_workflow_passages(user_question, doc_ids, doc_titles)
+        messages = build_workflow_context_messages(user_question, doc_ids, doc_titles, format_passages(passages))
+        response = await get_llm().ainvoke(messages)
+        return {
+            "answer_text": response.content
+        }
+
+    messages = build_workflow_messages(user_question, doc_ids, doc_titles)
+    response = await get_workflow_agent().ainvoke({"messages": messages})
+    return {
+        "answer_text": response["messages"][-1].content
+    }
+
+async def stream_workflow_question(user_question: str, doc_ids: list, doc_titles: list, mode: str = None):
+    """
+    Streaming aask_workflow_question: yields ("retrieval", {"sources"}) once all documents
+    are searched (or ("retrieval", {"tool"}) after each agent lookup), ("token", {"content"})
+    as the answer is generated and finally ("done", {"content"}) with the complete answer.
+    """
+    parts = []
+    if (mode or WORKFLOW_QA_MODE).lower() != "agent":
+        passages = await aretrieve_workflow_passages(user_question, doc_ids, doc_titles)
+        yield "retrieval", {"sources": get_passage_sources(passages)}
+        messages = build_workflow_context_messages(user_question, doc_ids, doc_titles, format_passages(passages))
+        async for chunk in get_llm().astream(messages):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield "token", {"content": chunk.content}
+        yield "done", {"content": "".join(parts)}
+        return
+
+    messages = build_workflow_messages(user_question, doc_ids, doc_titles)
+    async for event, data in stream_agent_events(get_workflow_agent(), messages):
+        if event == "retrieval":
+            # Anything written before the lookup was not the answer
+            parts = []
+        else:
+            parts.append(data["content"])
+        yield event, data
+    yield "done", {"content": "".join(parts)}
+
+
+if __name__ == "__main__":
+    # Per-request overhead removed by reusing the compiled agent: python workflow_agent.py
+    os.environ.setdefault("OPEN_ROUTER_API_KEY", "benchmark")
+    runs = 20
+    get_llm()
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        StructuredTool.from_function(
+            func=retrieve_document_content,
+            coroutine=aretrieve_document_content,
+            name="retrieve_document_content",
+            description="Retrieve content from a document using its doc_id. Input: query, doc_id."
+        )
+        build_workflow_agent()
+    per_request_build = (time.perf_counter() - started) / runs
+
+    get_workflow_agent()
+    started = time.perf_counter()
+    for _ in range(runs):
+        get_workflow_agent()
+    per_request_reuse = (time.perf_counter() - started) / runs
+
+    print(f"Tool + create_react_agent per request: {per_request_build * 1000:.2f} ms")
+    print(f"Prebuilt agent per request:            {per_request_reuse * 1000:.4f} ms")